@@ -7,7 +7,9 @@ import logging
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from platformUtils.zmq_codec import ZmqCodec
+from platformUtils.shm_ring import FrameSource
 from platformUtils.logUtils import worker_configurer, set_process_title
+from platformUtils.utils import conflate_rcvhwm, recv, bind_pub, connect_sub
 from config import (
     is_dark_detector_process_config,
     zmq_control_endpoint,
@@ -23,18 +25,21 @@ def is_dark_detector(log_queue):
     #subscribe to control topic
     ctx = zmq.Context()
     sub = ctx.socket(zmq.SUB)
+    if config.get("conflate", False):
+        sub.setsockopt(zmq.RCVHWM, conflate_rcvhwm)
     sub.connect(zmq_control_endpoint)
     sub.setsockopt(zmq.SUBSCRIBE, b"control")
     l.info(config["short_name"] + " process connected to control topic")
 
     #subscribe to camera topic
-    sub.connect(config["camera_endpoint"])
+    connect_sub(sub, config["camera_endpoint"])
     sub.setsockopt(zmq.SUBSCRIBE, config["camera_name"].encode())
+    frames = FrameSource(config["camera_name"])
     l.info(config["short_name"] + " process connected to camera topic")
 
     #connect to pub endpoint
     pub = ctx.socket(zmq.PUB)
-    pub.bind(config["pub_endpoint"])
+    bind_pub(pub, config["pub_endpoint"])
     l.info(config["short_name"] + " process connected to pub topic")
 
 
@@ -43,8 +48,7 @@ def is_dark_detector(log_queue):
     
     next_capture = _compute_next_capture_ts(time.time(), interval_s)
     while True:
-        parts = sub.recv_multipart()
-        topic, msg = ZmqCodec.decode(parts)
+        topic, msg = recv(sub, config)
 
         if topic == "control":
             if msg[0] == "exit_all" or (msg[0] == "exit" and msg[-1] == "dark"):
@@ -54,11 +58,16 @@ def is_dark_detector(log_queue):
         if topic != config["camera_name"]:
             continue
 
-        dt_utc, frame = msg[0], msg[1]
+        dt_utc = msg[0]
 
         if dt_utc.timestamp() < next_capture:
             continue
 
+        frame = frames.frame(msg)
+        if frame is None:
+            l.debug(config["short_name"] + " frame at " + str(dt_utc) + " was overwritten before it was read")
+            continue
+
         next_capture = _compute_next_capture_ts(dt_utc.timestamp(), interval_s)
 
         mean_brightness = frame.mean()
@@ -67,6 +76,7 @@ def is_dark_detector(log_queue):
         pub.send_multipart(ZmqCodec.encode(config["pub_topic"], [dt_utc, is_dark]))
 
 
+    frames.close()
     pub.close(0)
     sub.close(0)
     ctx.term()
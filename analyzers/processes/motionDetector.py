@@ -6,7 +6,9 @@ import logging
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from platformUtils.zmq_codec import ZmqCodec
+from platformUtils.shm_ring import FrameSource
 from platformUtils.logUtils import worker_configurer, set_process_title
+from platformUtils.utils import conflate_rcvhwm, recv, bind_pub, connect_sub
 from config import (
     motion_detector_process_config,
     zmq_control_endpoint,
@@ -22,18 +24,21 @@ def motion_detector(log_queue):
     #subscribe to control topic
     ctx = zmq.Context()
     sub = ctx.socket(zmq.SUB)
+    if config.get("conflate", False):
+        sub.setsockopt(zmq.RCVHWM, conflate_rcvhwm)
     sub.connect(zmq_control_endpoint)
     sub.setsockopt(zmq.SUBSCRIBE, b"control")
     l.info(config["short_name"] + " process connected to control topic")
 
     #subscribe to camera topic
-    sub.connect(config["camera_endpoint"])
+    connect_sub(sub, config["camera_endpoint"])
     sub.setsockopt(zmq.SUBSCRIBE, config["camera_name"].encode())
+    frames = FrameSource(config["camera_name"])
     l.info(config["short_name"] + " process connected to camera topic")
 
     #connect to pub endpoint
     pub = ctx.socket(zmq.PUB)
-    pub.bind(config["pub_endpoint"])
+    bind_pub(pub, config["pub_endpoint"])
     l.info(config["short_name"] + " process connected to pub topic")
 
     last_frame = None
@@ -42,8 +47,7 @@ def motion_detector(log_queue):
     
     next_capture = _compute_next_capture_ts(time.time(), interval_s)
     while True:
-        parts = sub.recv_multipart()
-        topic, msg = ZmqCodec.decode(parts)
+        topic, msg = recv(sub, config)
 
         if topic == "control":
             if msg[0] == "exit_all" or (msg[0] == "exit" and msg[-1] == "motion"):
@@ -53,12 +57,17 @@ def motion_detector(log_queue):
         if topic != config["camera_name"]:
             continue
 
-        dt_utc, frame = msg[0], msg[1]
-        if last_frame is None:
-            last_frame = frame
+        dt_utc = msg[0]
+        if last_frame is not None and dt_utc.timestamp() < next_capture:
             continue
 
-        if dt_utc.timestamp() < next_capture:
+        # we hold on to the last frame, so it has to be copied out of the ring
+        frame = frames.frame(msg, copy=True)
+        if frame is None:
+            l.debug(config["short_name"] + " frame at " + str(dt_utc) + " was overwritten before it was read")
+            continue
+        if last_frame is None:
+            last_frame = frame
             continue
 
         next_capture = _compute_next_capture_ts(dt_utc.timestamp(), interval_s)
@@ -70,6 +79,7 @@ def motion_detector(log_queue):
         pub.send_multipart(ZmqCodec.encode(config["pub_topic"], [dt_utc, motion]))
 
 
+    frames.close()
     pub.close(0)
     sub.close(0)
     ctx.term()
@@ -7,7 +7,8 @@ import zmq
 
 
 from platformUtils.zmq_codec import ZmqCodec
-from platformUtils.utils import configure_process, should_exit
+from platformUtils.shm_ring import FrameSource
+from platformUtils.utils import configure_process, should_exit, recv, bind_pub, connect_sub
 
 
 def _compute_next_capture_dt(now_dt: datetime, interval_s: float) -> datetime:
@@ -23,14 +24,15 @@ def yolo_person_detector(config_name):
     #subscribe to camera topic
     l.info(" camera endpoint: " + config["camera_endpoint"])
     l.info(" camera topic: " + config["camera_topic"])
-    sub.connect(config["camera_endpoint"])
+    connect_sub(sub, config["camera_endpoint"])
     sub.setsockopt(zmq.SUBSCRIBE, config["camera_topic"].encode())
+    frames = FrameSource(config["camera_topic"])
     l.info(" process connected to camera topic")
 
 
     #connect to pub endpoint
     pub = ctx.socket(zmq.PUB)
-    pub.bind(config["pub_endpoint"])
+    bind_pub(pub, config["pub_endpoint"])
     l.info(" process connected to pub topic")
 
 
@@ -46,8 +48,8 @@ def yolo_person_detector(config_name):
 
 
     while True:
-        parts = sub.recv_multipart()
-        topic, msg = ZmqCodec.decode(parts)
+        #with conflate set only the newest frame is decoded, the ones queued up during inference are dropped
+        topic, msg = recv(sub, config)
 
         if should_exit(topic,msg, config_name):
             l.info(config_name + " got control exit")
@@ -56,7 +58,7 @@ def yolo_person_detector(config_name):
         if topic != config["camera_topic"]:
             continue
 
-        dt_utc, frame = msg[0], msg[1]
+        dt_utc = msg[0]
         l.trace("got frame: " + str(dt_utc))
         
         if next_capture is None:
@@ -70,6 +72,12 @@ def yolo_person_detector(config_name):
         l.trace("next capture: " + str(next_capture))
 
 
+        # inference takes seconds, copy the frame out of the ring so it can't be overwritten underneath us
+        frame = frames.frame(msg, copy=True)
+        if frame is None:
+            l.debug("frame at " + str(dt_utc) + " was overwritten before it was read, waiting for the next one")
+            continue
+
         l.trace("starting inference")
         start_time = time.time()
         results = model.predict(frame[0], verbose=config["verbose"])
@@ -95,6 +103,7 @@ def yolo_person_detector(config_name):
         l.debug("published %d at %s", detected, str(dt_utc))
 
 
+    frames.close()
     l.info("exiting")
 
 
@@ -0,0 +1,34 @@
+# per message cost of the msgpack and fixed layout encodings for a typical sensor reading
+# run from the repo root: python -m benchmarks.bench_zmq_codec
+import sys
+import timeit
+from datetime import datetime, timezone
+import numpy as np
+
+from platformUtils.zmq_codec import ZmqCodec
+
+N = 20_000
+topic = "i2c-1-0x77_bosch-bme680_temperature_C_float32_1x1_1hz"
+dt = datetime.now(timezone.utc)
+readings = {
+    "1": np.array([21.5], dtype=np.float32),
+    "1x3": np.array([[0.1, -9.8, 0.3]], dtype=np.float32),
+    "1x4": np.array([[1, 2, 3, 4]], dtype=np.int16),
+}
+
+
+def us_per_msg(fn):
+    return min(timeit.repeat(fn, number=N, repeat=5)) / N * 1_000_000
+
+
+if __name__ == "__main__":
+    print("python " + sys.version.split()[0] + ", " + str(N) + " messages per run, best of 5")
+    print(f"{'shape':>6} {'msgpack enc':>12} {'fixed enc':>10} {'msgpack dec':>12} {'fixed dec':>10}  (us/msg)")
+    for name, data in readings.items():
+        mp_parts = ZmqCodec.encode(topic, [dt, data])
+        fx_parts = ZmqCodec.encode_fixed(topic, dt, data)
+        mp_enc = us_per_msg(lambda: ZmqCodec.encode(topic, [dt, data]))
+        fx_enc = us_per_msg(lambda: ZmqCodec.encode_fixed(topic, dt, data))
+        mp_dec = us_per_msg(lambda: ZmqCodec.decode(mp_parts))
+        fx_dec = us_per_msg(lambda: ZmqCodec.decode(fx_parts))
+        print(f"{name:>6} {mp_enc:12.2f} {fx_enc:10.2f} {mp_dec:12.2f} {fx_dec:10.2f}")
@@ -0,0 +1,75 @@
+# the pipeline benchmarks only run with --bench, a normal pytest run skips them
+# results of every benchmark in the run are saved to one json file to compare runs with
+import json
+import os
+import platform
+import sys
+
+import pytest
+
+from benchmarks.pipeline import utc_stamp
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("bench")
+    group.addoption("--bench", action="store_true", help="run the pipeline benchmarks")
+    group.addoption("--bench-seconds", type=float, default=10, help="how long each benchmark publishes for")
+    group.addoption("--bench-topics", default="1,8,32", help="comma separated topic counts to try")
+    group.addoption("--bench-hz", default="32", help="comma separated sensor rates to try")
+    group.addoption("--bench-out", default=os.path.join(os.path.dirname(__file__), "results"),
+                    help="directory the results json goes in")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "bench: end to end pipeline benchmark, needs --bench")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--bench"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --bench")
+    for item in items:
+        if "bench" in item.keywords:
+            item.add_marker(skip)
+
+
+def pytest_generate_tests(metafunc):
+    opt = metafunc.config.getoption
+    if "n_topics" in metafunc.fixturenames:
+        metafunc.parametrize("n_topics", [int(n) for n in opt("--bench-topics").split(",")])
+    if "hz" in metafunc.fixturenames:
+        metafunc.parametrize("hz", [int(h) for h in opt("--bench-hz").split(",")])
+
+
+class BenchResults:
+    def __init__(self):
+        self.runs = []
+
+    def record(self, name, params, results):
+        self.runs.append({"name": name, "params": params, "results": results})
+
+
+@pytest.fixture(scope="session")
+def bench_results(request):
+    results = BenchResults()
+    yield results
+    if not results.runs:
+        return
+    out_dir = request.config.getoption("--bench-out")
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, "bench-" + utc_stamp() + ".json")
+    with open(path, "w") as f:
+        json.dump({
+            "machine": platform.machine(),
+            "node": platform.node(),
+            "system": platform.platform(),
+            "cpus": os.cpu_count(),
+            "python": sys.version.split()[0],
+            "runs": results.runs,
+        }, f, indent=1)
+    print("\nbenchmark results saved to " + path)
+
+
+@pytest.fixture
+def bench_seconds(request):
+    return request.config.getoption("--bench-seconds")
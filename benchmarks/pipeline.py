@@ -0,0 +1,297 @@
+# pieces for the end to end pipeline benchmarks in test_pipeline.py:
+# simulated sensor publishers, a probe subscriber, writer/sqlite processes, a local upload server,
+# and cpu/rss sampling from /proc so nothing beyond the repo's own dependencies is needed
+import os
+import re
+import threading
+import time
+import multiprocessing as mp
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import zmq
+
+from platformUtils.zmq_codec import ZmqCodec, datetime_to_ns
+from platformUtils.metrics import Histogram
+from config import zmq_control_endpoint
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+_PAGE = os.sysconf("SC_PAGE_SIZE")
+
+
+class ProcStats:
+    """cpu % and rss of a process between start() and stop(), from /proc"""
+
+    def __init__(self, pid=None):
+        self.pid = pid or os.getpid()
+        self.rss_max = 0
+        self._stop = threading.Event()
+
+    def _cpu_ticks(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime and stime, fields 14 and 15 counting from 1 with the pid and name
+        return int(fields[11]) + int(fields[12])
+
+    def _rss(self):
+        with open(f"/proc/{self.pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+
+    def _sample(self):
+        while not self._stop.wait(.25):
+            try:
+                self.rss_max = max(self.rss_max, self._rss())
+            except OSError:
+                return
+
+    def start(self):
+        self.t0 = time.monotonic()
+        self.ticks0 = self._cpu_ticks()
+        self.rss_max = self._rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        try:
+            ticks = self._cpu_ticks()
+        except OSError:
+            ticks = self.ticks0
+        self._stop.set()
+        elapsed = time.monotonic() - self.t0
+        return {"cpu_percent": 100 * (ticks - self.ticks0) / _CLK_TCK / elapsed,
+                "rss_max_mb": self.rss_max / 1024 / 1024}
+
+
+class SensorPublishers:
+    """
+    n simulated Sensors at hz on a DeadlineScheduler, the way i2c_controller runs them.
+    read_data is timed for the read -> publish stage.
+    """
+
+    def __init__(self, n, hz, shape="1x1", make_data=None, **sensor_kwargs):
+        from sensors.sensor import Sensor
+        from sensors.scheduler import DeadlineScheduler
+        from sensors.simulation import SimSignal, shape_channels
+
+        self.read_publish = Histogram()
+        self.sent = 0
+        self.scheduler = DeadlineScheduler()
+        self.sensors = []
+        for i in range(n):
+            read = make_data
+            if read is None:
+                signal = SimSignal(channels=shape_channels(shape), seed=i)
+                read = lambda signal=signal: np.array([signal.value()], dtype=np.float32)
+            s = Sensor(bus_location=f"bench-{i}", device_name="simulated", sensor_type="value",
+                       units="none", data_type="float", shape=shape, hz=hz,
+                       retrieve_data=read, **sensor_kwargs)
+            self.sensors.append(s)
+        self.topics = [s.topic for s in self.sensors]
+        self.endpoints = [s.endpoint for s in self.sensors]
+        self._stop = threading.Event()
+
+    def _timed(self, sensor):
+        def read():
+            start_ns = time.perf_counter_ns()
+            sensor.read_data()
+            self.read_publish.add((time.perf_counter_ns() - start_ns) // 1000)
+            self.sent += 1
+        return read
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.scheduler.wait()
+            self.scheduler.run_due()
+
+    def start(self):
+        # scheduled here so the time spent setting up isn't counted as missed ticks
+        for s in self.sensors:
+            self.scheduler.add(s.topic, s.message_hz, self._timed(s))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(2)
+        for s in self.sensors:
+            s.close()
+        return {"messages": self.sent, "read_publish_us": self.read_publish.to_dict(),
+                "missed_ticks": sum(st["missed"] for st in self.scheduler.stats().values())}
+
+
+class ProbeSubscriber:
+    """subscribes like a writer does and times publish -> receive from each message's sample time"""
+
+    def __init__(self, endpoints, topics):
+        self.ctx = zmq.Context.instance()
+        self.sub = self.ctx.socket(zmq.SUB)
+        for endpoint in endpoints:
+            self.sub.connect(endpoint)
+        for topic in topics:
+            self.sub.setsockopt(zmq.SUBSCRIBE, topic.encode())
+        self.publish_receive = Histogram()
+        self.received = 0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.sub.poll(100):
+                continue
+            topic, msg = ZmqCodec.decode(self.sub.recv_multipart(), raw_timestamps=True)
+            # the sample time is rounded down to the grid, so this includes up to a period of it
+            self.publish_receive.add((time.time_ns() - int(msg[0])) // 1000)
+            self.received += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(2)
+        self.sub.close(0)
+        return {"received": self.received, "publish_receive_us": self.publish_receive.to_dict()}
+
+
+class ControlPublisher:
+    """stands in for main on the control endpoint, to tell the processes under test to exit"""
+
+    def __init__(self):
+        self.pub = zmq.Context.instance().socket(zmq.PUB)
+        self.pub.bind(zmq_control_endpoint)
+
+    def send(self, *msg):
+        self.pub.send_multipart(ZmqCodec.encode("control", list(msg)))
+
+    def close(self):
+        self.pub.close(0)
+
+
+class CloseNotices:
+    """times write -> file close from the [dt, outfile] a Writer publishes when it closes a file"""
+
+    def __init__(self, output_bases):
+        self.sub = zmq.Context.instance().socket(zmq.SUB)
+        for base in output_bases:
+            name = base + "_writer_object"
+            self.sub.connect(f"ipc:///tmp/{name}.sock")
+            self.sub.setsockopt(zmq.SUBSCRIBE, name.encode())
+        self.write_close = Histogram()
+        self.closed = {}  # file name -> epoch ns it was closed
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.sub.poll(100):
+                continue
+            _, (last_dt, outfile) = ZmqCodec.decode(self.sub.recv_multipart())
+            now = time.time_ns()
+            self.write_close.add((now - datetime_to_ns(last_dt)) // 1000)
+            self.closed[os.path.basename(outfile)] = now
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(2)
+        self.sub.close(0)
+        return {"files_closed": len(self.closed), "write_close_us": self.write_close.to_dict()}
+
+
+class UploadServer:
+    """a local stand in for the upload url, keeps the name and arrival time of each file posted"""
+
+    def __init__(self):
+        received = self.received = {}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                m = re.search(rb'filename="([^"]+)"', body)
+                if m:
+                    received[os.path.basename(m.group(1).decode())] = (time.time_ns(), len(body))
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/upload"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self, closed=None):
+        self.server.shutdown()
+        self.server.server_close()
+        close_upload = Histogram()
+        for name, (t, _) in self.received.items():
+            if closed and name in closed:
+                close_upload.add((t - closed[name]) // 1000)
+        return {"files_uploaded": len(self.received),
+                "bytes_uploaded": sum(n for _, n in self.received.values()),
+                "close_upload_us": close_upload.to_dict()}
+
+
+def run_uploader(data_dir, upload_url, stop, time_till_ready=1):
+    """file_uploader's backlog pass in a loop, against the local upload server"""
+    from platformUtils.processes.file_uploader import _upload_files_in_backlog
+    import logging
+    l = logging.getLogger("bench_uploader")
+    l.trace = l.debug
+    config = {"short_name": "bench-up", "data_dir": data_dir, "upload_url": upload_url}
+    while not stop.is_set():
+        _upload_files_in_backlog(time_till_ready, config, l)
+        stop.wait(.5)
+
+
+def _writer_target(kwargs):
+    from writers.services.writerProcess import writer_process
+    writer_process(**kwargs)
+
+
+def start_writer(topic, hz, output_base, output_module, locations, additional_output_config=None,
+                 target_file_size=256 * 1024):
+    """a writer_process for topic in its own process, writing under the bench's tmp locations"""
+    info = {
+        "temp_write_location": locations + "temp/",
+        "output_write_location": locations + "upload/",
+        "persist_location": locations + "persist/",
+        "platform_uuid": "bench",
+        "target_file_size": target_file_size,
+    }
+    kwargs = {"topic": topic, "msg_hz": hz, "output_hz": hz, "output_base": output_base,
+              "output_module": output_module, "file_size_check_interval_s_range": (1, 2),
+              "additional_output_config": additional_output_config or {},
+              "file_writer_process_info": info}
+    p = mp.get_context("spawn").Process(target=_writer_target, args=(kwargs,), daemon=True)
+    p.start()
+    return p
+
+
+def _sqlite_target(endpoints, topics, write_location):
+    import writers.services.sqliteWriter as sqlite_writer_module
+    sqlite_writer_module.config.update({"subscription_endpoints": endpoints,
+                                        "subscription_topics": topics,
+                                        "write_location": write_location})
+    sqlite_writer_module.sqlite_writer()
+
+
+def start_sqlite_writer(endpoints, topics, write_location):
+    p = mp.get_context("spawn").Process(target=_sqlite_target, args=(endpoints, topics, write_location),
+                                        daemon=True)
+    p.start()
+    return p
+
+
+def utc_stamp():
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
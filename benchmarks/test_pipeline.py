@@ -0,0 +1,144 @@
+# end to end pipeline benchmarks, opt in:
+#   python -m pytest benchmarks --bench [--bench-seconds 30 --bench-topics 1,8,32,64 --bench-hz 16,32]
+# each stage is timed where it can be seen from outside the process doing it:
+#   read -> publish   around Sensor.read_data
+#   publish -> receive  a probe subscribed like a writer, from the message's sample time
+#   write -> close    the [dt, file] a Writer publishes when it closes a file, from its last sample
+#   close -> upload   the local upload server getting that file
+import os
+import shutil
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.pipeline import (SensorPublishers, ProbeSubscriber, ProcStats, ControlPublisher,
+                                 CloseNotices, UploadServer, run_uploader, start_writer,
+                                 start_sqlite_writer)
+
+pytestmark = pytest.mark.bench
+
+
+def _settle(seconds=1):
+    # let the zmq connections come up before counting
+    time.sleep(seconds)
+
+
+def test_sensor_fanout(n_topics, hz, bench_seconds, bench_results):
+    """how many topics at hz one controller loop keeps up with, and what it costs"""
+    pubs = SensorPublishers(n_topics, hz)
+    probe = ProbeSubscriber(pubs.endpoints, pubs.topics).start()
+    _settle()
+    stats = ProcStats().start()
+    pubs.start()
+    time.sleep(bench_seconds)
+    published = pubs.stop()
+    time.sleep(.5)
+    received = probe.stop()
+    results = {**published, **received, **stats.stop(),
+               "messages_per_s": published["messages"] / bench_seconds,
+               "dropped": published["messages"] - received["received"]}
+    bench_results.record("sensor_fanout", {"topics": n_topics, "hz": hz, "seconds": bench_seconds}, results)
+    # the loop should at least keep up with what it was asked for
+    assert published["messages"] >= .9 * n_topics * hz * bench_seconds
+
+
+def _writer_stage(tmp_path, n_topics, hz, bench_seconds, output_module, additional_output_config,
+                  shape="1x1", make_data=None):
+    locations = str(tmp_path) + "/"
+    control = ControlPublisher()
+    pubs = SensorPublishers(n_topics, hz, shape=shape, make_data=make_data)
+    bases = [t + "_bench-" + output_module for t in pubs.topics]
+    writers = [start_writer(t, hz, b, output_module, locations, additional_output_config)
+               for t, b in zip(pubs.topics, bases)]
+    notices = CloseNotices(bases).start()
+    uploads = None
+    if _has_requests():
+        import threading
+        uploads = UploadServer().start()
+        stop_uploading = threading.Event()
+        uploader = threading.Thread(target=run_uploader,
+                                    args=(locations + "upload/", uploads.url, stop_uploading), daemon=True)
+        uploader.start()
+    # writers take a while to import their outputs and connect
+    _settle(3)
+    writer_stats = [ProcStats(p.pid).start() for p in writers]
+    stats = ProcStats().start()
+    pubs.start()
+    time.sleep(bench_seconds)
+    published = pubs.stop()
+    for t in pubs.topics:
+        control.send("exit", t + "_writer-process")
+    for p in writers:
+        p.join(10)
+    results = {**published, **stats.stop(), **notices.stop(),
+               "messages_per_s": published["messages"] / bench_seconds,
+               "writers": [s.stop() for s in writer_stats]}
+    if uploads is not None:
+        time.sleep(2)
+        stop_uploading.set()
+        results.update(uploads.stop(notices.closed))
+    control.close()
+    return results
+
+
+def _has_requests():
+    try:
+        import requests  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def test_wavpak_writer(tmp_path, n_topics, hz, bench_seconds, bench_results):
+    pytest.importorskip("pandas")
+    if shutil.which("wavpack") is None:
+        pytest.skip("wavpack isn't installed")
+    results = _writer_stage(tmp_path, n_topics, hz, bench_seconds, "wavpakOutput",
+                            {"input_dtype_str": "float32", "wv_dtype_str": "float32", "channels": 1})
+    bench_results.record("wavpak_writer", {"topics": n_topics, "hz": hz, "seconds": bench_seconds}, results)
+    assert results["files_closed"] > 0
+
+
+def test_video_writer(tmp_path, bench_seconds, bench_results):
+    pytest.importorskip("qoi")
+    pytest.importorskip("cv2")
+    hz = 8
+    frame = np.zeros((1, 540, 960, 3), dtype=np.uint8)
+
+    def make_frame():
+        frame[0, :, :, 0] = int(time.time() * 10) % 256
+        return frame
+
+    results = _writer_stage(tmp_path, 1, hz, bench_seconds, "videoOutput", {},
+                            shape="numpy-540x960x3", make_data=make_frame)
+    bench_results.record("video_writer", {"topics": 1, "hz": hz, "seconds": bench_seconds}, results)
+    assert results["messages"] > 0
+
+
+def test_sqlite_writer(tmp_path, n_topics, hz, bench_seconds, bench_results):
+    import sqlite3
+    control = ControlPublisher()
+    pubs = SensorPublishers(n_topics, hz)
+    write_location = str(tmp_path) + "/"
+    p = start_sqlite_writer(pubs.endpoints, pubs.topics, write_location)
+    _settle(3)
+    writer_stats = ProcStats(p.pid).start()
+    pubs.start()
+    time.sleep(bench_seconds)
+    published = pubs.stop()
+    # the writer commits every second
+    time.sleep(1.5)
+    control.send("exit", "sqlite")
+    p.join(10)
+    conn = sqlite3.connect(write_location + "data.db")
+    rows = sum(conn.execute('SELECT COUNT(*) FROM "' + t + '"').fetchone()[0]
+               for t in pubs.topics
+               if conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (t,)).fetchone())
+    conn.close()
+    control.close()
+    results = {**published, **writer_stats.stop(), "rows": rows,
+               "rows_per_s": rows / bench_seconds, "dropped": published["messages"] - rows,
+               "db_mb": os.path.getsize(write_location + "data.db") / 1024 / 1024}
+    bench_results.record("sqlite_writer", {"topics": n_topics, "hz": hz, "seconds": bench_seconds}, results)
+    assert rows > 0
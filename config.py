@@ -14,6 +14,20 @@ zmq_control_endpoint = f"ipc:///tmp/control.sock"
 zmq_control_requests_endpoint = f"ipc:///tmp/control_requests.sock"
 zmq_logger_endpoint = f"ipc:///tmp/{platform_uuid}_logger.sock"
 
+# with the broker on, publishers connect to the xsub endpoint and subscribers to the xpub endpoint
+# instead of every topic having its own socket, control messages still go direct to and from main
+use_broker = False
+zmq_broker_xsub_endpoint = f"ipc:///tmp/broker_xsub.sock"
+zmq_broker_xpub_endpoint = f"ipc:///tmp/broker_xpub.sock"
+
+# every process timestamps samples with one monotonic clock anchored to utc (platformUtils.clock),
+# ntp corrections smaller than step_threshold_ms are slewed in at max_slew_ppm, bigger ones are stepped
+clock_config = {
+    "resync_s": 1,
+    "step_threshold_ms": 100,
+    "max_slew_ppm": 500,
+}
+
 
 # this is the platform name
 platform_name = "raspberry_pi_5"
@@ -150,6 +164,18 @@ file_uploader_process_config = {
 #     },
 # }
 
+broker_process_config = {
+    "name": "broker",
+    "module_path": "platformUtils.processes.message_broker",
+    "func_name": "message_broker",
+    "short_name": "broker",
+    "time_to_shutdown": .1,
+    "debug_lvl": 20,
+    # per topic message and byte counts are published this often
+    "stats_interval_s": 10,
+    "stats_topic": "broker_stats",
+}
+
 ###########################################Platform Sensors###########################################
 
 #int16-f0 is 1 sign bit, 15 int bits, 0 decimal bits min is -32768, max is 32767 precision 1/2^0 = 1
@@ -199,6 +225,8 @@ i2c_controller_1_process_config = {
     "short_name": "i2c",
     "time_to_shutdown": .1,
     "bus_number": 1,
+    #run on a SimulatedI2C with every device an aSimulated, "simulation" adds latency/faults
+    "simulated": False,
     "debug_lvl": 5,
     "device_class_loc": repoPath + "unifiedSensorClient/sensors/i2cDeviceClasses/",
     "devices": [
@@ -220,6 +248,8 @@ i2c_controller_1_process_config = {
                     "shape": "numpy-1",
                     "hz": 16,
                     "grace_period_samples": 4,
+                    #publish read time and lateness histograms every minute, see "m" in main
+                    "metrics_interval_s": 60,
                     "topic": f"i2c-1-0x77_bosch-bme680_air-pressure_kpa_float_numpy-1_16hz",
                     "debug_lvl": 20,
                     "file_writer_config": {
@@ -322,6 +352,8 @@ i2c_controller_1_process_config = {
         #     "bus_location": "i2c-1-0x62",
         #     "address": 0x62,
         #     "debug_lvl": 5,
+        #     #slow reads, read it in its own thread so the bme680 keeps its timing
+        #     "threaded": True,
         #     "sensors_config": [
         #         {
         #             "sensor_type": "co2",
@@ -399,6 +431,8 @@ i2c_controller_1_process_config = {
         #     "bus_location": "i2c-1-0x12",
         #     "address": 0x12,
         #     "debug_lvl": 20,
+        #     #slow reads, read it in its own thread so the bme680 keeps its timing
+        #     "threaded": True,
         #     "sensors_config": [
         #         {
         #             "sensor_type": "air-particulate-pm1",
@@ -499,6 +533,8 @@ i2c_controller_0_process_config = {
     "short_name": "i2c",
     "time_to_shutdown": .1,
     "bus_number": 0,
+    #run on a SimulatedI2C with every device an aSimulated, "simulation" adds latency/faults
+    "simulated": False,
     "debug_lvl": 5,
     "device_class_loc": repoPath + "unifiedSensorClient/sensors/i2cDeviceClasses/",
     "devices": [
@@ -518,6 +554,9 @@ i2c_controller_0_process_config = {
                     "shape": "numpy-3",
                     "hz": 32,
                     "grace_period_samples": 1,
+                    #send 8 samples (250ms) per message
+                    "batch_samples": 8,
+                    "metrics_interval_s": 60,
                     "topic": f"i2c-0-0x4b_bosch-bno085_accel_mDsE2_float_numpy-3_32hz",
                     "debug_lvl": 20,
                     "file_writer_config": {
@@ -542,6 +581,8 @@ i2c_controller_0_process_config = {
                     "shape": "numpy-3",
                     "hz": 32,
                     "grace_period_samples": 1,
+                    #send 8 samples (250ms) per message
+                    "batch_samples": 8,
                     "topic": f"i2c-0-0x4b_bosch-bno085_gyro_radDs_float_numpy-3_32hz",
                     "debug_lvl": 20,
                     "file_writer_config": {
@@ -633,6 +674,8 @@ audio_controller_process_1_config = {
     "channels": 1,
     "dtype": "int16",
     "device": 1,  # USB PnP Sound Device: Audio (hw:3,0) - supports timing
+    # chunks go out as soon as the callback lands them, this is how often their latency is reported
+    "metrics_interval_s": 10,
     "file_writer_config": {
         "platform_uuid": platform_uuid,
         "output_module": "audioOutput",
@@ -644,6 +687,11 @@ audio_controller_process_1_config = {
 #c3dec556_csi-0_picamV3-sony-imx708-noir-120fov-12MP_image_BGR_uint8_1x960x540x3_8hz
 camera_topic = f"csi-0_{picamv3noirwide}_image_level_uint8_numpy-960x540x3_8hz"
 camera_endpoint = f"ipc:///tmp/{camera_topic}.sock"
+#derived from each camera frame by the video controller, see its derived_topics
+camera_gray_topic = f"csi-0_{picamv3noirwide}_image-gray_level_uint8_numpy-320x180x1_8hz"
+camera_gray_endpoint = f"ipc:///tmp/{camera_gray_topic}.sock"
+camera_yolo_topic = f"csi-0_{picamv3noirwide}_image-yolo_level_uint8_numpy-640x640x3_8hz"
+camera_yolo_endpoint = f"ipc:///tmp/{camera_yolo_topic}.sock"
 
 video_controller_process_1_config = {
     "module_name": "videoController",
@@ -657,6 +705,8 @@ video_controller_process_1_config = {
     "camera_module_name": "piCamera",
     "camera_class_name": "PiCamera",
     "camera_module_path": "sensors.videoDeviceClasses.piCamera",
+    #synthetic frames instead of the camera, "simulation" adds latency/faults
+    "simulated": False,
     
     "bus_location": "csi-0",
     "device_name": picamv3noirwide,
@@ -675,7 +725,25 @@ video_controller_process_1_config = {
     "subsample_ratio": 2,
     "format": "RGB888",
     "flip_vertical": True,
-    "timestamp_images": True,
+    #burn the time into every published frame, off so analyzers get clean frames,
+    #the stored video gets it from its output config's timestamp_overlay
+    "timestamp_images": False,
+    #the isp scales to camera_width/subsample_ratio and flips, "main" captures at that size,
+    #"lores" keeps the main stream full size and captures the scaled lores stream (pi 5 only)
+    "capture_stream": "main",
+    #buffers frames are captured into when they go over zmq, a buffer is reused once zmq has sent it
+    "frame_pool_slots": 4,
+    #frames go through a shared memory ring of this many slots, 0 sends them over zmq
+    #2 seconds at 8hz, subscribers that fall further behind than this skip frames
+    "shm_ring_slots": 16,
+    #smaller topics made from each frame, only computed while something subscribes to them,
+    #named like the camera's topic with this sensor_type and the new shape
+    "derived_topics": [
+        #for the motion and dark detectors
+        {"kind": "gray", "sensor_type": "image-gray", "width": 320, "height": 180},
+        #yolo's input size, padded top and bottom with 114 like yolo does
+        {"kind": "letterbox", "sensor_type": "image-yolo", "width": 640, "height": 640},
+    ],
 }
 
 
@@ -690,6 +758,8 @@ gps_capture_process_config = {
     "bus_location": "serial-0",
     "device_name": "cdtoptech-PA1616S",
     "port": "serial0",
+    #read made up fixes (or "simulation": {"path": an nmea log}) instead of the serial port
+    "simulated": False,
     "baudrate": 9600,
     "timeout": 10,
     "sensors": [
@@ -841,6 +911,10 @@ detector_timelapse_writer_process_config = {
     "completed_write_location_base": "/home/pi/data/upload/",
     "time_before_seconds": 16,
     "time_after_seconds": 24,
+    #recent frames are kept in ram, this also writes each one to disk as a .qoi so a crash doesn't lose the pre-roll
+    "preroll_spill": False,
+    #the pre-roll ring is cut to fewer frames than time_before_seconds needs rather than go over this
+    "preroll_max_mb": 256,
     
     "camera_endpoint": camera_endpoint,
     "camera_topic": camera_topic,
@@ -866,6 +940,8 @@ detector_timelapse_writer_process_config = {
         "codec": "libx264",
         "pix_fmt": "yuv420p",
         "x264_params": "scenecut=0",
+        #the frame's time burned in, only in this output
+        "timestamp_overlay": True,
     },
     
     "timelapse_output_config": {
@@ -883,6 +959,8 @@ detector_timelapse_writer_process_config = {
         "codec": "libx264",
         "pix_fmt": "yuv420p",
         "x264_params": "scenecut=0",
+        #the frame's time burned in, only in this output
+        "timestamp_overlay": True,
     },
 }
 
@@ -938,13 +1016,16 @@ yolo_person_detector_process_config = {
     "short_name": "yolo",
     "time_to_shutdown": 3,
     "debug_lvl": 20,
-    "camera_topic": camera_topic,
-    "camera_endpoint": camera_endpoint,
+    #the letterboxed frame is already yolo's input size, so it doesn't resize the full frame
+    "camera_topic": camera_yolo_topic,
+    "camera_endpoint": camera_yolo_endpoint,
     "pub_endpoint": f"ipc:///tmp/yolo11m_person_detection.sock",
     "pub_topic": f"yolo11m_person_detection",
     "model": "yolo11l",
     "confidence_threshold": 0.3,
     "interval_seconds": 8,
+    #only run on the newest frame, frames that arrive during inference are dropped
+    "conflate": True,
     "verbose": False,
 }
 
@@ -957,10 +1038,11 @@ yolo_person_detector_process_config = {
 #     "debug_lvl": 20,
 #     "pub_topic": f"{platform_uuid}_is_dark_detector",
 #     "pub_endpoint": f"ipc:///tmp/{platform_uuid}_is_dark_detector.sock",
-#     "camera_name": f"{platform_uuid}_csi-0_{picamv3noirwide}",
-#     "camera_endpoint": f"ipc:///tmp/{platform_uuid}_csi-0_{picamv3noirwide}.sock",
+#     "camera_name": camera_gray_topic,
+#     "camera_endpoint": camera_gray_endpoint,
 #     "threshold": 0.5,
 #     "interval_seconds": 1,
+#     "conflate": True,
 # }
 
 # motion_detector_process_config = {
@@ -972,10 +1054,11 @@ yolo_person_detector_process_config = {
 #     "debug_lvl": 10,
 #     "pub_topic": f"{platform_uuid}_motion_detector",
 #     "pub_endpoint": f"ipc:///tmp/{platform_uuid}_motion_detector.sock",
-#     "camera_name": f"{platform_uuid}_csi-0_{picamv3noirwide}",
-#     "camera_endpoint": f"ipc:///tmp/{platform_uuid}_csi-0_{picamv3noirwide}.sock",
+#     "camera_name": camera_gray_topic,
+#     "camera_endpoint": camera_gray_endpoint,
 #     "threshold": 50,
 #     "interval_seconds": 1,
+#     "conflate": True,
 # }
 
 ###########################################Platform Processes###########################################
@@ -988,7 +1071,7 @@ all_process_configs = {
     "video": [1, video_controller_process_1_config],
     "detector_timelapse": [1, detector_timelapse_writer_process_config],
     "yolo": [1, yolo_person_detector_process_config],
-#    "audio": [1, audio_controller_process_config],
+#    "audio": [1, audio_controller_process_1_config],
 #    "opus": [1, audio_writer_process_config],
 #    "dark": [0, is_dark_detector_process_config],
 #    "motion": [0, motion_detector_process_config],
@@ -15,15 +15,19 @@ from config import (
     all_process_configs,
     main_debug_lvl,
     logging_process_config,
+    use_broker,
+    broker_process_config,
 )
 from platformUtils.zmq_codec import ZmqCodec
 from platformUtils.processes.loggingProcess import logging_process
 from platformUtils.logUtils import worker_configurer
+from platformUtils.processes.message_broker import message_broker
 allow_dict = {s: ["all"] for s in all_process_configs.keys()}
 # Ensure logs from this process (typically "MainProcess") are allowed
 allow_dict[mp.current_process().name] = ["all"]
 # Ensure logs produced inside the logging process are allowed (we name it below)
 allow_dict["logging"] = ["all"]
+allow_dict[broker_process_config["short_name"]] = ["all"]
 deny_dict = {}
 
 def _start_processes_dynamically():
@@ -55,6 +59,8 @@ if __name__ == "__main__":
     req_sub = ctx.socket(zmq.SUB)
     req_sub.bind(zmq_control_requests_endpoint)
     req_sub.setsockopt(zmq.SUBSCRIBE, b"control")
+    # sensors with metrics_interval_s set publish their read time and lateness histograms here
+    req_sub.setsockopt(zmq.SUBSCRIBE, b"metrics")
     req_sub.setsockopt(zmq.RCVTIMEO, 10)
     print("main bound requests endpoint")
     sys.stdout.flush()
@@ -71,7 +77,16 @@ if __name__ == "__main__":
     max_time_to_shutdown = max(v[1].get("time_to_shutdown") for v in all_process_configs.values())
 
 
+    # the broker has to be up before anything publishes through it
+    broker_process = None
+    if use_broker:
+        broker_process = mp.Process(target=message_broker, name=broker_process_config["short_name"], args=(broker_process_config,))
+        broker_process.start()
+        l.info("main started message broker")
+
     processes = _start_processes_dynamically()
+    # sensor topic -> [dt, topic, metrics], the latest from each sensor
+    latest_metrics = {}
 
 
     def _start_process(process_name):
@@ -175,6 +190,22 @@ if __name__ == "__main__":
                 pub.send_multipart(ZmqCodec.encode("control", ["log", "d",target_process, target_method]))
             return
 
+        elif command[0] == "m":
+            # usage: m [topic substring]
+            l.info(f"main got metrics command")
+            match = command[1] if len(command) > 1 else ""
+            if not latest_metrics:
+                print("no metrics yet, set metrics_interval_s on a sensor to publish them")
+            for topic, (dt, _, m) in sorted(latest_metrics.items()):
+                if match not in topic:
+                    continue
+                print(f"{topic} at {dt} over {m['interval_s']}s")
+                # every histogram in the report, read_us and late_us from sensors, chunk_to_publish_us from audio
+                for name, h in m.items():
+                    if name.endswith("_us") and isinstance(h, dict):
+                        print(f"    {name[:-3]} us  n={h['count']} mean={h['mean_us']:.0f} p50<={h['p50_us']} p99<={h['p99_us']} max={h['max_us']}")
+            return
+
         elif command[0] == "h":
             l.info(f"main got help command")
             print("Available commands:")
@@ -182,6 +213,7 @@ if __name__ == "__main__":
             print("e: Start a process")
             print("l: List active processes and possible processes")
             print("d: Stop a process")
+            print("m [topic]: Show the latest sensor read time, lateness and audio publish latency metrics")
             print("h: Show this help message")
             return
         else:
@@ -201,16 +233,24 @@ if __name__ == "__main__":
                 l.error(f"main process {p} is alive: {processes[p].is_alive()}")
             _exit_all()
             break
+        if broker_process is not None and not broker_process.is_alive():
+            l.error("main message broker exited")
+            _exit_all()
+            break
 
         try:
             # 1) Drain requests from workers and respond
             try:
-                parts = req_sub.recv_multipart()
-                topic, obj = ZmqCodec.decode(parts)
-                l.debug(f"main got request: {obj}")
-                # Only handle status requests here and reply via control PUB
-                if topic == "control" and obj and obj[0] == "status" and len(obj) >= 2:
-                    _is_process_running(obj[1])
+                while True:
+                    parts = req_sub.recv_multipart()
+                    topic, obj = ZmqCodec.decode(parts)
+                    if topic == "metrics":
+                        latest_metrics[obj[1]] = obj
+                        continue
+                    l.debug(f"main got request: {obj}")
+                    # Only handle status requests here and reply via control PUB
+                    if topic == "control" and obj and obj[0] == "status" and len(obj) >= 2:
+                        _is_process_running(obj[1])
             except zmq.Again:
                 pass
 
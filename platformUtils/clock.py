@@ -0,0 +1,122 @@
+import logging
+import time
+from datetime import datetime
+
+from platformUtils.zmq_codec import ns_to_datetime
+
+
+class ClockService:
+    """
+    UTC time from time.monotonic_ns() plus an offset, so samples are stamped on
+    a clock that never jumps when ntp adjusts the system clock.
+    The offset is checked against the system clock every resync_s:
+    - differences under step_threshold_ms are slewed in at max_slew_ppm, so
+      consecutive timestamps never go backwards or skip a grid slot
+    - bigger ones (a first ntp sync, a manual date change) are stepped, counted and logged
+    """
+
+    def __init__(self, resync_s=1, step_threshold_ms=100, max_slew_ppm=500, samples=3):
+        self.resync_ns = int(resync_s * 1_000_000_000)
+        self.step_threshold_ns = int(step_threshold_ms * 1_000_000)
+        self.max_slew_ppm = max_slew_ppm
+        self.samples = samples
+        self.l = logging.getLogger("clock")
+
+        # (mono ns the slew started, offset then, offset it's slewing to), replaced whole
+        # so a reader on another thread (the audio callback) never sees half an update
+        offset = self._measure()
+        self._slew = (time.monotonic_ns(), offset, offset)
+        self.next_resync_ns = time.monotonic_ns() + self.resync_ns
+        self.steps = 0
+        self.last_error_ns = 0
+        self.max_error_ns = 0
+
+    def _measure(self):
+        """system wall minus monotonic, from the tightest of a few paired reads"""
+        best = None
+        for _ in range(self.samples):
+            m0 = time.monotonic_ns()
+            w = time.time_ns()
+            m1 = time.monotonic_ns()
+            if best is None or m1 - m0 < best[0]:
+                best = (m1 - m0, w - (m0 + m1) // 2)
+        return best[1]
+
+    def _offset_at(self, mono_ns):
+        start_ns, offset, target = self._slew
+        err = target - offset
+        if err == 0:
+            return offset
+        max_ns = (mono_ns - start_ns) * self.max_slew_ppm // 1_000_000
+        if err > max_ns:
+            return offset + max_ns
+        if err < -max_ns:
+            return offset - max_ns
+        return target
+
+    def resync(self):
+        """compare against the system clock and start a slew or step towards it"""
+        mono_ns = time.monotonic_ns()
+        current = self._offset_at(mono_ns)
+        measured = self._measure()
+        err = measured - current
+        self.last_error_ns = err
+        self.max_error_ns = max(self.max_error_ns, abs(err))
+        if abs(err) > self.step_threshold_ns:
+            self.steps += 1
+            self.l.warning("system clock moved " + f"{err / 1_000_000:.1f}" + "ms, stepping")
+            self._slew = (mono_ns, measured, measured)
+        else:
+            self._slew = (mono_ns, current, measured)
+        self.next_resync_ns = mono_ns + self.resync_ns
+
+    def offset_ns(self):
+        """utc minus monotonic right now"""
+        mono_ns = time.monotonic_ns()
+        if mono_ns >= self.next_resync_ns:
+            self.resync()
+        return self._offset_at(mono_ns)
+
+    def now_ns(self):
+        mono_ns = time.monotonic_ns()
+        if mono_ns >= self.next_resync_ns:
+            self.resync()
+        return mono_ns + self._offset_at(mono_ns)
+
+    def now(self) -> datetime:
+        return ns_to_datetime(self.now_ns())
+
+    def mono_to_wall_ns(self, mono_ns):
+        """utc ns for a monotonic ns (or an array of them) taken recently"""
+        return mono_ns + self.offset_ns()
+
+    def sleep_to_grid(self, hz):
+        """sleep until the next 1/hz boundary, whole seconds are on the grid for integer hz"""
+        period_ns = int(1_000_000_000 / hz)
+        now_ns = self.now_ns()
+        second_ns = now_ns % 1_000_000_000
+        time.sleep((period_ns - second_ns % period_ns) / 1_000_000_000)
+
+    def metrics(self):
+        """how far the system clock was from this one at the last resync, the worst so far, and how many steps"""
+        return {
+            "offset_us": self.last_error_ns / 1000,
+            "max_offset_us": self.max_error_ns / 1000,
+            "slewing": self._slew[1] != self._slew[2],
+            "steps": self.steps,
+        }
+
+
+_clock = None
+
+
+def get_clock():
+    """the process's ClockService, made from config.clock_config on first use"""
+    global _clock
+    if _clock is None:
+        try:
+            from config import clock_config
+        except ImportError:
+            clock_config = {}
+        _clock = ClockService(**clock_config)
+    return _clock
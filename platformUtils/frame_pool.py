@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class FramePool:
+    """
+    Preallocated frame buffers for a camera to capture into, so a frame is
+    written once and handed to zmq without being copied again.
+    - acquire() gives the next buffer zmq is done with
+    - track(frame, tracker) is the Sensor's on_sent hook, it keeps the
+      MessageTracker of a zero copy send so the buffer isn't reused until
+      zmq has finished sending it
+    if every buffer is still in flight acquire() makes a new one and counts it,
+    a slow subscriber costs an allocation instead of a torn frame
+    - fill: what the buffers start out holding, for frames that only write part of them
+    """
+
+    def __init__(self, n_slots, shape, dtype=np.uint8, fill=0):
+        self.n_slots = n_slots
+        self.fill = fill
+        self.frames = np.full((n_slots,) + tuple(shape), fill, dtype=dtype)
+        self.trackers = [None] * n_slots
+        # buffer address -> slot, so track() is a dict lookup
+        self._slot_of = {self.frames[i].ctypes.data: i for i in range(n_slots)}
+        self.next_slot = 0
+        self.misses = 0
+
+    def acquire(self):
+        for _ in range(self.n_slots):
+            slot = self.next_slot
+            self.next_slot = (slot + 1) % self.n_slots
+            tracker = self.trackers[slot]
+            if tracker is None or tracker.done:
+                self.trackers[slot] = None
+                return self.frames[slot]
+        self.misses += 1
+        return np.full_like(self.frames[0], self.fill)
+
+    def track(self, frame, tracker):
+        slot = self._slot_of.get(frame.ctypes.data)
+        if slot is not None:
+            self.trackers[slot] = tracker
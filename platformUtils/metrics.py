@@ -0,0 +1,59 @@
+import math
+
+
+class Histogram:
+    """
+    Fixed log2 buckets of whole microseconds, cheap enough to update on every read.
+    bucket 0 is < 1us, bucket i holds [2^(i-1), 2^i) us, the last bucket holds everything above.
+    """
+
+    def __init__(self, n_buckets=24):
+        self.n_buckets = n_buckets
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * self.n_buckets
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def add(self, us):
+        us = int(us)
+        if us < 0:
+            us = 0
+        b = us.bit_length()
+        if b >= self.n_buckets:
+            b = self.n_buckets - 1
+        self.counts[b] += 1
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    @staticmethod
+    def bucket_upper_us(b):
+        return 1 << b
+
+    def percentile(self, p):
+        """upper edge of the bucket the p-th percentile falls in, in microseconds"""
+        if self.count == 0:
+            return 0
+        target = math.ceil(self.count * p / 100)
+        seen = 0
+        for b, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                if b == self.n_buckets - 1:
+                    return self.max_us
+                return min(self.bucket_upper_us(b), self.max_us)
+        return self.max_us
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total_us / self.count if self.count else 0,
+            "p50_us": self.percentile(50),
+            "p99_us": self.percentile(99),
+            "max_us": self.max_us,
+            "counts": list(self.counts),
+        }
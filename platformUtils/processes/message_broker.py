@@ -0,0 +1,85 @@
+import sys
+import time
+import zmq
+
+repoPath = "/home/pi/Documents/"
+sys.path.append(repoPath + "unifiedSensorClient/")
+from platformUtils.zmq_codec import ZmqCodec
+from platformUtils.utils import configure_process, should_exit
+from config import zmq_broker_xsub_endpoint, zmq_broker_xpub_endpoint
+
+
+#publishers connect to the xsub side, subscribers connect to the xpub side
+#subscriptions flow back from xpub to xsub so publishers only send what someone wants
+def message_broker(config):
+    l, sub, signal_handler = configure_process(config)
+    ctx = zmq.Context.instance()
+
+    xsub = ctx.socket(zmq.XSUB)
+    xsub.bind(zmq_broker_xsub_endpoint)
+    xpub = ctx.socket(zmq.XPUB)
+    xpub.bind(zmq_broker_xpub_endpoint)
+    l.info(" broker forwarding " + zmq_broker_xsub_endpoint + " -> " + zmq_broker_xpub_endpoint)
+
+    poller = zmq.Poller()
+    poller.register(sub, zmq.POLLIN)
+    poller.register(xsub, zmq.POLLIN)
+    poller.register(xpub, zmq.POLLIN)
+
+    stats_interval_s = config.get("stats_interval_s", 10)
+    stats_topic = config.get("stats_topic", "broker_stats")
+    #topic -> [messages, bytes] since the broker started
+    counts = {}
+    last_counts = {}
+    last_stats = time.monotonic()
+    next_stats = last_stats + stats_interval_s
+
+    def publish_stats(elapsed_s):
+        stats = {}
+        for topic, (msgs, nbytes) in counts.items():
+            last_msgs, last_bytes = last_counts.get(topic, (0, 0))
+            stats[topic] = {
+                "messages": msgs,
+                "bytes": nbytes,
+                "messages_per_s": (msgs - last_msgs) / elapsed_s,
+                "bytes_per_s": (nbytes - last_bytes) / elapsed_s,
+            }
+            last_counts[topic] = (msgs, nbytes)
+        xpub.send_multipart(ZmqCodec.encode(stats_topic, [stats]))
+        total = sum(s["bytes_per_s"] for s in stats.values())
+        l.debug(" broker forwarding " + str(len(stats)) + " topics at " + str(int(total)) + " B/s")
+
+    while not signal_handler.stop:
+        timeout_ms = max(0, int((next_stats - time.monotonic()) * 1000))
+        events = dict(poller.poll(timeout_ms))
+
+        if xsub in events:
+            parts = xsub.recv_multipart(copy=False)
+            topic = parts[0].bytes.decode(errors="replace")
+            c = counts.get(topic)
+            if c is None:
+                c = counts[topic] = [0, 0]
+                l.info(" broker saw new topic: " + topic)
+            c[0] += 1
+            c[1] += sum(len(p) for p in parts)
+            xpub.send_multipart(parts, copy=False)
+
+        if xpub in events:
+            #subscribe/unsubscribe messages from the subscribers
+            xsub.send_multipart(xpub.recv_multipart())
+
+        if sub in events:
+            topic, msg = ZmqCodec.decode(sub.recv_multipart())
+            if should_exit(topic, msg, config["name"]):
+                break
+
+        now = time.monotonic()
+        if now >= next_stats:
+            publish_stats(now - last_stats)
+            last_stats = now
+            next_stats = now + stats_interval_s
+
+    xsub.close(0)
+    xpub.close(0)
+    sub.close(0)
+    l.info(" broker exiting")
@@ -0,0 +1,223 @@
+import os
+import numpy as np
+from multiprocessing import shared_memory
+
+
+# header layout (int64 words)
+# [magic, token, n_slots, ndim, shape0 .. shape5]  then the dtype string at byte 128
+_MAGIC = 0x55534352494E4731  # "USCRING1"
+_HEADER_WORDS = 4
+_MAX_DIMS = 6
+_DTYPE_OFFSET = 128
+_DTYPE_LEN = 16
+_GENERATIONS_OFFSET = 256
+_WRITING = -1
+
+
+def ring_name(topic: str) -> str:
+    """name of the shared memory segment that carries frames for a topic"""
+    return topic + "_ring"
+
+
+# segments created by this process, the resource tracker already knows about them
+_created = set()
+
+
+def _open_shm(name):
+    if name in _created:
+        return shared_memory.SharedMemory(name=name)
+    # consumers shouldn't unlink the producer's segment when they exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class ShmFrameRing:
+    """
+    A fixed number of frame slots in shared memory.
+    - the producer writes a frame into the next slot and publishes [dt, slot, generation]
+    - consumers map the same segment and read the slot in place
+    - every slot carries the generation that was last written to it, so a
+      consumer can tell when its slot has been overwritten (or is mid write)
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.name = shm.name
+
+        header = np.ndarray((_HEADER_WORDS + _MAX_DIMS,), dtype=np.int64, buffer=shm.buf)
+        if header[0] != _MAGIC:
+            raise ValueError("shared memory " + shm.name + " is not a frame ring")
+        self.token = int(header[1])
+        self.n_slots = int(header[2])
+        ndim = int(header[3])
+        self.frame_shape = tuple(int(d) for d in header[_HEADER_WORDS:_HEADER_WORDS + ndim])
+        del header
+        dtype_str = bytes(shm.buf[_DTYPE_OFFSET:_DTYPE_OFFSET + _DTYPE_LEN]).rstrip(b"\0").decode()
+        self.dtype = np.dtype(dtype_str)
+
+        self.generations = np.ndarray((self.n_slots,), dtype=np.int64,
+                                      buffer=shm.buf, offset=_GENERATIONS_OFFSET)
+        self.frames = np.ndarray((self.n_slots,) + self.frame_shape, dtype=self.dtype,
+                                 buffer=shm.buf, offset=self._frames_offset(self.n_slots))
+        self._next_generation = int(self.generations.max()) + 1
+        self._reserved = None
+
+    @staticmethod
+    def _frames_offset(n_slots):
+        end_of_generations = _GENERATIONS_OFFSET + 8 * n_slots
+        return (end_of_generations + 63) // 64 * 64
+
+    @classmethod
+    def create(cls, name, n_slots, frame_shape, dtype):
+        frame_shape = tuple(int(d) for d in frame_shape)
+        if len(frame_shape) > _MAX_DIMS:
+            raise ValueError("frame has too many dimensions for a frame ring: " + str(frame_shape))
+        dtype = np.dtype(dtype)
+        size = cls._frames_offset(n_slots) + n_slots * int(np.prod(frame_shape)) * dtype.itemsize
+
+        # a segment left behind by a crashed producer
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created.add(name)
+        header = np.ndarray((_HEADER_WORDS + _MAX_DIMS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        # lets consumers tell a restarted producer's segment from the one they mapped
+        header[1] = int.from_bytes(os.urandom(7), "little")
+        header[2] = n_slots
+        header[3] = len(frame_shape)
+        header[_HEADER_WORDS:_HEADER_WORDS + len(frame_shape)] = frame_shape
+        dtype_b = dtype.str.encode().ljust(_DTYPE_LEN, b"\0")
+        shm.buf[_DTYPE_OFFSET:_DTYPE_OFFSET + _DTYPE_LEN] = dtype_b
+        np.ndarray((n_slots,), dtype=np.int64, buffer=shm.buf, offset=_GENERATIONS_OFFSET)[:] = 0
+        # written last so a consumer never sees a half built header
+        header[0] = _MAGIC
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(_open_shm(name), owner=False)
+
+    def reserve(self):
+        """
+        the next slot to write into directly, e.g. a camera capturing straight into the ring.
+        it's marked as being written until write() is called with it (which then doesn't copy)
+        """
+        slot = self._next_generation % self.n_slots
+        self.generations[slot] = _WRITING
+        self._reserved = slot
+        return self.frames[slot]
+
+    def write(self, frame):
+        """copy frame into the next slot, returns (slot, generation)"""
+        generation = self._next_generation
+        slot = generation % self.n_slots
+        self.generations[slot] = _WRITING
+        if self._reserved != slot or not np.shares_memory(frame, self.frames[slot]):
+            np.copyto(self.frames[slot], np.reshape(frame, self.frame_shape), casting="unsafe")
+        self._reserved = None
+        self.generations[slot] = generation
+        self._next_generation += 1
+        return slot, generation
+
+    def is_current(self, slot, generation):
+        return int(self.generations[slot]) == generation
+
+    def read(self, slot, generation):
+        """a view of the slot, or None if it no longer holds that generation
+
+        The view is only valid while the slot isn't reused, check is_current
+        after using it (or copy it) if the consumer is slow.
+        """
+        if not self.is_current(slot, generation):
+            return None
+        return self.frames[slot]
+
+    def close(self):
+        # drop our views before closing the mapping
+        self.generations = None
+        self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # a caller still holds a frame view, the mapping goes when that does
+            pass
+        if self.owner:
+            _created.discard(self.name)
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class FrameSource:
+    """
+    Resolves camera messages into frames.
+    Messages are either [dt, frame] or a ring notification [dt, slot, generation],
+    the ring is attached the first time a notification shows up.
+    """
+
+    def __init__(self, topic):
+        self.topic = topic
+        self.ring = None
+
+    def _attach(self):
+        # the producer's segment is gone while it restarts, the frame is missing until it's back
+        try:
+            self.ring = ShmFrameRing.attach(ring_name(self.topic))
+        except FileNotFoundError:
+            self.ring = None
+        return self.ring is not None
+
+    def _reattach_if_replaced(self):
+        # the producer restarted and made a new segment under the same name
+        try:
+            latest = ShmFrameRing.attach(ring_name(self.topic))
+        except FileNotFoundError:
+            #not made again yet, the old mapping is kept
+            return False
+        if latest.token == self.ring.token:
+            latest.close()
+            return False
+        self.ring.close()
+        self.ring = latest
+        return True
+
+    def frame(self, msg, copy=False):
+        """the frame for msg, or None if its slot was overwritten before we got to it"""
+        if len(msg) < 3:
+            return msg[1]
+        _, slot, generation = msg[0], msg[1], msg[2]
+        if self.ring is None and not self._attach():
+            return None
+
+        frame = self.ring.read(slot, generation)
+        if frame is None and self._reattach_if_replaced():
+            frame = self.ring.read(slot, generation)
+        if frame is None:
+            return None
+        if copy:
+            frame = frame.copy()
+            if not self.ring.is_current(slot, generation):
+                return None
+        return frame
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
@@ -0,0 +1,44 @@
+import time
+
+from platformUtils import clock as clock_module
+from platformUtils.clock import ClockService
+
+
+def _fake_wall(monkeypatch, shift_ns):
+    """the system clock reads shift_ns[0] away from where it really is"""
+    real = time.time_ns
+    monkeypatch.setattr(clock_module.time, "time_ns", lambda: real() + shift_ns[0])
+
+
+def test_small_corrections_are_slewed(monkeypatch):
+    shift = [0]
+    _fake_wall(monkeypatch, shift)
+    c = ClockService(resync_s=0, step_threshold_ms=100, max_slew_ppm=500)
+    before = c.now_ns()
+    shift[0] = -50_000_000  # ntp pulls the clock back 50ms
+    c.resync()
+    assert c.metrics()["slewing"]
+    assert c.steps == 0
+    # the clock keeps going forwards while the correction is slewed in
+    after = c.now_ns()
+    assert after > before
+    assert abs(c.metrics()["offset_us"] + 50_000) < 5_000
+
+
+def test_big_jumps_are_stepped(monkeypatch):
+    shift = [0]
+    _fake_wall(monkeypatch, shift)
+    c = ClockService(resync_s=3600, step_threshold_ms=100)
+    shift[0] = 5_000_000_000
+    c.resync()
+    assert c.steps == 1
+    assert abs(c.now_ns() - time.time_ns()) < 5_000_000
+
+
+def test_slew_is_rate_limited():
+    c = ClockService(resync_s=3600, max_slew_ppm=1000)
+    start_ns, offset, _ = c._slew
+    c._slew = (start_ns, offset, offset + 1_000_000)
+    # 1000ppm for a second is 1ms, half way after half a second
+    assert c._offset_at(start_ns + 500_000_000) == offset + 500_000
+    assert c._offset_at(start_ns + 2_000_000_000) == offset + 1_000_000
@@ -0,0 +1,32 @@
+import numpy as np
+
+from platformUtils.frame_pool import FramePool
+
+
+class _Tracker:
+    def __init__(self, done=False):
+        self.done = done
+
+
+def test_buffers_in_flight_are_not_reused():
+    pool = FramePool(2, (1, 4, 4, 3))
+    a = pool.acquire()
+    pool.track(a, _Tracker(done=False))
+    b = pool.acquire()
+    assert not np.shares_memory(a, b)
+    pool.track(b, _Tracker(done=True))
+    # a is still being sent, so b comes round again
+    assert np.shares_memory(pool.acquire(), b)
+    assert pool.misses == 0
+
+
+def test_all_in_flight_allocates_instead_of_blocking():
+    pool = FramePool(2, (4,), np.int16)
+    for _ in range(2):
+        pool.track(pool.acquire(), _Tracker())
+    extra = pool.acquire()
+    assert extra.shape == (4,) and extra.dtype == np.int16
+    assert not any(np.shares_memory(extra, f) for f in pool.frames)
+    assert pool.misses == 1
+    # frames that aren't the pool's are ignored
+    pool.track(extra, _Tracker())
@@ -0,0 +1,25 @@
+from platformUtils.metrics import Histogram
+
+
+def test_buckets_and_percentiles():
+    h = Histogram(n_buckets=8)
+    for us in [0, 1, 3, 3, 100, 1_000_000]:
+        h.add(us)
+    assert h.counts[0] == 1
+    assert h.counts[1] == 1
+    assert h.counts[2] == 2
+    # anything past the last bucket lands in it
+    assert h.counts[7] == 2
+    assert h.count == 6
+    assert h.max_us == 1_000_000
+    assert h.percentile(50) == 4
+    assert h.percentile(100) == 1_000_000
+
+
+def test_reset_and_empty():
+    h = Histogram()
+    assert h.percentile(99) == 0
+    h.add(5)
+    h.reset()
+    assert h.to_dict()["count"] == 0
+    assert sum(h.to_dict()["counts"]) == 0
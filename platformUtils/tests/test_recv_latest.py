@@ -0,0 +1,56 @@
+import time
+import zmq
+from datetime import datetime, timezone
+
+from platformUtils.zmq_codec import ZmqCodec
+from platformUtils.utils import recv_latest
+
+
+def _pair(name):
+    ctx = zmq.Context.instance()
+    pub = ctx.socket(zmq.PUB)
+    sub = ctx.socket(zmq.SUB)
+    pub.bind("inproc://" + name)
+    sub.connect("inproc://" + name)
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    time.sleep(0.05)
+    return pub, sub
+
+
+def _send(pub, topic, value):
+    pub.send_multipart(ZmqCodec.encode(topic, [datetime.now(timezone.utc), value]))
+
+
+def test_only_newest_message_per_topic_is_returned():
+    pub, sub = _pair("latest_per_topic")
+    try:
+        for i in range(5):
+            _send(pub, "camera", i)
+        _send(pub, "other", 10)
+        _send(pub, "other", 11)
+        time.sleep(0.05)
+
+        topic, msg = recv_latest(sub)
+        assert (topic, msg[1]) == ("camera", 4)
+        topic, msg = recv_latest(sub)
+        assert (topic, msg[1]) == ("other", 11)
+        assert sub.poll(0) == 0
+    finally:
+        pub.close(0)
+        sub.close(0)
+
+
+def test_control_messages_are_not_dropped():
+    pub, sub = _pair("latest_control")
+    try:
+        _send(pub, "camera", 1)
+        pub.send_multipart(ZmqCodec.encode("control", ["exit", "yolo"]))
+        _send(pub, "camera", 2)
+        time.sleep(0.05)
+
+        assert recv_latest(sub) == ("control", ["exit", "yolo"])
+        topic, msg = recv_latest(sub)
+        assert (topic, msg[1]) == ("camera", 2)
+    finally:
+        pub.close(0)
+        sub.close(0)
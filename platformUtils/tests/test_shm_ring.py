@@ -0,0 +1,115 @@
+import os
+import numpy as np
+from datetime import datetime, timezone
+
+from platformUtils.shm_ring import ShmFrameRing, FrameSource, ring_name
+
+
+def _topic():
+    return "test_camera_" + str(os.getpid())
+
+
+def test_write_then_read_in_place():
+    ring = ShmFrameRing.create(ring_name(_topic()), 4, (1, 8, 8, 3), np.uint8)
+    try:
+        consumer = ShmFrameRing.attach(ring_name(_topic()))
+        frame = np.full((1, 8, 8, 3), 7, dtype=np.uint8)
+        slot, generation = ring.write(frame)
+        out = consumer.read(slot, generation)
+        assert np.array_equal(out, frame)
+        assert consumer.frame_shape == (1, 8, 8, 3)
+        assert consumer.dtype == np.uint8
+        del out
+        consumer.close()
+    finally:
+        ring.close()
+
+
+def test_overwritten_slot_reads_none():
+    ring = ShmFrameRing.create(ring_name(_topic()), 2, (4,), np.int16)
+    try:
+        first = ring.write(np.arange(4, dtype=np.int16))
+        ring.write(np.arange(4, dtype=np.int16))
+        assert ring.read(*first) is not None
+        ring.write(np.arange(4, dtype=np.int16))
+        assert ring.read(*first) is None
+    finally:
+        ring.close()
+
+
+def test_frame_source_handles_inline_and_ring_messages():
+    topic = _topic()
+    dt = datetime.now(timezone.utc)
+    frames = FrameSource(topic)
+    inline = np.ones((1, 2, 2, 3), dtype=np.uint8)
+    assert frames.frame([dt, inline]) is inline
+
+    ring = ShmFrameRing.create(ring_name(topic), 4, (1, 2, 2, 3), np.uint8)
+    try:
+        slot, generation = ring.write(inline * 3)
+        out = frames.frame([dt, slot, generation], copy=True)
+        assert np.array_equal(out, inline * 3)
+        assert out.flags.owndata
+    finally:
+        frames.close()
+        ring.close()
+
+
+def test_frame_source_follows_a_restarted_producer():
+    topic = _topic()
+    dt = datetime.now(timezone.utc)
+    frames = FrameSource(topic)
+    ring = ShmFrameRing.create(ring_name(topic), 4, (3,), np.float32)
+    try:
+        assert frames.frame([dt, *ring.write(np.zeros(3, dtype=np.float32))]) is not None
+        ring.close()
+
+        ring = ShmFrameRing.create(ring_name(topic), 4, (3,), np.float32)
+        ring.write(np.zeros(3, dtype=np.float32))
+        slot, generation = ring.write(np.full(3, 2, dtype=np.float32))
+        out = frames.frame([dt, slot, generation], copy=True)
+        assert np.array_equal(out, np.full(3, 2, dtype=np.float32))
+    finally:
+        frames.close()
+        ring.close()
+
+
+def test_frame_source_misses_frames_while_the_producer_is_gone():
+    topic = _topic()
+    dt = datetime.now(timezone.utc)
+    frames = FrameSource(topic)
+    # nothing to attach to yet
+    assert frames.frame([dt, 0, 0]) is None
+
+    ring = ShmFrameRing.create(ring_name(topic), 2, (3,), np.float32)
+    try:
+        ring.write(np.zeros(3, dtype=np.float32))
+        assert frames.frame([dt, 0, 0]) is not None
+        # the producer unlinked its segment and hasn't made a new one
+        ring.close()
+        assert frames.frame([dt, 1, 5]) is None
+
+        ring = ShmFrameRing.create(ring_name(topic), 2, (3,), np.float32)
+        ring.write(np.zeros(3, dtype=np.float32))
+        slot, generation = ring.write(np.ones(3, dtype=np.float32))
+        assert np.array_equal(frames.frame([dt, slot, generation], copy=True), np.ones(3, dtype=np.float32))
+    finally:
+        frames.close()
+        ring.close()
+
+
+def test_reserved_slot_is_written_in_place():
+    ring = ShmFrameRing.create(ring_name(_topic()), 2, (4,), np.int16)
+    try:
+        buf = ring.reserve()
+        slot = ring._reserved
+        # a reserved slot reads as mid write until it's committed
+        assert not ring.is_current(slot, ring._next_generation)
+        buf[:] = [1, 2, 3, 4]
+        assert ring.write(buf) == (slot, 1)
+        assert np.array_equal(ring.read(slot, 1), [1, 2, 3, 4])
+        # anything else is still copied in
+        slot, generation = ring.write(np.arange(4, dtype=np.int16))
+        assert np.array_equal(ring.read(slot, generation), np.arange(4))
+    finally:
+        ring.close()
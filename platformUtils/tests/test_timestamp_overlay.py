@@ -0,0 +1,38 @@
+from datetime import timezone
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+from platformUtils.timestamp_overlay import TimestampOverlay
+
+
+def test_matches_put_text_and_only_touches_the_text():
+    overlay = TimestampOverlay(tz=timezone.utc)
+    frame = np.full((270, 480, 3), 40, dtype=np.uint8)
+    ns = 1_700_000_000_123_456_789
+    expected = frame.copy()
+    cv2.putText(expected, "2023-11-14 22:13:20 +0000", (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 1,
+                (0, 255, 0), 2, cv2.LINE_AA)
+    overlay.draw(frame, ns)
+    # blending rounds a little differently than putText's own anti aliasing
+    assert np.abs(frame.astype(int) - expected).max() <= 2
+    assert (frame[60:] == 40).all()
+
+
+def test_text_is_rendered_once_a_second():
+    overlay = TimestampOverlay(tz=timezone.utc)
+    frame = np.zeros((100, 500, 3), dtype=np.uint8)
+    overlay.draw(frame, 5_000_000_000)
+    key = overlay.key
+    overlay.draw(frame, 5_900_000_000)
+    assert overlay.key is key
+    overlay.draw(frame, 6_000_000_000)
+    assert overlay.key != key
+
+
+def test_clipped_to_small_frames():
+    overlay = TimestampOverlay(tz=timezone.utc)
+    frame = np.zeros((40, 60, 3), dtype=np.uint8)
+    overlay.draw(frame, 0)
+    assert frame.any()
@@ -0,0 +1,124 @@
+import numpy as np
+import msgpack
+import zmq
+from datetime import datetime, timezone
+
+from platformUtils.zmq_codec import ZmqCodec, EpochNs, datetime_to_ns
+from zoneinfo import ZoneInfo
+
+
+def _frame():
+    return np.arange(540 * 960 * 3, dtype=np.uint8).reshape(1, 540, 960, 3)
+
+
+def test_msgpack_roundtrip():
+    dt = datetime(2026, 1, 7, 12, 30, 15, 250000, tzinfo=timezone.utc)
+    data = np.array([[1.5, 2.5, 3.5]], dtype=np.float32)
+    topic, (dt_out, data_out) = ZmqCodec.decode(ZmqCodec.encode("i2c_test", [dt, data]))
+    assert topic == "i2c_test"
+    assert dt_out == dt
+    assert np.array_equal(data_out, data)
+    assert data_out.dtype == data.dtype
+
+
+def test_multipart_puts_large_arrays_in_their_own_frames():
+    dt = datetime(2026, 1, 7, tzinfo=timezone.utc)
+    frame = _frame()
+    small = np.array([1, 2, 3], dtype=np.int16)
+    parts = ZmqCodec.encode("camera", [dt, frame, small], zero_copy=True)
+    assert parts[1] == b"MULTIPART"
+    # topic, encoding, header and exactly one buffer frame (the small array stays inline)
+    assert len(parts) == 4
+    assert len(parts[2]) < 256
+
+    topic, (dt_out, frame_out, small_out) = ZmqCodec.decode(parts)
+    assert topic == "camera"
+    assert dt_out == dt
+    assert np.array_equal(frame_out, frame)
+    assert np.array_equal(small_out, small)
+
+
+def test_multipart_decode_does_not_copy_received_frames():
+    ctx = zmq.Context()
+    push = ctx.socket(zmq.PAIR)
+    pull = ctx.socket(zmq.PAIR)
+    push.bind("inproc://codec_test")
+    pull.connect("inproc://codec_test")
+    try:
+        frame = _frame()
+        push.send_multipart(ZmqCodec.encode("camera", [datetime.now(timezone.utc), frame], zero_copy=True), copy=False)
+        parts = pull.recv_multipart(copy=False)
+        _, (_, frame_out) = ZmqCodec.decode(parts)
+        assert np.array_equal(frame_out, frame)
+        assert not frame_out.flags.owndata
+        assert np.shares_memory(frame_out, np.frombuffer(parts[3].buffer, dtype=np.uint8))
+    finally:
+        push.close(0)
+        pull.close(0)
+        ctx.term()
+
+
+def test_non_contiguous_arrays_are_sent_contiguous():
+    frame = _frame()[:, ::2, ::2]
+    _, (frame_out,) = ZmqCodec.decode(ZmqCodec.encode("camera", [frame], zero_copy=True))
+    assert np.array_equal(frame_out, frame)
+
+
+def test_legacy_ndarray_encoding():
+    arr = np.arange(12, dtype="<f4").reshape(3, 4)
+    parts = [b"legacy", b"NDARRAY", arr.tobytes(), msgpack.packb(arr.shape), arr.dtype.str.encode()]
+    topic, out = ZmqCodec.decode(parts)
+    assert topic == "legacy"
+    assert np.array_equal(out, arr)
+
+
+def test_fixed_layout_roundtrip():
+    dt = datetime(2026, 1, 7, 12, 30, 15, 250001, tzinfo=timezone.utc)
+    for data in (np.array([21.5]), np.array([[1, -2, 3]], dtype=np.int16), np.array([[0.1, 0.2, 0.3, 0.4]], dtype=np.float32)):
+        parts = ZmqCodec.encode_fixed("i2c_test", dt, data)
+        assert parts[1].startswith(b"FIXED|")
+        assert len(parts[2]) == 8 + data.nbytes
+        topic, (dt_out, data_out) = ZmqCodec.decode(parts)
+        assert topic == "i2c_test"
+        assert dt_out == dt
+        assert data_out.dtype == data.dtype
+        assert np.array_equal(data_out, data)
+
+
+def test_fixed_layout_single_byte_dtypes():
+    dt = datetime(2026, 1, 7, 12, 0, 0, tzinfo=timezone.utc)
+    # their dtype strings start with "|", the tag's separator
+    for data in (np.array([[1, 2, 3]], dtype=np.uint8), np.array([[True, False]]), np.array([[-1]], dtype=np.int8)):
+        topic, (dt_out, data_out) = ZmqCodec.decode(ZmqCodec.encode_fixed("t", dt, data))
+        assert dt_out == dt
+        assert data_out.dtype == data.dtype
+        assert np.array_equal(data_out, data)
+
+
+def test_fixed_layout_naive_datetimes_are_utc():
+    dt = datetime(2026, 1, 7, 12, 0, 0)
+    _, (dt_out, _) = ZmqCodec.decode(ZmqCodec.encode_fixed("t", dt, np.array([1.0])))
+    assert dt_out == dt.replace(tzinfo=timezone.utc)
+
+
+def test_datetimes_are_exact_to_the_microsecond():
+    dt = datetime(2262, 4, 11, 23, 47, 16, 854775, tzinfo=timezone.utc)
+    assert datetime_to_ns(dt) == 9223372036854775000
+    _, (dt_out,) = ZmqCodec.decode(ZmqCodec.encode("t", [dt]))
+    assert dt_out == dt
+
+
+def test_timezones_survive_the_roundtrip():
+    dt = datetime(2026, 7, 1, 9, 0, 0, 1, tzinfo=ZoneInfo("America/New_York"))
+    _, (dt_out,) = ZmqCodec.decode(ZmqCodec.encode("t", [dt]))
+    assert dt_out == dt
+    assert dt_out.utcoffset() == dt.utcoffset()
+    assert getattr(dt_out.tzinfo, "key", None) == "America/New_York"
+
+
+def test_raw_timestamps():
+    dt = datetime(2026, 1, 7, 12, 30, 15, 250001, tzinfo=timezone.utc)
+    for parts in (ZmqCodec.encode("t", [dt, 1.5]), ZmqCodec.encode_fixed("t", dt, np.array([1.5]))):
+        _, (ts, _) = ZmqCodec.decode(parts, raw_timestamps=True)
+        assert isinstance(ts, EpochNs)
+        assert ts == datetime_to_ns(dt) == 1767789015250001000
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+
+def _local_tz():
+    try:
+        import tzlocal
+        return tzlocal.get_localzone()
+    except ImportError:
+        return datetime.now().astimezone().tzinfo
+
+
+class TimestampOverlay:
+    """
+    Burns the time into frames the way cv2.putText did, without rendering text every frame.
+    The text is drawn once a second into a small alpha mask, every frame in that second
+    only blends the mask's region.
+    - origin is the bottom left of the text, like putText's
+    - the zone is looked up once, not per frame
+    """
+
+    def __init__(self, origin=(10, 50), font_scale=1, thickness=2, color=(0, 255, 0),
+                 fmt="%Y-%m-%d %H:%M:%S %z", tz=None):
+        self.origin = origin
+        self.font = cv2.FONT_HERSHEY_SIMPLEX
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.color = tuple(color)
+        self.fmt = fmt
+        self.tz = tz if tz is not None else _local_tz()
+
+        # every rendering of fmt is the same width give or take a glyph, size the mask off a sample with some spare
+        sample = datetime(2000, 12, 28, 23, 58, 58, tzinfo=self.tz).strftime(fmt)
+        (w, h), baseline = cv2.getTextSize(sample, self.font, font_scale, thickness)
+        self.pad = thickness
+        self.text_h = h
+        self.mask = np.zeros((h + baseline + 2 * self.pad, int(w * 1.1) + 2 * self.pad), dtype=np.uint8)
+        self.key = None
+
+    def _render(self, second, frame_shape):
+        text = datetime.fromtimestamp(second, self.tz).strftime(self.fmt)
+        self.mask[:] = 0
+        cv2.putText(self.mask, text, (self.pad, self.pad + self.text_h), self.font, self.font_scale,
+                    255, self.thickness, cv2.LINE_AA)
+
+        # the mask's region of the frame, clipped to it
+        y0 = self.origin[1] - self.text_h - self.pad
+        x0 = self.origin[0] - self.pad
+        top, left = max(0, -y0), max(0, -x0)
+        y0, x0 = max(0, y0), max(0, x0)
+        y1 = min(frame_shape[0], y0 + self.mask.shape[0] - top)
+        x1 = min(frame_shape[1], x0 + self.mask.shape[1] - left)
+        self.region = (slice(y0, y1), slice(x0, x1))
+        alpha = self.mask[top:top + max(0, y1 - y0), left:left + max(0, x1 - x0)]
+
+        # out = px * (255 - a) / 255 + color * a / 255, the second half is fixed for the second
+        channels = frame_shape[2] if len(frame_shape) > 2 else 1
+        color = (self.color + (255,) * channels)[:channels]
+        alpha_f = alpha.astype(np.float32) / 255
+        self.fg = np.rint(np.stack([alpha_f * c for c in color], axis=-1)).astype(np.uint8)
+        self.inv_alpha = np.repeat((255 - alpha)[..., np.newaxis], channels, axis=-1)
+        if len(frame_shape) == 2:
+            self.fg = self.fg[..., 0]
+            self.inv_alpha = self.inv_alpha[..., 0]
+        self.key = (second, frame_shape)
+
+    def region_for(self, epoch_ns, frame_shape):
+        """the (rows, cols) slices of a frame that draw() changes at epoch_ns"""
+        key = (epoch_ns // 1_000_000_000, frame_shape)
+        if key != self.key:
+            self._render(key[0], frame_shape)
+        return self.region
+
+    def draw(self, frame, epoch_ns):
+        """blend the time at epoch_ns into frame (h, w[, channels]) in place"""
+        roi = frame[self.region_for(epoch_ns, frame.shape)]
+        if roi.size == 0:
+            return frame
+        # two passes over the text's region in opencv, cheaper than putText itself
+        cv2.multiply(roi, self.inv_alpha, dst=roi, scale=1 / 255)
+        cv2.add(roi, self.fg, dst=roi)
+        return frame
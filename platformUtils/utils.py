@@ -1,11 +1,14 @@
 import os
 from datetime import datetime, timezone
 from config import all_process_configs, zmq_control_endpoint, platform_uuid
+from config import use_broker, zmq_broker_xsub_endpoint, zmq_broker_xpub_endpoint
 import zmq
 import logging
 from platformUtils.logUtils import worker_configurer, set_process_title
 from platformUtils.zmq_codec import ZmqCodec
 import signal
+import socket
+import weakref
 
 def dt_to_fnString(dt, decimal_places=3):
     microseconds = dt.microsecond / 1_000_000
@@ -56,6 +59,80 @@ class SignalHandler:
         self.stop = True
 
 
+#sockets already connected to the broker, a socket only needs to connect once for all its topics
+_broker_connected = weakref.WeakSet()
+
+def bind_pub(pub, endpoint):
+    """bind a publisher to its own endpoint, or connect it to the broker if it's in use"""
+    if not use_broker:
+        pub.bind(endpoint)
+        return
+    if pub not in _broker_connected:
+        pub.connect(zmq_broker_xsub_endpoint)
+        _broker_connected.add(pub)
+
+def connect_sub(sub, endpoint):
+    """connect a subscriber to a publisher's endpoint, or to the broker if it's in use"""
+    if not use_broker:
+        sub.connect(endpoint)
+        return
+    if sub not in _broker_connected:
+        sub.connect(zmq_broker_xpub_endpoint)
+        _broker_connected.add(sub)
+
+class Wakeup:
+    """
+    A file descriptor a callback thread can signal and a zmq.Poller can wait on
+    alongside its sockets, an eventfd on linux and a socketpair elsewhere.
+    - set() is safe from any thread and never blocks, repeated sets before a clear are one wakeup
+    - clear() drains it, call it before handling what it signalled so nothing set after is lost
+    """
+
+    def __init__(self):
+        if hasattr(os, "eventfd"):
+            self._fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            self._pair = None
+        else:
+            self._pair = socket.socketpair()
+            for s in self._pair:
+                s.setblocking(False)
+            self._fd = self._pair[0].fileno()
+
+    def fileno(self):
+        return self._fd
+
+    def set(self):
+        try:
+            if self._pair is None:
+                os.eventfd_write(self._fd, 1)
+            else:
+                self._pair[1].send(b"\0")
+        except (BlockingIOError, OSError):
+            #already full of wakeups, the reader will see one
+            pass
+
+    def clear(self):
+        try:
+            if self._pair is None:
+                os.eventfd_read(self._fd)
+            else:
+                while self._pair[0].recv(4096):
+                    pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def close(self):
+        if self._pair is None:
+            os.close(self._fd)
+        else:
+            for s in self._pair:
+                s.close()
+
+
+#how many messages a conflating subscriber lets queue up per publisher while it's busy
+#hwm is per connection, so data can't crowd out the control messages
+conflate_rcvhwm = 2
+
 #returns logger, zmq sub
 def configure_process(config):
     ctx = zmq.Context()
@@ -64,6 +141,9 @@ def configure_process(config):
     logger = logging.getLogger(config["name"])
     
     zmq_sub = ctx.socket(zmq.SUB)
+    if config.get("conflate", False):
+        #has to be set before connecting to take effect
+        zmq_sub.setsockopt(zmq.RCVHWM, conflate_rcvhwm)
     zmq_sub.connect(zmq_control_endpoint)
     zmq_sub.setsockopt(zmq.SUBSCRIBE, b"control")
 
@@ -71,6 +151,44 @@ def configure_process(config):
     
     return logger, zmq_sub, signal_handler
 
+#data messages drained but not returned yet, per socket
+_latest_pending = weakref.WeakKeyDictionary()
+
+def recv_latest(sub):
+    """
+    Receive the newest message per topic waiting on sub, dropping older ones.
+    Blocks for the first message, then drains whatever else is queued without
+    decoding it. Control messages are never dropped and are returned as soon
+    as they're seen, if several data topics are waiting they're returned in
+    turn on the following calls. Returns the decoded (topic, msg).
+    ZMQ_CONFLATE would do this in zmq but it doesn't support multipart messages.
+    """
+    pending = _latest_pending.setdefault(sub, {})
+    if not pending:
+        parts = sub.recv_multipart(copy=False)
+        if parts[0].bytes == b"control":
+            return ZmqCodec.decode(parts)
+        pending[parts[0].bytes] = parts
+
+    while True:
+        try:
+            parts = sub.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+        except zmq.Again:
+            break
+        topic = parts[0].bytes
+        if topic == b"control":
+            return ZmqCodec.decode(parts)
+        pending.pop(topic, None)
+        pending[topic] = parts
+
+    return ZmqCodec.decode(pending.pop(next(iter(pending))))
+
+def recv(sub, config):
+    """recv_latest for conflating processes, otherwise every message in order"""
+    if config.get("conflate", False):
+        return recv_latest(sub)
+    return ZmqCodec.decode(sub.recv_multipart(copy=False))
+
 def should_exit(topic, msg, config_name):
     if topic != "control": 
         return False
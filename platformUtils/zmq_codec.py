@@ -1,54 +1,165 @@
+import struct
 import msgpack
 import numpy as np
 import zmq
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from typing import Optional
 try:
     from zoneinfo import ZoneInfo  # type: ignore
-    def _get_zoneinfo(tz_key: Optional[str]):
-        if not tz_key:
-            return timezone.utc
-        try:
-            return ZoneInfo(tz_key)
-        except Exception:
-            return timezone.utc
 except Exception:
     # Fallback when zoneinfo isn't available in the environment
-    def _get_zoneinfo(tz_key: Optional[str]):
+    ZoneInfo = None
+
+
+@lru_cache(maxsize=None)
+def _load_zoneinfo(tz_key: str):
+    if ZoneInfo is None:
+        return timezone.utc
+    try:
+        return ZoneInfo(tz_key)
+    except Exception:
         return timezone.utc
 
 
+def _get_zoneinfo(tz_key: Optional[str]):
+    # nearly everything on the bus is UTC, don't even hit the cache for it
+    if not tz_key or tz_key == "UTC":
+        return timezone.utc
+    return _load_zoneinfo(tz_key)
+
+
+# msgpack ExtType codes
+EXT_DATETIME = 1
+EXT_NDARRAY = 2
+EXT_FRAME_REF = 3  # ndarray whose buffer travels in its own zmq frame
+
+# arrays smaller than this are cheaper to pack inline than to send as their own frame
+ZERO_COPY_MIN_BYTES = 64 * 1024
+
+# fixed layout messages: encoding tag b"FIXED|<dtype>|<shape>", payload int64 epoch ns + raw array bytes
+FIXED_PREFIX = b"FIXED|"
+FIXED_MAX_BYTES = 4096
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+_NS = struct.Struct("<q")
+# encoding tag -> (dtype, shape, count) and back, every topic only ever has one or two of these
+_fixed_layouts = {}
+_fixed_tags = {}
+
+
+def _frame_bytes(part):
+    """bytes of a multipart part, whether it came from recv_multipart(copy=True) or copy=False"""
+    if isinstance(part, zmq.Frame):
+        return part.bytes
+    return part
+
+
+def _frame_buffer(part):
+    """a buffer over a multipart part without copying it"""
+    if isinstance(part, zmq.Frame):
+        return part.buffer
+    return part
+
+
+class EpochNs(int):
+    """an int64 epoch ns timestamp from decode(raw_timestamps=True), so it can be told apart from other ints"""
+    __slots__ = ()
+
+
+def datetime_to_ns(dt: datetime) -> int:
+    """exact epoch ns for dt, naive datetimes are taken as UTC"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return ((dt - _EPOCH) // _US) * 1000
+
+
+def ns_to_datetime(epoch_ns: int, tz=timezone.utc) -> datetime:
+    """datetime for epoch ns, truncated to the microsecond datetime can hold"""
+    dt = _EPOCH + timedelta(microseconds=epoch_ns // 1000)
+    if tz is not timezone.utc:
+        dt = dt.astimezone(tz)
+    return dt
+
+
+def _fixed_layout(tag: bytes):
+    layout = _fixed_layouts.get(tag)
+    if layout is None:
+        #single byte dtypes are "|u1", "|b1", so the shape is split off the right
+        dtype_str, shape_str = tag[len(FIXED_PREFIX):].decode().rsplit("|", 1)
+        shape = tuple(int(d) for d in shape_str.split(",") if d)
+        layout = (np.dtype(dtype_str), shape, int(np.prod(shape)))
+        _fixed_layouts[tag] = layout
+    return layout
+
+
+def fixed_layout_ok(data) -> bool:
+    """whether data can be sent with ZmqCodec.encode_fixed"""
+    return (isinstance(data, np.ndarray)
+            and data.dtype.kind in "biuf"
+            and data.nbytes <= FIXED_MAX_BYTES)
+
+
 class ZmqCodec:
     """
     Helper to encode/decode Python objects for ZeroMQ multipart messages.
     - dicts, lists, scalars -> msgpack
     - numpy arrays -> raw bytes + shape + dtype
+    - with zero_copy=True large numpy arrays are sent as their own frames
+      and decoded with np.frombuffer over the received frame
+    - [datetime, small numeric array] -> fixed layout, the dtype and shape
+      live in the encoding tag and the payload is epoch ns + the array bytes
     """
 
     @staticmethod
-    def encode(topic: str, obj):
-        """Encode an object into a multipart [topic, ...]"""
+    def encode_fixed(topic: str, dt: datetime, arr: np.ndarray):
+        """Encode [dt, arr] as [topic, b"FIXED|<dtype>|<shape>", epoch_ns + raw bytes]
+
+        Decodes to [dt, arr] with dt in UTC.
+        """
         topic_b = topic.encode() if isinstance(topic, str) else topic
+        epoch_ns = datetime_to_ns(dt)
+        tag = _fixed_tags.get((arr.dtype, arr.shape))
+        if tag is None:
+            tag = FIXED_PREFIX + arr.dtype.str.encode() + b"|" + ",".join(str(d) for d in arr.shape).encode()
+            _fixed_tags[(arr.dtype, arr.shape)] = tag
+        return [topic_b, tag, _NS.pack(epoch_ns) + arr.tobytes()]
 
-        # Use msgpack ExtType to preserve raw numpy arrays and timezone-aware datetimes
-        # ExtType codes
-        EXT_DATETIME = 1
-        EXT_NDARRAY = 2
+    @staticmethod
+    def encode(topic: str, obj, zero_copy: bool = False):
+        """Encode an object into a multipart [topic, ...]
+
+        With zero_copy=True the result is [topic, b"MULTIPART", header, *buffers]
+        and should be sent with send_multipart(parts, copy=False) so the array
+        buffers are handed to zmq without being copied.
+        """
+        topic_b = topic.encode() if isinstance(topic, str) else topic
+        buffers = []
 
         def default(obj_to_pack):
             # Datetime -> ExtType with (epoch_ns, tz_key)
             if isinstance(obj_to_pack, datetime):
                 dt = obj_to_pack
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=timezone.utc)
-                tz_key = getattr(dt.tzinfo, "key", dt.tzname()) or "UTC"
-                payload = msgpack.packb((int(dt.timestamp() * 1_000_000_000), tz_key), use_bin_type=True)
+                tz = dt.tzinfo
+                if tz is None or tz is timezone.utc:
+                    tz_key = "UTC"
+                else:
+                    tz_key = getattr(tz, "key", dt.tzname()) or "UTC"
+                payload = msgpack.packb((datetime_to_ns(dt), tz_key), use_bin_type=True)
                 return msgpack.ExtType(EXT_DATETIME, payload)
 
-            # Numpy ndarray -> ExtType with (shape, dtype_str, raw_bytes)
             if isinstance(obj_to_pack, np.ndarray):
                 shape = obj_to_pack.shape
                 dtype_str = obj_to_pack.dtype.str
+
+                # large arrays -> (frame_index, shape, dtype_str), buffer goes in its own frame
+                if zero_copy and obj_to_pack.nbytes >= ZERO_COPY_MIN_BYTES:
+                    arr = np.ascontiguousarray(obj_to_pack)
+                    payload = msgpack.packb((len(buffers), shape, dtype_str), use_bin_type=True)
+                    buffers.append(arr.data)
+                    return msgpack.ExtType(EXT_FRAME_REF, payload)
+
+                # Numpy ndarray -> ExtType with (shape, dtype_str, raw_bytes)
                 raw = obj_to_pack.tobytes()
                 payload = msgpack.packb((shape, dtype_str, raw), use_bin_type=True)
                 return msgpack.ExtType(EXT_NDARRAY, payload)
@@ -61,37 +172,57 @@ class ZmqCodec:
             raise TypeError("Unsupported type")
 
         packed = msgpack.packb(obj, use_bin_type=True, default=default)
+        if zero_copy:
+            return [topic_b, b"MULTIPART", packed] + buffers
         return [topic_b, b"MSGPACK", packed]
 
     @staticmethod
-    def decode(parts):
-        """Decode multipart back into (topic, obj)"""
-        topic = parts[0].decode()
+    def decode(parts, raw_timestamps: bool = False):
+        """Decode multipart back into (topic, obj)
+
+        parts may be bytes or zmq.Frame objects (recv_multipart(copy=False)).
+        Arrays from MULTIPART messages are read-only views over the received frames.
+        With raw_timestamps=True datetimes come back as EpochNs ints and no
+        datetime objects are built.
+        """
+        topic = _frame_bytes(parts[0]).decode()
+        encoding = _frame_bytes(parts[1])
 
-        if parts[1] == b"NDARRAY":
-            raw, shape_b, dtype_b = parts[2], parts[3], parts[4]
+        if encoding.startswith(FIXED_PREFIX):
+            dtype, shape, count = _fixed_layout(encoding)
+            payload = _frame_buffer(parts[2])
+            epoch_ns = _NS.unpack_from(payload)[0]
+            arr = np.frombuffer(payload, dtype=dtype, count=count, offset=8).reshape(shape)
+            if raw_timestamps:
+                return topic, [EpochNs(epoch_ns), arr]
+            return topic, [ns_to_datetime(epoch_ns), arr]
+
+        if encoding == b"NDARRAY":
+            raw, shape_b, dtype_b = _frame_buffer(parts[2]), _frame_bytes(parts[3]), _frame_bytes(parts[4])
             shape = tuple(msgpack.unpackb(shape_b))
             dtype = np.dtype(dtype_b.decode())
             arr = np.frombuffer(raw, dtype=dtype).reshape(shape)
             return topic, arr
 
-        elif parts[1] == b"MSGPACK":
-            EXT_DATETIME = 1
-            EXT_NDARRAY = 2
-
+        elif encoding == b"MSGPACK" or encoding == b"MULTIPART":
             def ext_hook(code, data):
                 if code == EXT_DATETIME:
                     epoch_ns, tz_key = msgpack.unpackb(data, raw=False)
-                    tz = _get_zoneinfo(tz_key)
-                    return datetime.fromtimestamp(epoch_ns / 1_000_000_000, tz=tz)
+                    if raw_timestamps:
+                        return EpochNs(epoch_ns)
+                    return ns_to_datetime(epoch_ns, _get_zoneinfo(tz_key))
                 if code == EXT_NDARRAY:
                     shape, dtype_str, raw = msgpack.unpackb(data, raw=False)
                     arr = np.frombuffer(raw, dtype=np.dtype(dtype_str)).reshape(tuple(shape))
                     return arr
+                if code == EXT_FRAME_REF:
+                    index, shape, dtype_str = msgpack.unpackb(data, raw=False)
+                    buf = _frame_buffer(parts[3 + index])
+                    return np.frombuffer(buf, dtype=np.dtype(dtype_str)).reshape(tuple(shape))
                 return msgpack.ExtType(code, data)
 
-            obj = msgpack.unpackb(parts[2], raw=False, ext_hook=ext_hook)
+            obj = msgpack.unpackb(_frame_bytes(parts[2]), raw=False, ext_hook=ext_hook)
             return topic, obj
 
         else:
-            raise ValueError(f"Unknown encoding: {parts[1]}")
+            raise ValueError(f"Unknown encoding: {encoding}")
@@ -1,16 +1,20 @@
 import sys
-import queue
 from datetime import datetime, timezone, timedelta
 import time
 
 import numpy as np
-import sounddevice as sd
 import zmq
 import logging
 
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
-from platformUtils.zmq_codec import ZmqCodec
+from platformUtils.zmq_codec import ZmqCodec, ns_to_datetime, datetime_to_ns
+from platformUtils.clock import get_clock
+from platformUtils.utils import bind_pub, Wakeup
+from platformUtils.metrics import Histogram
+from sensors.simulation import SimulatedInputStream
+from sensors.audioDeviceClasses.sampleRing import SampleRing
+from sensors.audioDeviceClasses.decimator import PolyphaseDecimator
 
 
 class AudioCapture:
@@ -32,20 +36,53 @@ class AudioCapture:
 
         self.ctx = zmq.Context()
         self.pub = self.ctx.socket(zmq.PUB)
-        self.pub.bind(self.endpoint)
+        bind_pub(self.pub, self.endpoint)
         self.l.info(f"audio capture publishing to {self.topic} at {self.endpoint}")
         sys.stdout.flush()
 
-        self._queue: queue.Queue = queue.Queue(maxsize=8)
         self._stream = None
         self._next_chunk_ts_utc: datetime | None = None
-        self._pa_epoch_utc_base: datetime | None = None  # maps PortAudio time to UTC
+        self._pa_mono_base_ns: int | None = None  # maps PortAudio time to monotonic ns
+        # chunks are stamped on the process clock, so an ntp slew moves them smoothly instead of jumping
+        self.clock = get_clock()
         self._chunk_sequence: int = 0  # Track chunk sequence for timestamp validation
         self._first_chunk_dt: datetime | None = None  # First chunk timestamp for validation
 
         self._enabled = False
         self.subsample_ratio = config.get("subsample_ratio", 1)
-        
+        #the callback hands blocks over through a preallocated ring, made in start once the channels are known
+        self.ring_seconds = config.get("ring_seconds", 4)
+        self.ring = None
+        self.decimator = None
+        self.input_overflows = 0
+        self._reported = (0, 0)
+        #set by the callback when a block lands, so the controller can wait on it with its sockets
+        self.wakeup = Wakeup()
+        #from a block landing in the ring to it going out on zmq
+        self.publish_hist = Histogram()
+
+    def _make_buffers(self):
+        #anti-aliased down to sample_rate/subsample_ratio instead of just striding
+        out_rate = self.sample_rate // self.subsample_ratio
+        self.decimator = PolyphaseDecimator(self.subsample_ratio, self.channels) if self.subsample_ratio > 1 else None
+        self.ring = SampleRing(int(self.ring_seconds * out_rate), self.channels, np.dtype(self.dtype),
+                               max_blocks=max(8, int(self.ring_seconds * self.frame_hz) + 2))
+
+    def stats(self):
+        """overflows PortAudio reported, and blocks/samples dropped because the ring was full"""
+        return {
+            "input_overflows": self.input_overflows,
+            "dropped_blocks": self.ring.dropped_blocks if self.ring is not None else 0,
+            "dropped_samples": self.ring.dropped_samples if self.ring is not None else 0,
+            "queued_blocks": len(self.ring) if self.ring is not None else 0,
+        }
+
+    def metrics(self):
+        """chunk to publish latency since the last call, and the stats"""
+        m = {"chunk_to_publish_us": self.publish_hist.to_dict(), "stats": self.stats(),
+             "clock": self.clock.metrics()}
+        self.publish_hist.reset()
+        return m
 
     def enable(self):
         self._enabled = True
@@ -64,25 +101,23 @@ class AudioCapture:
         chunk_duration = frames / float(self.sample_rate)
         expected_interval = 1.0 / self.frame_hz  # Expected time between chunks
         
-        # Handle status flags - input overflow is a serious issue
+        # Handle status flags - input overflow is a serious issue, it's counted here and reported from retrieve_data
         has_overflow = False
         if status:
             if 'input overflow' in str(status):
                 has_overflow = True
-                self.l.warning(f"audio callback status: {status} - system cannot keep up with audio capture!")
-            else:
-                self.l.debug(f"audio callback status: {status}")
+                self.input_overflows += 1
         
         # Prefer PortAudio-provided ADC time for drift-free timestamps
         try:
             # First, try to initialize epoch base from time_info if we haven't yet
-            if self._pa_epoch_utc_base is None:
+            if self._pa_mono_base_ns is None:
                 if time_info is not None:
-                    # Map PortAudio currentTime (seconds) to UTC now
+                    # Map PortAudio currentTime (seconds) to monotonic now, the clock service takes it to UTC
                     # Use time_info.currentTime which is more stable than inputBufferAdcTime for initial mapping
-                    now_utc = datetime.now(timezone.utc)
-                    self._pa_epoch_utc_base = now_utc - timedelta(seconds=time_info.currentTime)
-                    self.l.info(f"audio capture: initialized PortAudio epoch base: {self._pa_epoch_utc_base}")
+                    self._pa_mono_base_ns = time.monotonic_ns() - int(time_info.currentTime * 1_000_000_000)
+                    self.l.info(f"audio capture: initialized PortAudio epoch base: "
+                                f"{ns_to_datetime(self.clock.mono_to_wall_ns(self._pa_mono_base_ns))}")
                 else:
                     # Log only on first few callbacks to avoid spam
                     if self._chunk_sequence < 5:
@@ -92,9 +127,10 @@ class AudioCapture:
                         )
 
             # Now use time_info if we have both epoch base and time_info
-            if self._pa_epoch_utc_base is not None and time_info is not None:
+            if self._pa_mono_base_ns is not None and time_info is not None:
                 # Use inputBufferAdcTime which represents when the ADC actually captured the start of this buffer
-                dt_utc = self._pa_epoch_utc_base + timedelta(seconds=time_info.inputBufferAdcTime)
+                adc_mono_ns = self._pa_mono_base_ns + int(time_info.inputBufferAdcTime * 1_000_000_000)
+                dt_utc = ns_to_datetime(self.clock.mono_to_wall_ns(adc_mono_ns))
                 
                 # Validate timestamp progression on subsequent chunks
                 if self._first_chunk_dt is not None:
@@ -135,7 +171,7 @@ class AudioCapture:
                     self.l.debug(f"audio capture: using sequence-based timestamp (chunk {self._chunk_sequence})")
                 else:
                     # First chunk with no time info - align to start-of-chunk by subtracting buffer duration from now
-                    dt_utc = datetime.now(timezone.utc) - timedelta(seconds=chunk_duration)
+                    dt_utc = self.clock.now() - timedelta(seconds=chunk_duration)
                     self.l.warning(
                         f"audio capture: no time_info available on first callback. "
                         f"Using fallback timestamp: {dt_utc}. "
@@ -149,7 +185,7 @@ class AudioCapture:
             if self._first_chunk_dt is not None:
                 dt_utc = self._first_chunk_dt + timedelta(seconds=self._chunk_sequence * expected_interval)
             else:
-                dt_utc = datetime.now(timezone.utc) - timedelta(seconds=chunk_duration)
+                dt_utc = self.clock.now() - timedelta(seconds=chunk_duration)
                 # Store first chunk timestamp immediately
                 self._first_chunk_dt = dt_utc
         
@@ -157,19 +193,42 @@ class AudioCapture:
         if self._first_chunk_dt is None:
             self._first_chunk_dt = dt_utc
         
-        try:
-            # Copy to avoid buffer reuse
-            indata = indata[::self.subsample_ratio]
-            chunk = np.array(indata, copy=True)
-            self._queue.put_nowait((dt_utc, chunk))
-            self._chunk_sequence += 1
-        except queue.Full:
-            # Drop if consumer is behind
-            pass
+        # the ring copies the block out of PortAudio's buffer, a full ring drops and counts it
+        block = indata
+        ns = datetime_to_ns(dt_utc)
+        if self.decimator is not None:
+            block = self.decimator.process(indata)
+            ns += int(self.decimator.offset_samples * 1_000_000_000 / self.sample_rate)
+        if len(block) and self.ring.write(block, ns):
+            self.wakeup.set()
+        self._chunk_sequence += 1
 
     def start(self):
         if self._stream is not None:
             return
+
+        # a simulated stream calls _callback the same way, without sounddevice or a mic
+        if self.config.get("simulated", False):
+            self._stream = SimulatedInputStream(
+                channels=self.channels,
+                samplerate=self.sample_rate,
+                blocksize=self.blocksize,
+                dtype=self.dtype,
+                callback=self._callback,
+                **self.config.get("simulation", {}),
+            )
+            self._pa_mono_base_ns = None
+            self._chunk_sequence = 0
+            self._first_chunk_dt = None
+            self._make_buffers()
+            self._stream.start()
+            self.l.info(
+                f"simulated audio stream started: {self.sample_rate} Hz, {self.channels} ch, "
+                f"blocksize {self.blocksize}, dtype {self.dtype}"
+            )
+            return
+
+        import sounddevice as sd
         
         # Validate device capabilities before creating stream
         device_to_use = self.device
@@ -228,12 +287,13 @@ class AudioCapture:
             )
             self.channels = channels_to_use
         # Reset PortAudio epoch mapping on start (before starting stream)
-        self._pa_epoch_utc_base = None
+        self._pa_mono_base_ns = None
         self._chunk_sequence = 0
         self._first_chunk_dt = None
+        self._make_buffers()
 
         #wait until a round second
-        time.sleep(1 - time.time() % 1)
+        self.clock.sleep_to_grid(1)
         self._stream.start()
         device_info = f"device={device_to_use}" if device_to_use is not None else "default device"
         
@@ -264,25 +324,31 @@ class AudioCapture:
             self.l.info("audio stream stopped")
             sys.stdout.flush()
 
+    def close(self):
+        self.stop()
+        self.wakeup.close()
+        self.pub.close(0)
+
     def retrieve_data(self):
-        if not self._enabled:
+        if not self._enabled or self.ring is None:
             return
+        #cleared before draining, a block landing during the drain sets it again
+        self.wakeup.clear()
         while True:
-            try:
-                dt_utc, chunk = self._queue.get_nowait()
-            except queue.Empty:
-                self.l.debug(f"audio capture: queue empty, breaking")
+            block = self.ring.peek()
+            if block is None:
                 break
-            # Ensure contiguous array for serialization
-            if not isinstance(chunk, np.ndarray):
-                chunk = np.asarray(chunk)
-            if not chunk.flags["C_CONTIGUOUS"]:
-                chunk = np.ascontiguousarray(chunk)
-            #print(f"audio capture publishing {chunk.shape} to {self.topic}")
-            #sys.stdout.flush()
-            self.l.trace(f"current time: {datetime.now(timezone.utc)}")
+            ns, chunk = block
+            dt_utc = ns_to_datetime(ns)
             self.l.trace(f"audio capture publishing {dt_utc} {chunk.shape} to {self.topic}")
-            # convert to numpy array before sending numsamples x 1
-            chunk_np = np.array(chunk).reshape(-1, 1)
-            self.pub.send_multipart(ZmqCodec.encode(self.topic, [dt_utc, chunk_np]))
+            # numsamples x 1, encoding copies it out of the ring so the slot can be freed right after
+            self.pub.send_multipart(ZmqCodec.encode(self.topic, [dt_utc, chunk.reshape(-1, 1)]))
+            self.publish_hist.add((time.monotonic_ns() - self.ring.landed_ns()) // 1000)
+            self.ring.release()
 
+        reported = (self.input_overflows, self.ring.dropped_samples)
+        if reported != self._reported:
+            self.l.warning(f"audio capture: {reported[0] - self._reported[0]} input overflows and "
+                           f"{reported[1] - self._reported[1]} samples dropped since the last check "
+                           f"({self.stats()})")
+            self._reported = reported
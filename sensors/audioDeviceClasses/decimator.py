@@ -0,0 +1,68 @@
+import numpy as np
+
+
+def lowpass_taps(ratio, taps_per_phase=48, beta=8.0):
+    """kaiser windowed sinc anti-alias filter for decimating by ratio, cut off just under the new nyquist"""
+    n = ratio * taps_per_phase
+    cutoff = 0.5 / ratio * 0.88  # cycles per input sample
+    t = np.arange(n) - (n - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(n, beta)
+    return h / h.sum()
+
+
+class PolyphaseDecimator:
+    """
+    Low pass filters and keeps every ratio-th sample, block by block with the
+    filter's history carried over, so it can run in the audio callback.
+    The filter is split into ratio phases, each convolved with every ratio-th
+    input sample, so only the kept outputs are ever computed.
+    - process(block) returns the decimated block in the input's dtype (ints are rounded and clipped)
+    - offset_samples is where the last block's first output sits relative to the
+      block's first input sample, in input samples, with the filter's delay taken off,
+      so timestamps stay on the samples they came from
+    """
+
+    def __init__(self, ratio, channels=1, taps_per_phase=48, beta=8.0):
+        self.ratio = int(ratio)
+        self.channels = channels
+        h = lowpass_taps(self.ratio, taps_per_phase, beta)
+        self.taps_per_phase = taps_per_phase
+        # phase p holds h[p], h[p + ratio], ...
+        self.phases = [np.ascontiguousarray(h[p::self.ratio]) for p in range(self.ratio)]
+        self.delay = (len(h) - 1) / 2
+        self.history = len(h) - 1
+        self.x = np.zeros((self.history, channels), dtype=np.float32)
+        # where the next output lands in the next block
+        self.phase = 0
+        self.offset_samples = 0.0
+
+    def process(self, block):
+        block = np.reshape(block, (len(block), -1))
+        n = len(block)
+        H = self.history
+        if len(self.x) != H + n:
+            x = np.zeros((H + n, self.channels), dtype=np.float32)
+            x[:H] = self.x[:H]
+            self.x = x
+        self.x[H:] = block
+
+        n_out = max(0, -(-(n - self.phase) // self.ratio))
+        y = np.zeros((n_out, self.channels), dtype=np.float32)
+        q = self.taps_per_phase
+        i0 = H + self.phase
+        # a block shorter than the phase has no output, it only moves the phase on
+        for p, hp in enumerate(self.phases if n_out else []):
+            start = i0 - p - (q - 1) * self.ratio
+            for c in range(self.channels):
+                s = self.x[start::self.ratio, c][:n_out + q - 1]
+                y[:, c] += np.convolve(s, hp, "valid")
+
+        self.offset_samples = self.phase - self.delay
+        self.phase = self.phase + n_out * self.ratio - n
+        # keep the last H inputs for the next block
+        self.x[:H] = self.x[n:n + H]
+
+        if np.issubdtype(block.dtype, np.integer):
+            info = np.iinfo(block.dtype)
+            return np.clip(np.rint(y), info.min, info.max).astype(block.dtype)
+        return y.astype(block.dtype, copy=False)
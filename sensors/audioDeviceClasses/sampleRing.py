@@ -0,0 +1,81 @@
+import time
+
+import numpy as np
+
+
+class SampleRing:
+    """
+    A preallocated ring of audio samples handed from the PortAudio callback
+    (the only writer) to the publishing loop (the only reader) without a lock.
+    - write(block, ns) copies a block in and records when its first sample was taken
+    - peek() gives the oldest unread block and its time, release() frees it
+    - landed_ns() is when the oldest unread block was written, on the monotonic clock
+    - the positions only grow, and each side only moves its own, so the reader
+      never sees a block before its samples are in
+    when a block doesn't fit it's dropped whole and counted, never blocking the callback
+    """
+
+    def __init__(self, capacity, channels=1, dtype=np.int16, max_blocks=64):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self.samples = np.zeros((self.capacity, channels), dtype=dtype)
+        self.max_blocks = max_blocks
+        # per block: position of its first sample, how many samples, epoch ns of the first one
+        self.block_pos = np.zeros(max_blocks, dtype=np.int64)
+        self.block_len = np.zeros(max_blocks, dtype=np.int64)
+        self.block_ns = np.zeros(max_blocks, dtype=np.int64)
+        self.block_landed = np.zeros(max_blocks, dtype=np.int64)
+
+        # moved only by the writer
+        self.write_pos = 0
+        self.write_block = 0
+        self.dropped_blocks = 0
+        self.dropped_samples = 0
+        # moved only by the reader
+        self.read_pos = 0
+        self.read_block = 0
+
+    def write(self, block, ns):
+        n = len(block)
+        if n > self.capacity - (self.write_pos - self.read_pos) or \
+                self.write_block - self.read_block >= self.max_blocks:
+            self.dropped_blocks += 1
+            self.dropped_samples += n
+            return False
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.samples[start:start + first] = block[:first]
+        if first < n:
+            self.samples[:n - first] = block[first:]
+        b = self.write_block % self.max_blocks
+        self.block_pos[b] = self.write_pos
+        self.block_len[b] = n
+        self.block_ns[b] = ns
+        self.block_landed[b] = time.monotonic_ns()
+        # published last, the reader goes by these
+        self.write_pos += n
+        self.write_block += 1
+        return True
+
+    def peek(self):
+        """(epoch ns, samples) of the oldest unread block or None, a view unless it wraps"""
+        if self.read_block == self.write_block:
+            return None
+        b = self.read_block % self.max_blocks
+        start = int(self.block_pos[b]) % self.capacity
+        n = int(self.block_len[b])
+        if start + n <= self.capacity:
+            return int(self.block_ns[b]), self.samples[start:start + n]
+        return int(self.block_ns[b]), np.concatenate((self.samples[start:], self.samples[:start + n - self.capacity]))
+
+    def landed_ns(self):
+        return int(self.block_landed[self.read_block % self.max_blocks])
+
+    def release(self):
+        b = self.read_block % self.max_blocks
+        self.read_pos = int(self.block_pos[b] + self.block_len[b])
+        self.read_block += 1
+
+    def __len__(self):
+        """unread blocks"""
+        return self.write_block - self.read_block
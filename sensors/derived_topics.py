@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+import zmq
+import logging
+
+from platformUtils.zmq_codec import ZmqCodec
+from platformUtils.utils import bind_pub
+from platformUtils.frame_pool import FramePool
+
+
+class DerivedTopic:
+    """
+    A smaller topic made from each of a camera Sensor's frames, so analyzers that
+    only need a little of the frame don't each receive and shrink the whole thing.
+    It's published from an XPUB, which hears subscribe and unsubscribe messages,
+    and nothing is computed while nobody is subscribed.
+    - kind "gray": resized to width x height and converted to one channel (motion, dark detectors)
+    - kind "letterbox": resized to fit width x height keeping the aspect ratio, the rest
+      pad_value, the way yolo pads its input
+    the topic is the camera's with sensor_type, shape and channels swapped in
+    """
+
+    def __init__(self, sensor, kind, width, height, sensor_type=None, pad_value=114,
+                 frame_pool_slots=4, ctx=None, debug_lvl=30):
+        if kind not in ("gray", "letterbox"):
+            raise ValueError("unknown derived topic kind: " + str(kind))
+        self.kind = kind
+        self.width = width
+        self.height = height
+        channels = 1 if kind == "gray" else 3
+        hz = sensor.topic.rsplit("_", 1)[1]
+        self.topic = "_".join([sensor.bus_location, sensor.device_name,
+                               sensor_type or sensor.sensor_type + "-" + kind, sensor.units, "uint8",
+                               f"numpy-{width}x{height}x{channels}", hz])
+        self.topic_b = self.topic.encode()
+        self.endpoint = f"ipc:///tmp/{self.topic}.sock"
+
+        self.l = logging.getLogger(self.topic)
+        self.l.setLevel(debug_lvl)
+
+        self.pub = (ctx or zmq.Context.instance()).socket(zmq.XPUB)
+        bind_pub(self.pub, self.endpoint)
+        # subscription prefixes that match this topic, from the XPUB's 1/0 messages
+        self.prefixes = set()
+        self.subscribed = False
+
+        # letterbox padding never changes, it's written once when the buffers are made
+        self.pool = FramePool(frame_pool_slots, (1, height, width, channels),
+                              fill=pad_value if kind == "letterbox" else 0)
+        self.small = None
+        self.fit = None
+        self.published = 0
+        self.l.info(self.topic + " derived topic at " + self.endpoint)
+
+    def _update_subscribed(self):
+        while True:
+            try:
+                msg = self.pub.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            prefix = msg[1:]
+            if not self.topic_b.startswith(prefix):
+                continue
+            if msg[:1] == b"\x01":
+                self.prefixes.add(prefix)
+            elif msg[:1] == b"\x00":
+                self.prefixes.discard(prefix)
+        subscribed = bool(self.prefixes)
+        if subscribed != self.subscribed:
+            self.l.info(self.topic + (" has a subscriber" if subscribed else " has no subscribers"))
+            self.subscribed = subscribed
+
+    def _gray(self, img, out):
+        if self.small is None:
+            self.small = np.empty((self.height, self.width, img.shape[2]), dtype=np.uint8)
+        # shrink first so the colour conversion runs on the small frame
+        cv2.resize(img, (self.width, self.height), dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=out[0, ..., 0])
+
+    def _letterbox(self, img, out):
+        h, w = img.shape[:2]
+        if self.fit is None or self.fit[0] != (h, w):
+            scale = min(self.width / w, self.height / h)
+            nw, nh = round(w * scale), round(h * scale)
+            top, left = (self.height - nh) // 2, (self.width - nw) // 2
+            self.fit = ((h, w), (nw, nh), (slice(top, top + nh), slice(left, left + nw)))
+        _, size, region = self.fit
+        # resized straight into the middle of the padded buffer
+        cv2.resize(img, size, dst=out[0][region], interpolation=cv2.INTER_AREA)
+
+    def publish(self, dt, frame):
+        """make and send this topic from frame (1, h, w, 3) if anyone's subscribed"""
+        self._update_subscribed()
+        if not self.subscribed:
+            return False
+        out = self.pool.acquire()
+        img = frame[0]
+        if self.kind == "gray":
+            self._gray(img, out)
+        else:
+            self._letterbox(img, out)
+        tracker = self.pub.send_multipart(ZmqCodec.encode(self.topic, [dt, out], zero_copy=True),
+                                          copy=False, track=True)
+        self.pool.track(out, tracker)
+        self.published += 1
+        return True
+
+    def close(self):
+        self.pub.close(0)
+
+
+def derived_topics_for(sensor, configs, debug_lvl=30):
+    """a DerivedTopic for each entry of a video controller's derived_topics config"""
+    topics = []
+    for c in configs:
+        c = dict(c)
+        c.setdefault("debug_lvl", debug_lvl)
+        topics.append(DerivedTopic(sensor, **c))
+    return topics
@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from platformUtils.clock import get_clock
+from sensors.scheduler import DeadlineScheduler
+
+
+class DeviceReader:
+    """
+    Reads one device's sensors in its own thread, so a slow device (an scd41
+    measurement, a pmsa003i frame, a bno085 packet timeout) doesn't hold up
+    the other devices on the controller loop.
+    - each sensor's retrieve_data is read on the sensor's own grid in the thread
+      and only the newest value is kept
+    - the sensor's retrieve_data/is_ready are swapped for cheap getters over
+      that value, so Sensor.read_data keeps doing the timestamping, batching
+      and grace period fills on the controller thread
+    - a value older than max_age_periods sensor periods isn't returned, the
+      sensor then sees None and skips the message like any other missed read
+    - each value is handed out once, with the grid time it was read at on
+      sensor.read_time_ns, so a read still running when the controller gets
+      to its tick goes out on the next tick stamped with its own time
+    - a sensor with a retrieve_batch (the bno085) is drained in the thread at
+      its schedule_hz instead, the batches queue up and read_batch gets them
+      all at once, each sample keeps the time the device took it
+    busio's I2C already takes a lock per transaction, so devices on the same
+    bus can be read from different threads.
+    """
+
+    def __init__(self, name, sensors, max_age_periods=1.5, wake_offset_us=0, debug_lvl=30):
+        self.name = name
+        self.l = logging.getLogger(name + "_reader")
+        self.l.setLevel(debug_lvl)
+        self.sensors = sensors
+        self.stop_event = threading.Event()
+        self.scheduler = DeadlineScheduler(wake_offset_us=wake_offset_us)
+        self.errors = 0
+
+        for sensor in sensors:
+            if getattr(sensor, "retrieve_batch", None) is not None:
+                self._wrap_batch(sensor)
+            else:
+                self._wrap(sensor, max_age_periods)
+
+        self.thread = threading.Thread(target=self._run, name=name + "_reader", daemon=True)
+
+    def _wrap(self, sensor, max_age_periods):
+        read = sensor.retrieve_data
+        ready = sensor.is_ready
+        max_age_ns = int(max_age_periods * 1_000_000_000 / sensor.sensor_hz)
+        delay_micros = int(1_000_000 / sensor.sensor_hz)
+        clock = get_clock()
+        # (monotonic ns, value, grid ns), replaced whole so the controller thread never sees half an update
+        latest = [None]
+        # grid ns of the value last handed out
+        handed_out = [None]
+
+        def read_in_thread():
+            if not ready():
+                return
+            start_ns = time.monotonic_ns()
+            #rounded down to the sensor's grid the same way Sensor.read_data rounds now
+            read_ns = clock.now_ns()
+            micros = (read_ns % 1_000_000_000) // 1000
+            grid_ns = read_ns - read_ns % 1000 - (micros % delay_micros) * 1000
+            try:
+                value = read()
+            except Exception:
+                self.errors += 1
+                self.l.exception(self.name + " " + sensor.topic + " read raised")
+                return
+            end_ns = time.monotonic_ns()
+            if sensor.metrics_interval_s:
+                sensor.read_hist.add((end_ns - start_ns) // 1000)
+            if value is not None:
+                latest[0] = (end_ns, value, grid_ns)
+
+        def cached():
+            entry = latest[0]
+            if entry is None or time.monotonic_ns() - entry[0] > max_age_ns:
+                return None
+            if handed_out[0] is not None and entry[2] <= handed_out[0]:
+                return None
+            handed_out[0] = entry[2]
+            return entry[1]
+
+        sensor.retrieve_data = cached
+        sensor.read_time_ns = lambda: handed_out[0]
+        sensor.is_ready = lambda: latest[0] is not None
+        # the read time is measured here, not around the cached getter
+        sensor.time_reads = False
+        self.scheduler.add(sensor.topic, sensor.sensor_hz, read_in_thread)
+
+    def _wrap_batch(self, sensor, max_batches=64):
+        drain = sensor.retrieve_batch
+        ready = sensor.is_ready
+        # (ts ns, data) per drain, the controller thread takes them all
+        batches = deque(maxlen=max_batches)
+
+        def drain_in_thread():
+            if not ready():
+                return
+            start_ns = time.monotonic_ns()
+            try:
+                rb = drain()
+            except Exception:
+                self.errors += 1
+                self.l.exception(self.name + " " + sensor.topic + " drain raised")
+                return
+            if sensor.metrics_interval_s:
+                sensor.read_hist.add((time.monotonic_ns() - start_ns) // 1000)
+            if rb is not None and len(rb[1]):
+                batches.append(rb)
+
+        def queued():
+            taken = []
+            while batches:
+                taken.append(batches.popleft())
+            if not taken:
+                return None
+            if len(taken) == 1:
+                return taken[0]
+            return (np.concatenate([ts for ts, _ in taken]),
+                    np.concatenate([data for _, data in taken]))
+
+        sensor.retrieve_batch = queued
+        sensor.is_ready = lambda: True
+        sensor.time_reads = False
+        self.scheduler.add(sensor.topic, getattr(sensor, "schedule_hz", sensor.sensor_hz), drain_in_thread)
+
+    def start(self):
+        self.thread.start()
+        self.l.info(self.name + " reading " + str(len(self.sensors)) + " sensors in their own thread")
+        return self
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.scheduler.wait()
+            self.scheduler.run_due()
+
+    def stop(self, timeout=1):
+        self.stop_event.set()
+        self.thread.join(timeout)
+
+    def stats(self, reset=False):
+        return self.scheduler.stats(reset=reset)
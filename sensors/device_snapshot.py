@@ -0,0 +1,50 @@
+import time
+import numpy as np
+
+
+class DeviceSnapshot:
+    """
+    One measurement of a device shared by all of its sensors.
+    read_fn takes the measurement and returns every value the device has
+    (a dict, or None if there's nothing new), the first sensor to ask in a
+    tick triggers it and its siblings get the same result.
+    - max_age_s: how long a snapshot is reused, less than one period of the
+      device's fastest sensor so every tick still gets a fresh measurement
+    """
+
+    def __init__(self, read_fn, max_age_s):
+        self.read_fn = read_fn
+        self.max_age_ns = int(max_age_s * 1_000_000_000)
+        self.taken_ns = None
+        self.value = None
+        self.reads = 0
+
+    @classmethod
+    def for_sensors(cls, read_fn, sensors_config):
+        """a snapshot that's fresh for every tick of the fastest sensor in sensors_config"""
+        max_hz = max(max(1, s["hz"]) for s in sensors_config)
+        return cls(read_fn, 0.5 / max_hz)
+
+    def get(self):
+        now = time.monotonic_ns()
+        if self.taken_ns is None or now - self.taken_ns >= self.max_age_ns:
+            # a read that raises isn't cached, the next call tries again
+            self.value = self.read_fn()
+            self.taken_ns = now
+            self.reads += 1
+        return self.value
+
+    def is_ready(self):
+        return self.get() is not None
+
+    def field(self, key, scale=1, fn=None):
+        """a retrieve_data for one value of the snapshot, as a 1 element array"""
+        def retrieve():
+            value = self.get()
+            if value is None or value[key] is None:
+                return None
+            v = value[key]
+            if fn is not None:
+                v = fn(v)
+            return np.array([v * scale])
+        return retrieve
@@ -3,9 +3,40 @@ import sys
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from sensors.sensor import Sensor
+from sensors.device_snapshot import DeviceSnapshot
 import logging
 import numpy as np
 
+class _OneConversionBME280(adafruit_bme280.Adafruit_BME280_I2C):
+    """
+    in forced mode the driver's temperature, pressure and relative_humidity each
+    start their own conversion and wait on it, through _read_temperature (which
+    also sets the t_fine the other two are compensated with). read() forces one
+    conversion for temperature and skips it for pressure and humidity, which come
+    from the same conversion's registers.
+    written against adafruit-circuitpython-bme280 2.6.x, check _read_temperature
+    still starts the conversion when upgrading it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._skip_conversion = False
+        super().__init__(*args, **kwargs)
+
+    def _read_temperature(self):
+        # t_fine is already the one from this read's conversion
+        if self._skip_conversion:
+            return
+        super()._read_temperature()
+
+    def read(self):
+        temp = self.temperature
+        self._skip_conversion = True
+        try:
+            return temp, self.pressure, self.relative_humidity
+        finally:
+            self._skip_conversion = False
+
+
 class aBME280:
     def __init__(self, 
                     bus_location = "i2c-1-0x76",
@@ -51,14 +82,20 @@ class aBME280:
         self.l = logging.getLogger(self.device_name)
         self.l.setLevel(debug_lvl)
         self.l.info(self.device_name + " starting")
-        self.bme280 = adafruit_bme280.Adafruit_BME280_I2C(device_config['bus'], address=device_config['address'])
+        self.bme280 = _OneConversionBME280(device_config['bus'], address=device_config['address'])
         
         self.is_ready = lambda: True
 
-        #wrap these so they return a 1x1 numpy array
-        self.get_air_temperature = lambda: np.array([self.bme280.temperature])  
-        self.get_relative_humidity = lambda: np.array([self.bme280.relative_humidity])
-        self.get_barometric_pressure = lambda: np.array([self.bme280.pressure * 100])
+        # one conversion a tick for all three sensors
+        def read_bme280():
+            temp, pressure, hum = self.bme280.read()
+            return {"temp": temp, "hum": hum, "pressure": pressure}
+        self.snapshot = DeviceSnapshot.for_sensors(read_bme280, sensors_config)
+
+        #these return a 1x1 numpy array
+        self.get_air_temperature = self.snapshot.field("temp")
+        self.get_relative_humidity = self.snapshot.field("hum")
+        self.get_barometric_pressure = self.snapshot.field("pressure", scale=100)
         
         retrieve_datas = {'air-temp': self.get_air_temperature,
                             'rel-hum': self.get_relative_humidity,
@@ -4,6 +4,7 @@ import sys
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from sensors.sensor import Sensor
+from sensors.device_snapshot import DeviceSnapshot
 import logging
 import numpy as np
 
@@ -62,14 +63,27 @@ class aBME680:
 
 
 
-        self.bme680 = adafruit_bme680.Adafruit_BME680_I2C(device_config['bus'], address=device_config['address'], debug=False)
+        # the driver skips a new measurement if the last one is under 1/refresh_rate old,
+        # the default of 10 capped the 16hz pressure at 10 fresh readings a second.
+        # twice the fastest rate leaves the snapshot deciding when to measure
+        max_hz = max(max(1, s["hz"]) for s in sensors_config)
+        self.bme680 = adafruit_bme680.Adafruit_BME680_I2C(device_config['bus'], address=device_config['address'],
+                                                          debug=False, refresh_rate=int(max_hz * 2))
+
+        # temperature runs the one measurement, the rest are computed from it
+        def read_bme680():
+            return {"temp": self.bme680.temperature,
+                    "hum": self.bme680.relative_humidity,
+                    "pressure": self.bme680.pressure,
+                    "gas": self.bme680.gas}
+        self.snapshot = DeviceSnapshot.for_sensors(read_bme680, sensors_config)
 
         self.is_ready = lambda: True
 
-        self.get_temp_c = lambda: np.array([self.bme680.temperature])
-        self.get_relative_humidity = lambda: np.array([self.bme680.relative_humidity])
-        self.get_pressure_kpa = lambda: np.array([self.bme680.pressure / 10])
-        self.get_voc_lnohm = lambda: np.array([np.log(self.bme680.gas)])
+        self.get_temp_c = self.snapshot.field("temp")
+        self.get_relative_humidity = self.snapshot.field("hum")
+        self.get_pressure_kpa = self.snapshot.field("pressure", scale=.1)
+        self.get_voc_lnohm = self.snapshot.field("gas", fn=np.log)
 
         retrieve_datas = {'air-temp': self.get_temp_c,
                           'rel-hum': self.get_relative_humidity,
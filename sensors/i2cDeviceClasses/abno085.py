@@ -5,6 +5,13 @@ from adafruit_bno08x import (
     BNO_REPORT_MAGNETOMETER,
     BNO_REPORT_GAME_ROTATION_VECTOR,
 )
+try:
+    from adafruit_bno08x import _separate_batch
+except ImportError as e:
+    raise ImportError("QueuedBNO08X needs adafruit_bno08x._separate_batch, "
+                      "it was written against adafruit-circuitpython-bno08x 1.2.x") from e
+from collections import deque
+from struct import unpack_from
 import logging
 import sys
 import numpy as np
@@ -13,6 +20,79 @@ import time
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from sensors.sensor import Sensor
+from sensors.device_snapshot import DeviceSnapshot
+from platformUtils.clock import get_clock
+
+_BASE_TIMESTAMP = 0xFB
+_TIMESTAMP_REBASE = 0xFA
+
+report_ids = {'accel': BNO_REPORT_ACCELEROMETER,
+              'gyro': BNO_REPORT_GYROSCOPE,
+              'magnet': BNO_REPORT_MAGNETOMETER,
+              'game-rotation': BNO_REPORT_GAME_ROTATION_VECTOR}
+
+
+class QueuedBNO08X(BNO08X_I2C):
+    """
+    The driver only keeps the newest value of each report (and since it handles
+    a packet's reports last to first, really the oldest). This keeps every
+    report in a queue with the time the bno085 took it.
+    Each packet starts with a base timestamp record, the 100us ticks between the
+    sample times' base and when the packet was flagged, and every report carries
+    its delay from that base. Without the interrupt pin wired the time the packet
+    was read stands in for when it was flagged.
+    written against adafruit-circuitpython-bno08x 1.2.x, it overrides and calls the
+    driver's private packet handling, the names below are checked at startup so an
+    upgrade that changes them fails here instead of quietly losing the queue.
+    """
+
+    driver_methods = ("_process_available_packets", "_read_packet", "_handle_packet", "_process_report")
+    driver_attributes = ("_packet_slices", "_readings")
+
+    def __init__(self, i2c_bus, address, queued_reports=(), max_queued=64, **kwargs):
+        missing = [m for m in self.driver_methods if not callable(getattr(BNO08X_I2C, m, None))]
+        if missing:
+            raise RuntimeError("adafruit_bno08x has no " + ", ".join(missing) +
+                               ", QueuedBNO08X was written against adafruit-circuitpython-bno08x 1.2.x")
+        # (monotonic ns, values) per report id, the driver handles packets during __init__
+        self.reports = {rid: deque(maxlen=max_queued) for rid in queued_reports}
+        self._packet_ns = 0
+        self._base_ns = None
+        super().__init__(i2c_bus, address=address, **kwargs)
+        missing = [a for a in self.driver_attributes if not hasattr(self, a)]
+        if missing:
+            raise RuntimeError("adafruit_bno08x sets no " + ", ".join(missing) +
+                               ", QueuedBNO08X was written against adafruit-circuitpython-bno08x 1.2.x")
+
+    def _read_packet(self):
+        self._packet_ns = time.monotonic_ns()
+        return super()._read_packet()
+
+    def _handle_packet(self, packet):
+        # in order, so the base timestamp comes before the reports it's for
+        # and the newest report is the one left in _readings
+        _separate_batch(packet, self._packet_slices)
+        slices = self._packet_slices
+        self._packet_slices = []
+        for report_id, report_bytes in slices:
+            self._process_report(report_id, report_bytes)
+
+    def _process_report(self, report_id, report_bytes):
+        if report_id == _BASE_TIMESTAMP:
+            self._base_ns = self._packet_ns - unpack_from("<i", report_bytes, 1)[0] * 100_000
+            return
+        if report_id == _TIMESTAMP_REBASE:
+            if self._base_ns is not None:
+                self._base_ns += unpack_from("<i", report_bytes, 1)[0] * 100_000
+            return
+        super()._process_report(report_id, report_bytes)
+        q = self.reports.get(report_id)
+        if q is not None:
+            # 14 bit delay, the top 6 bits share the status byte with the accuracy
+            delay = ((report_bytes[2] >> 2) << 8) | report_bytes[3]
+            base_ns = self._base_ns if self._base_ns is not None else self._packet_ns
+            q.append((base_ns + delay * 100_000, self._readings[report_id]))
+
 
 class aBNO085:
     def __init__(self, 
@@ -23,7 +103,7 @@ class aBNO085:
                     device_config = {
                         "bus": None, # will be set by i2cController,
                         "address": 0x4b, # default address for bno085
-                        "read_timeout_s": 0.05,
+                        "read_timeout_s": 0.2,
                         "max_consecutive_errors": 5,
                         "log_queue": None, # will be set by i2cController,
                     },
@@ -72,25 +152,29 @@ class aBNO085:
         #this is different
         self._bus = device_config['bus']
         self._address = device_config['address']
-        self._read_timeout_s = device_config.get("read_timeout_s", 0.05)
+        # covers a whole drain of the queued reports, not one property read
+        self._read_timeout_s = device_config.get("read_timeout_s", 0.2)
         self._max_consecutive_errors = device_config.get("max_consecutive_errors", 5)
         self._consecutive_errors = 0
-        self.bno085 = BNO08X_I2C(self._bus, address=self._address)
-        self.bno085.enable_feature(BNO_REPORT_ACCELEROMETER) #add interval micros if desired
-        self.bno085.enable_feature(BNO_REPORT_GYROSCOPE)
-        self.bno085.enable_feature(BNO_REPORT_MAGNETOMETER)
-        self.bno085.enable_feature(BNO_REPORT_GAME_ROTATION_VECTOR)
+        # the bno085 reports at each sensor's own rate and the reports are drained in
+        # batches, a couple of seconds of them are kept in case a drain is late
+        self._report_hz = {report_ids[s['sensor_type']]: max(1, s['hz']) for s in sensors_config}
+        self._max_queued = max(64, 2 * max(self._report_hz.values()))
+
+        def _connect():
+            bno085 = QueuedBNO08X(self._bus, self._address, queued_reports=self._report_hz.keys(),
+                                  max_queued=self._max_queued)
+            for report_id, hz in self._report_hz.items():
+                bno085.enable_feature(report_id, report_interval=int(1_000_000 / hz))
+            return bno085
+        self.bno085 = _connect()
         
         self.is_ready = lambda: True
         
         def _reinit():
             try:
                 self.l.warning(self.device_name + " attempting BNO08x re-initialization after error")
-                self.bno085 = BNO08X_I2C(self._bus, address=self._address)
-                self.bno085.enable_feature(BNO_REPORT_ACCELEROMETER)
-                self.bno085.enable_feature(BNO_REPORT_GYROSCOPE)
-                self.bno085.enable_feature(BNO_REPORT_MAGNETOMETER)
-                self.bno085.enable_feature(BNO_REPORT_GAME_ROTATION_VECTOR)
+                self.bno085 = _connect()
                 self._consecutive_errors = 0
                 return True
             except Exception:
@@ -117,6 +201,24 @@ class aBNO085:
                 self._consecutive_errors = 0
             return value
 
+        # every pending packet is read once a tick, whichever sensor asks first
+        def _drain():
+            _safe_read("reports", self.bno085._process_available_packets)
+            return True
+        max_schedule_hz = max(s.get("schedule_hz", min(max(1, s["hz"]), 10)) for s in sensors_config)
+        self.drain = DeviceSnapshot(_drain, 0.5 / max_schedule_hz)
+
+        def _batch_for(report_id):
+            def retrieve():
+                self.drain.get()
+                q = self.bno085.reports[report_id]
+                if not q:
+                    return None
+                reports = [q.popleft() for _ in range(len(q))]
+                ts_ns = get_clock().mono_to_wall_ns(np.array([t for t, _ in reports], dtype=np.int64))
+                return ts_ns, np.array([v for _, v in reports])
+            return retrieve
+
         self.get_accel = lambda: np.array([_safe_read("acceleration", lambda: self.bno085.acceleration)])
         self.get_gyro = lambda: np.array([_safe_read("gyroscope", lambda: self.bno085.gyro)])
         self.get_magnet = lambda: np.array([_safe_read("magnetometer", lambda: self.bno085.magnetic)])
@@ -138,5 +240,8 @@ class aBNO085:
             if "debug_lvl" not in s:
                 s["debug_lvl"] = debug_lvl
             s["retrieve_data"] = retrieve_datas[s['sensor_type']]
+            s["retrieve_batch"] = _batch_for(report_ids[s['sensor_type']])
+            # drained a few times a second, each drain sends everything queued since the last
+            s.setdefault("schedule_hz", min(max(1, s["hz"]), 10))
             s["is_ready"] = self.is_ready
             self.sensors.append(Sensor(**s))
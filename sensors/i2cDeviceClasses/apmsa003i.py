@@ -1,10 +1,10 @@
-from datetime import datetime, timedelta
 from adafruit_pm25.i2c import PM25_I2C
 import numpy as np
 import sys
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from sensors.sensor import Sensor
+from sensors.device_snapshot import DeviceSnapshot
 import logging
 
 class aPMSA003I:
@@ -62,27 +62,19 @@ class aPMSA003I:
         self.pm25 = PM25_I2C(device_config['bus'], None)
         self.is_ready = lambda: True
         
-        #this is to reduce updates to 1hz
-        self.fresh_till = datetime.fromtimestamp(0)
-        self.aqdata = None
-        def get_aqdata_field(s):
-            # if data expired refresh
-            now = datetime.now()
-            if now <= self.fresh_till:
-                return self.aqdata[s]
-            
+        # one frame a tick for all four sensors, the sensor only updates once a second anyway
+        def read_pm25():
             try:
-                self.aqdata = self.pm25.read()
-                self.fresh_till = now + timedelta(seconds=1)
+                return self.pm25.read()
             except RuntimeError:
-                print("Unable to read from sensor")
+                self.l.warning(self.device_name + " unable to read from sensor")
                 return None
-            return self.aqdata[s]
+        self.snapshot = DeviceSnapshot.for_sensors(read_pm25, sensors_config)
 
-        self.get_pm1 = lambda: np.array([get_aqdata_field("pm10 env")])
-        self.get_pm2P5 = lambda: np.array([get_aqdata_field("pm25 env")])
-        self.get_pm10 = lambda: np.array([get_aqdata_field("pm100 env")])
-        self.get_count = lambda: np.array([get_aqdata_field("particles 03um")])
+        self.get_pm1 = self.snapshot.field("pm10 env")
+        self.get_pm2P5 = self.snapshot.field("pm25 env")
+        self.get_pm10 = self.snapshot.field("pm100 env")
+        self.get_count = self.snapshot.field("particles 03um")
         
         retrieve_datas = {'air-particulate-pm1': self.get_pm1,
                             'air-particulate-pm2P5': self.get_pm2P5,
@@ -6,6 +6,7 @@ import numpy as np
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from sensors.sensor import Sensor
+from sensors.device_snapshot import DeviceSnapshot
 
 
 class aSCD41:
@@ -55,11 +56,24 @@ class aSCD41:
         self.scd4x = adafruit_scd4x.SCD4X(device_config['bus'], address=device_config['address'])
         self.scd4x.start_periodic_measurement()
         
-        self.is_ready = lambda: self.scd4x.data_ready
+        # one data_ready check and one read a tick for all three sensors,
+        # checking data_ready per sensor meant the first read cleared it for the others
+        def read_scd41():
+            if not self.scd4x.data_ready:
+                return None
+            # CO2 reads the measurement, temperature and relative_humidity then
+            # find data_ready cleared and return the values from that same read
+            co2 = self.scd4x.CO2
+            return {"co2": co2,
+                    "temp": self.scd4x.temperature,
+                    "hum": self.scd4x.relative_humidity}
+        self.snapshot = DeviceSnapshot.for_sensors(read_scd41, sensors_config)
+
+        self.is_ready = self.snapshot.is_ready
         
-        self.get_co2 = lambda: np.array([self.scd4x.CO2])
-        self.get_air_temperature = lambda: np.array([self.scd4x.temperature])
-        self.get_relative_humidity = lambda: np.array([self.scd4x.relative_humidity])
+        self.get_co2 = self.snapshot.field("co2")
+        self.get_air_temperature = self.snapshot.field("temp")
+        self.get_relative_humidity = self.snapshot.field("hum")
         
         retrieve_datas = {'co2': self.get_co2,
                             'air-temp': self.get_air_temperature,
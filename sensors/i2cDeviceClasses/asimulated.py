@@ -0,0 +1,78 @@
+import sys
+import logging
+import numpy as np
+
+repoPath = "/home/pi/Documents/"
+sys.path.append(repoPath + "unifiedSensorClient/")
+from sensors.sensor import Sensor
+from sensors.device_snapshot import DeviceSnapshot
+from sensors.simulation import SimSignal, FaultInjector
+
+
+class aSimulated:
+    """
+    Stands in for any i2c device class when the controller is simulated, it takes
+    the same sensors_config and makes each sensor a SimSignal of its sensor type.
+    device_config "simulation" can add latency and faults to this device's reads
+    on top of the bus's.
+    """
+
+    def __init__(self,
+                    bus_location = "i2c-1-0x00",
+                    device_name = "simulated",
+                    debug_lvl = 30,
+
+                    device_config = {
+                        "bus": None, # will be set by i2cController,
+                        "address": 0x00,
+                        "simulation": {},
+                    },
+                    sensors_config = []):
+        self.device_name = f"{bus_location}-{device_name}"
+        self.l = logging.getLogger(self.device_name)
+        self.l.setLevel(debug_lvl)
+        self.l.info(self.device_name + " starting (simulated)")
+
+        self.bus = device_config['bus']
+        self.address = device_config['address']
+        self.bus.addresses.add(self.address)
+        simulation = device_config.get("simulation", {})
+        self.faults = FaultInjector(**simulation)
+
+        self.signals = {s['sensor_type']: SimSignal.for_sensor(s, seed=self.address + i)
+                        for i, s in enumerate(sensors_config)}
+
+        # one bus transaction a tick for all the sensors, like the real devices
+        def read_device():
+            self.bus.transaction(self.address, self.faults)
+            return {sensor_type: signal.value() for sensor_type, signal in self.signals.items()}
+        self.snapshot = DeviceSnapshot.for_sensors(read_device, sensors_config)
+
+        self.is_ready = lambda: True
+
+        def _retrieve_for(s):
+            key = s['sensor_type']
+            is_int = s.get("data_type") == "int"
+
+            def retrieve():
+                v = self.snapshot.get()[key]
+                # a 1x1 sensor reads as [value] like the real ones, wider ones as [[values]]
+                if len(v) == 1:
+                    v = v[0]
+                if is_int:
+                    v = np.rint(v).astype(np.int64)
+                return np.array([v])
+            return retrieve
+
+        self.sensors = []
+        for s in sensors_config:
+            if "file_writer_config" in s:
+                s["file_writer_config"]["log_queue"] = device_config.get("log_queue")
+            s["log_queue"] = device_config.get("log_queue")
+            s["bus_location"] = bus_location
+            s["device_name"] = device_name
+            if "debug_lvl" not in s:
+                s["debug_lvl"] = debug_lvl
+            s["retrieve_data"] = _retrieve_for(s)
+            s["is_ready"] = self.is_ready
+            self.sensors.append(Sensor(**s))
@@ -1,7 +1,5 @@
-import os
 import sys
 import time
-from datetime import datetime, timezone
 
 import zmq
 import logging
@@ -11,13 +9,16 @@ sys.path.append(repoPath + "unifiedSensorClient/")
 from platformUtils.logUtils import worker_configurer, set_process_title
 from config import (
     zmq_control_endpoint,
-    audio_controller_process_config,
+    zmq_control_requests_endpoint,
+    audio_controller_process_1_config,
 )
 from platformUtils.zmq_codec import ZmqCodec
-from sensors.audio.audioCapture import AudioCapture
+from platformUtils.clock import get_clock
+from platformUtils.utils import should_exit
+from sensors.audioDeviceClasses.audioCapture import AudioCapture
 
-config = audio_controller_process_config
-def audio_controller():
+
+def audio_controller(config=audio_controller_process_1_config):
     set_process_title(config["short_name"])
     worker_configurer(config["debug_lvl"])
     l = logging.getLogger(config["short_name"])
@@ -28,53 +29,71 @@ def audio_controller():
     sub.connect(zmq_control_endpoint)
     sub.setsockopt(zmq.SUBSCRIBE, b"control")
     l.info(config["short_name"] + " controller connected to control topic")
-    
 
     # Start audio capture publisher
+    topic = config.get("pub_topic", config["topic"])
     cap = AudioCapture({
         "short_name": config["short_name"],
         "debug_lvl": config["debug_lvl"],
         "sample_rate": config["sample_rate"],
+        "subsample_ratio": config.get("subsample_ratio", 1),
         "channels": config["channels"],
         "hz": config["hz"],
         "dtype": config["dtype"],
-        "pub_topic": config["pub_topic"],
-        "pub_endpoint": config["pub_endpoint"],
+        "pub_topic": topic,
+        "pub_endpoint": config.get("pub_endpoint", f"ipc:///tmp/{topic}.sock"),
         "device": config.get("device", None),
+        "ring_seconds": config.get("ring_seconds", 4),
+        "simulated": config.get("simulated", False),
+        "simulation": config.get("simulation", {}),
     })
     cap.start()
     cap.enable()
 
-    last_publish_check = time.time()
-    target_hz = 16
-    delay_micros = 1_000_000/target_hz
+    #chunk to publish latency goes to main on the metrics topic like the sensors' read times
+    clock = get_clock()
+    metrics_interval_s = config.get("metrics_interval_s", 0)
+    if metrics_interval_s:
+        metrics_pub = ctx.socket(zmq.PUB)
+        metrics_pub.connect(zmq_control_requests_endpoint)
+        next_metrics = time.monotonic() + metrics_interval_s
+
+    #one wait for both, the callback's wakeup means a chunk is in the ring
+    poller = zmq.Poller()
+    poller.register(sub, zmq.POLLIN)
+    wakeup_fd = cap.wakeup.fileno()
+    poller.register(wakeup_fd, zmq.POLLIN)
 
     try:
         while True:
-            # Publish any pending audio frames
-            if cap.is_enabled():
-                cap.publish_pending()
+            timeout = None
+            if metrics_interval_s:
+                timeout = max(0, (next_metrics - time.monotonic()) * 1000)
+            events = dict(poller.poll(timeout))
+
+            if wakeup_fd in events:
+                cap.retrieve_data()
 
-            try:
-                parts = sub.recv_multipart(flags=zmq.NOBLOCK)
-                topic, obj = ZmqCodec.decode(parts)
-                if topic == "control" and (obj[0] == "exit_all" or (obj[0] == "exit" and obj[-1] == "audio")):
+            if sub in events:
+                topic_in, obj = ZmqCodec.decode(sub.recv_multipart())
+                if should_exit(topic_in, obj, config["short_name"]):
                     l.info(config["short_name"] + " controller exiting")
                     break
-            except zmq.Again:
-                pass
 
-            micros_to_delay = delay_micros - (datetime.now().microsecond % delay_micros)
-            time.sleep(micros_to_delay/1_000_000)
+            if metrics_interval_s and time.monotonic() >= next_metrics:
+                next_metrics += metrics_interval_s
+                m = cap.metrics()
+                m["interval_s"] = metrics_interval_s
+                metrics_pub.send_multipart(ZmqCodec.encode("metrics", [clock.now(), topic, m]))
     finally:
-        cap.stop()
+        cap.close()
         try:
             sub.close(0)
+            if metrics_interval_s:
+                metrics_pub.close(0)
         except Exception:
             pass
 
 
 if __name__ == "__main__":
     audio_controller()
-
-
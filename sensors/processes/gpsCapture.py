@@ -1,11 +1,8 @@
 import sys
 import zmq
 import time
-from datetime import datetime
 import queue
 import logging
-import board
-import busio
 import numpy as np
 import adafruit_gps
 repoPath = "/home/pi/Documents/"
@@ -13,9 +10,9 @@ sys.path.append(repoPath + "unifiedSensorClient/")
 from platformUtils.zmq_codec import ZmqCodec
 from config import zmq_control_endpoint
 from platformUtils.logUtils import worker_configurer, set_process_title
+from platformUtils.clock import get_clock
 from sensors.sensor import Sensor
-
-import serial
+from sensors.simulation import NmeaFeeder
 
 
 
@@ -39,6 +36,12 @@ def gps_capture(config: dict):
 
 
     def init_gps():
+        # a simulated gps reads made up (or a logged file's) sentences instead of the serial port
+        if config.get("simulated", False):
+            uart = NmeaFeeder(**config.get("simulation", {}))
+            return uart, adafruit_gps.GPS(uart, debug=False)
+
+        import serial
         uart = serial.Serial(port, baudrate=9600, timeout=timeout)
         gps = adafruit_gps.GPS(uart, debug=False) 
         gps.send_command(b"PMTK251,57600")
@@ -159,8 +162,9 @@ def gps_capture(config: dict):
 
     
 
-    delay_micros = 1_000_000/config["hz"]
-    time.sleep(1 - datetime.now().microsecond/1_000_000)
+    # the loop wakes on the same clock the sensors stamp with
+    clock = get_clock()
+    clock.sleep_to_grid(1)
     consecutive_parse_errors = 0
     reset_threshold = int(config.get("parse_error_reset_threshold", 5))
     while True:
@@ -200,13 +204,11 @@ def gps_capture(config: dict):
                 except Exception:
                     l.exception("gps failed to reinitialize after parse errors")
             # Skip this cycle
-            micros_to_delay = delay_micros - (datetime.now().microsecond % delay_micros)
-            time.sleep(micros_to_delay/1_000_000)
+            clock.sleep_to_grid(config["hz"])
             continue
         except Exception:
             l.exception("gps unexpected exception during update")
-            micros_to_delay = delay_micros - (datetime.now().microsecond % delay_micros)
-            time.sleep(micros_to_delay/1_000_000)
+            clock.sleep_to_grid(config["hz"])
             continue
         if not gps.has_fix:
             #log gps waiting for fix
@@ -217,7 +219,6 @@ def gps_capture(config: dict):
             for sensor in sensors:
                 sensor.read_data()
         
-        micros_to_delay = delay_micros - (datetime.now().microsecond % delay_micros)
-        time.sleep(micros_to_delay/1_000_000)
+        clock.sleep_to_grid(config["hz"])
     
     l.info(config["short_name"] + " process exiting")
\ No newline at end of file
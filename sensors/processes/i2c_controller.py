@@ -1,5 +1,3 @@
-import board
-import busio
 import time
 from datetime import datetime
 
@@ -11,9 +9,12 @@ import zmq
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from platformUtils.zmq_codec import ZmqCodec
-from adafruit_extended_bus import ExtendedI2C as I2C
 import traceback
 from platformUtils.utils import configure_process, should_exit
+from sensors.scheduler import DeadlineScheduler
+from platformUtils.clock import get_clock
+from sensors.device_reader import DeviceReader
+from sensors.simulation import SimulatedI2C, FaultInjector
 
 def load_class_and_instantiate(filepath, class_name, l, *args, **kwargs):
     module_name = os.path.splitext(os.path.basename(filepath))[0]
@@ -31,21 +32,31 @@ def i2c_controller(config_name):
     l, sub, config = configure_process(ctx, config_name)
     l.info(config_name + " controller starting")
 
-    # initialize I2C bus by bus number (e.g., /dev/i2c-1) using ExtendedI2C
-    try:
-        I2C_BUS = I2C(config['bus_number'])
-        l.debug(f"{config_name} using /dev/i2c-{config['bus_number']}")
-    except Exception as e:
-        l.error(f"Failed to open /dev/i2c-{config['bus_number']}: {e}")
-        raise
+    # simulated controllers get a fake bus and every device is an aSimulated,
+    # so they run without the hardware (or its libraries) installed
+    simulated = config.get("simulated", False)
+    if simulated:
+        I2C_BUS = SimulatedI2C(config['bus_number'], faults=FaultInjector(**config.get("simulation", {})))
+        l.info(f"{config_name} using a simulated i2c-{config['bus_number']}")
+    else:
+        # initialize I2C bus by bus number (e.g., /dev/i2c-1) using ExtendedI2C
+        from adafruit_extended_bus import ExtendedI2C as I2C
+        try:
+            I2C_BUS = I2C(config['bus_number'])
+            l.debug(f"{config_name} using /dev/i2c-{config['bus_number']}")
+        except Exception as e:
+            l.error(f"Failed to open /dev/i2c-{config['bus_number']}: {e}")
+            raise
     # compile a list of all of the devices
     
     
     devices = []
     for device in config['devices']:
+        module_name = "asimulated" if simulated else device['module_name']
+        class_name = "aSimulated" if simulated else device['class_name']
         devices.append(load_class_and_instantiate(
-            config['device_class_loc'] + device['module_name'] + '.py',
-            device['class_name'],
+            config['device_class_loc'] + module_name + '.py',
+            class_name,
             l,
             **{
             "bus_location": device['bus_location'],
@@ -55,41 +66,58 @@ def i2c_controller(config_name):
             "device_config": {
                 "bus": I2C_BUS,
                 "address": device['address'],
+                "simulation": device.get("simulation", {}),
                 },
             },
         ))
     # loop through the devices and collect the sensors
     sensors = []
-    for device in devices:
+    readers = []
+    for device, device_cfg in zip(devices, config['devices']):
         sensors.extend(device.sensors)
+        # slow devices get their own reader thread, the loop below then only publishes what they've read
+        if device_cfg.get("threaded", False):
+            readers.append(DeviceReader(device_cfg['bus_location'] + "_" + device_cfg['device_name'],
+                                        device.sensors,
+                                        max_age_periods=device_cfg.get("max_age_periods", 1.5),
+                                        debug_lvl=device_cfg['debug_lvl']).start())
 
-    max_hz = max(s.hz for s in sensors)
-    l.info(config_name + " controller max hz: " + str(max_hz))
-    # works perfectly up to 64 hz
-    delay_micros = 1_000_000/max_hz
+    # every sensor is woken on its own rate instead of all of them at the fastest one,
+    # sensors that queue their own samples are only drained at their schedule_hz
+    scheduler = DeadlineScheduler(wake_offset_us=config.get("wake_offset_us", 200))
+    for sensor in sensors:
+        scheduler.add(sensor.topic, sensor.schedule_hz, sensor.read_data)
+    l.info(config_name + " controller scheduled " + str(len(sensors)) + " sensors, max hz: " + 
+           str(max(s.schedule_hz for s in sensors)))
+    stats_interval_s = config.get("schedule_stats_interval_s", 60)
+    next_stats = time.monotonic() + stats_interval_s
 
     # Start loop
-    time.sleep(1 - datetime.now().microsecond/1_000_000)
     try:
         while True:
-            #print(f"in loop time is {datetime.now()}")
-            #sys.stdout.flush()
-            for sensor in sensors:
-                sensor.read_data()
-
             # check if there's any messages in the control signal topic
-            try:
-                parts = sub.recv_multipart(flags=zmq.NOBLOCK)
+            if scheduler.wait(sub):
+                parts = sub.recv_multipart()
                 topic, obj = ZmqCodec.decode(parts)
                 l.debug(config_name + " controller control message: " + str(obj))
                 if should_exit(topic, obj, config_name):
                     break
-            except zmq.Again:
-                # No message available
-                pass
-                    
-            micros_to_delay = delay_micros - (datetime.now().microsecond % delay_micros)
-            time.sleep(micros_to_delay/1_000_000)
+                continue
+
+            scheduler.run_due()
+
+            if time.monotonic() >= next_stats:
+                next_stats += stats_interval_s
+                for name, st in scheduler.stats(reset=True).items():
+                    l.debug(name + " late mean: " + f"{st['late_mean_us']:.0f}" + "us jitter: " + 
+                            f"{st['jitter_us']:.0f}" + "us max: " + f"{st['late_max_us']:.0f}" + 
+                            "us missed: " + str(st['missed']))
+                    if st['missed']:
+                        l.warning(name + " missed " + str(st['missed']) + " reads in the last " + 
+                                  str(stats_interval_s) + " seconds")
+                clock_stats = get_clock().metrics()
+                l.debug(config_name + " clock offset: " + f"{clock_stats['offset_us']:.0f}" + "us max: " + 
+                        f"{clock_stats['max_offset_us']:.0f}" + "us steps: " + str(clock_stats['steps']))
     except Exception as e:
         # Log full traceback to logs and stderr immediately, then terminate this process
         l.exception(f"{config_name} controller encountered an unhandled exception and will exit")
@@ -97,6 +125,11 @@ def i2c_controller(config_name):
         sys.stderr.flush()
         os._exit(1)
         
+    for reader in readers:
+        reader.stop()
+    # send anything still sitting in a batch
+    for sensor in sensors:
+        sensor.close()
     l.info(config_name + " controller exiting")  
 
 if __name__ == "__main__":
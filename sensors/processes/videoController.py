@@ -10,6 +10,7 @@ repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from platformUtils.zmq_codec import ZmqCodec
 from platformUtils.utils import configure_process, should_exit
+from platformUtils.clock import get_clock
 
 def load_class_and_instantiate(filepath, class_name, l, *args, **kwargs):
     module_name = os.path.splitext(os.path.basename(filepath))[0]
@@ -28,10 +29,20 @@ def video_controller(config_name):
 
     fwc = config['file_writer_config']
 
+    # a simulated controller makes synthetic frames instead of opening the camera
+    camera_module_name = config['camera_module_name']
+    camera_class_name = config['camera_class_name']
+    camera_args = {}
+    if config.get("simulated", False):
+        camera_module_name = "syntheticCamera"
+        camera_class_name = "SyntheticCamera"
+        camera_args["simulation"] = config.get("simulation", {})
+
     camera = load_class_and_instantiate(
-        config['camera_class_loc'] + config['camera_module_name'] + '.py',
-        config['camera_class_name'],
+        config['camera_class_loc'] + camera_module_name + '.py',
+        camera_class_name,
         l,
+        **camera_args,
         **{
             "bus_location": config['bus_location'],
             "device_name": config['device_name'],
@@ -50,6 +61,9 @@ def video_controller(config_name):
             "format": config['format'],
             "flip_vertical": config['flip_vertical'],
             "timestamp_images": config['timestamp_images'],
+            "shm_ring_slots": config.get('shm_ring_slots', 0),
+            "capture_stream": config.get('capture_stream', "main"),
+            "frame_pool_slots": config.get('frame_pool_slots', 4),
         })
 
     l.trace("camera initialized")
@@ -58,9 +72,21 @@ def video_controller(config_name):
     sensor = camera.sensor
     l.trace(delay_micros)
 
+    #smaller topics (a gray thumbnail, a yolo sized frame) made once from each new frame,
+    #only while something subscribes to them
+    derived = []
+    if config.get("derived_topics"):
+        from sensors.derived_topics import derived_topics_for
+        derived = derived_topics_for(sensor, config["derived_topics"], config['debug_lvl'])
+    last_derived_dt = None
+
     while True:
         l.trace("retrieving data")
         sensor.read_data()
+        if derived and sensor.last_read_dt is not None and sensor.last_read_dt != last_derived_dt:
+            last_derived_dt = sensor.last_read_dt
+            for d in derived:
+                d.publish(last_derived_dt, sensor.curr_data)
 
         try:
             parts = sub.recv_multipart(flags=zmq.NOBLOCK)
@@ -73,10 +99,11 @@ def video_controller(config_name):
             pass
         
 
-        micros_to_delay = delay_micros - (datetime.now().microsecond % delay_micros)
-        l.trace("sleeping for " + str(micros_to_delay) + " microseconds")
-        time.sleep(micros_to_delay/1_000_000)
+        get_clock().sleep_to_grid(hz)
 
+    for d in derived:
+        d.close()
+    sensor.close()
     l.info(config_name + " controller exiting")
 
 if __name__ == "__main__":
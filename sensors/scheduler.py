@@ -0,0 +1,143 @@
+import heapq
+import math
+import time
+
+from platformUtils.clock import get_clock
+
+
+class _Task:
+    __slots__ = ("name", "fn", "hz", "period_ns", "k", "due", "runs", "missed",
+                 "late_mean", "late_m2", "late_max")
+
+    def __init__(self, name, fn, hz):
+        self.name = name
+        self.fn = fn
+        self.hz = hz
+        # integer hz gets an exact grid, anything else is rounded to the ns
+        self.period_ns = None if float(hz).is_integer() else round(1_000_000_000 / hz)
+        self.k = 0
+        self.due = 0
+        self.runs = 0
+        self.missed = 0
+        self.late_mean = 0.0
+        self.late_m2 = 0.0
+        self.late_max = 0
+
+    def wall_ns(self, k):
+        """wall clock time of the k-th tick since the epoch"""
+        if self.period_ns is None:
+            return k * 1_000_000_000 // int(self.hz)
+        return k * self.period_ns
+
+    def first_tick_after(self, wall_ns):
+        if self.period_ns is None:
+            return -(-wall_ns * int(self.hz) // 1_000_000_000)
+        return -(-wall_ns // self.period_ns)
+
+    def record(self, late_ns):
+        # welford, so jitter doesn't need the whole history
+        self.runs += 1
+        delta = late_ns - self.late_mean
+        self.late_mean += delta / self.runs
+        self.late_m2 += delta * (late_ns - self.late_mean)
+        if late_ns > self.late_max:
+            self.late_max = late_ns
+
+
+class DeadlineScheduler:
+    """
+    Runs functions at fixed rates on the wall clock grid (e.g. 32hz fires at
+    .0, .03125, ... of every second) but waits on time.monotonic_ns(), so it
+    wakes when the next one is due instead of polling every sensor at the
+    fastest rate.
+    - wake_offset_us: fire this long after the grid point, so a reader that
+      rounds datetime.now() down to its grid lands on the right sample
+    - ticks that are already past when a task finishes are skipped and counted as missed
+    """
+
+    def __init__(self, wake_offset_us=200):
+        self.wake_offset_ns = int(wake_offset_us * 1000)
+        self.heap = []
+        self.tasks = []
+        self._seq = 0
+
+    @staticmethod
+    def _wall_minus_mono():
+        # the same slewed offset Sensor stamps with, so the grid and the timestamps agree
+        return get_clock().offset_ns()
+
+    def add(self, name, hz, fn):
+        task = _Task(name, fn, hz)
+        offset = self._wall_minus_mono()
+        task.k = task.first_tick_after(time.monotonic_ns() + offset)
+        task.due = task.wall_ns(task.k) + self.wake_offset_ns - offset
+        self.tasks.append(task)
+        self._push(task)
+        return task
+
+    def _push(self, task):
+        self._seq += 1
+        heapq.heappush(self.heap, (task.due, self._seq, task))
+
+    def next_due_ns(self):
+        return self.heap[0][0] if self.heap else None
+
+    def wait(self, sub=None):
+        """
+        Sleep until the next task is due.
+        If sub is given it's polled while waiting, returns True as soon as it
+        has a message so control messages aren't held up by slow rates.
+        """
+        due = self.next_due_ns()
+        if due is None:
+            return bool(sub is not None and sub.poll(1000))
+        remaining = due - time.monotonic_ns()
+        # poll only has ms resolution, sleep the rest
+        if sub is not None and remaining > 1_000_000:
+            if sub.poll(remaining // 1_000_000 - 1):
+                return True
+            remaining = due - time.monotonic_ns()
+        elif sub is not None and sub.poll(0):
+            return True
+        if remaining > 0:
+            time.sleep(remaining / 1_000_000_000)
+        return False
+
+    def run_due(self):
+        """run every task that's due, returns how many ran"""
+        ran = 0
+        now = time.monotonic_ns()
+        while self.heap and self.heap[0][0] <= now:
+            _, _, task = heapq.heappop(self.heap)
+            task.record(now - task.due)
+            task.fn()
+            ran += 1
+
+            now = time.monotonic_ns()
+            offset = self._wall_minus_mono()
+            task.k += 1
+            task.due = task.wall_ns(task.k) + self.wake_offset_ns - offset
+            if task.due <= now:
+                skip_to = task.first_tick_after(now + offset - self.wake_offset_ns)
+                task.missed += skip_to - task.k
+                task.k = skip_to
+                task.due = task.wall_ns(task.k) + self.wake_offset_ns - offset
+            self._push(task)
+        return ran
+
+    def stats(self, reset=False):
+        """per task lateness in microseconds: mean, jitter (std dev), max, and missed ticks"""
+        out = {}
+        for task in self.tasks:
+            jitter = math.sqrt(task.late_m2 / (task.runs - 1)) if task.runs > 1 else 0.0
+            out[task.name] = {
+                "runs": task.runs,
+                "missed": task.missed,
+                "late_mean_us": task.late_mean / 1000,
+                "jitter_us": jitter / 1000,
+                "late_max_us": task.late_max / 1000,
+            }
+            if reset:
+                task.runs = task.missed = task.late_max = 0
+                task.late_mean = task.late_m2 = 0.0
+        return out
@@ -6,12 +6,15 @@ import numpy as np
 import sys
 
 
-from platformUtils.zmq_codec import ZmqCodec
+from platformUtils.zmq_codec import ZmqCodec, fixed_layout_ok, ns_to_datetime, datetime_to_ns
+from platformUtils.shm_ring import ShmFrameRing, ring_name
+from platformUtils.metrics import Histogram
+from platformUtils.clock import get_clock
 import logging
 import multiprocessing as mp
-from writers.processes.writerProcess import writer_process
-from config import zmq_control_endpoint
-from platformUtils.utils import send_orchestrator_command
+from writers.services.writerProcess import writer_process
+from config import zmq_control_endpoint, zmq_control_requests_endpoint
+from platformUtils.utils import send_orchestrator_command, bind_pub
 
 
 class Sensor:
@@ -28,6 +31,14 @@ class Sensor:
                     debug_lvl = 30,
                     retrieve_data = lambda: None,
                     is_ready=lambda: True,
+                    shm_ring_slots = 0,
+                    batch_samples = 1,
+                    batch_ms = 0,
+                    metrics_interval_s = 0,
+                    retrieve_batch = None,
+                    schedule_hz = None,
+                    grace_interp = False,
+                    on_sent = None,
                     **kwargs
                     ):
         
@@ -35,21 +46,30 @@ class Sensor:
         self.l = logging.getLogger("sensor_startup")
         self.l.setLevel(debug_lvl)
         time.sleep(.25)
+        #samples are stamped from the process's monotonic clock, so ntp adjustments can't skip or repeat a slot
+        self.clock = get_clock()
         
         if retrieve_data is None:
             raise ValueError("retrieve_data is required")
         self.retrieve_data = retrieve_data
+        #devices that queue their own timestamped samples (the bno085 reports) return
+        #(epoch ns array, (N, ...) array) from retrieve_batch, polled at schedule_hz instead of hz
+        self.retrieve_batch = retrieve_batch
         #timing
         self.hz = hz
         self.sensor_hz = hz
         self.message_hz = max(1, hz)
         self.sensor_delay_micros = int(1_000_000/self.sensor_hz)
         self.message_delay_micros = int(1_000_000/self.message_hz)
+        self.schedule_hz = schedule_hz if schedule_hz else self.message_hz
+        self.last_batch_ns = None
         #self.timestamp_rounding_bits = config['timestamp_rounding_bits']
         #self.trillionths = 1_000_000_000_000/(2**self.timestamp_rounding_bits)
         self.sensor_update_after = datetime.fromtimestamp(0, tz=timezone.utc)
         self.message_update_after = datetime.fromtimestamp(0, tz=timezone.utc)
         self.grace_period_samples = grace_period_samples
+        #fill a gap with values interpolated towards the late reading instead of repeating the last one
+        self.grace_interp = grace_interp
         self.curr_data = None
 
 
@@ -88,9 +108,25 @@ class Sensor:
                 " != passed in topic: " + kwargs["topic"])
 
         self.endpoint = f"ipc:///tmp/{self.topic}.sock"
+
+        #shared memory transport, frames go in a ring and only [dt, slot, generation] goes over zmq
+        self.shm_ring_slots = shm_ring_slots
+        self.frame_ring = None
+        #called with (data, MessageTracker) after a zero copy send, so a frame pool knows when a buffer is free
+        self.on_sent = on_sent
+
+        #batching, samples are sent as one (N, ...) array stamped with the first sample's time
+        #a batch goes out when it has batch_samples samples, is batch_ms old, or the next sample isn't the next one on the grid
+        self.batch_samples = max(1, int(batch_samples))
+        self.batch_ms = batch_ms
+        self.batching = self.batch_samples > 1 or self.batch_ms > 0
+        self.batch = []
+        self.batch_start_dt = None
+        self.batch_next_dt = None
+        self.batch_tolerance = timedelta(microseconds=self.message_delay_micros // 2)
         self.ctx = zmq.Context()
         self.sensor_pub = self.ctx.socket(zmq.PUB)
-        self.sensor_pub.bind(self.endpoint)
+        bind_pub(self.sensor_pub, self.endpoint)
 
         #logging setup
         self.l = logging.getLogger(self.topic)
@@ -123,6 +159,20 @@ class Sensor:
         self.max_read_micros = (datetime.now(timezone.utc) - ts).total_seconds() * 1_000_000
         self.l.debug("estimated read time for " + self.topic + " is " + str(self.max_read_micros) + " microseconds")
 
+        #runtime read time and lateness histograms, published on the metrics topic every metrics_interval_s
+        self.metrics_interval_s = metrics_interval_s
+        #off when something else (a DeviceReader thread) times the real reads
+        self.time_reads = True
+        #set by a DeviceReader, the grid ns the value retrieve_data last returned was read at
+        self.read_time_ns = None
+        if self.metrics_interval_s:
+            self.read_hist = Histogram()
+            self.late_hist = Histogram()
+            #main listens for metrics on the requests endpoint
+            self.metrics_pub = self.ctx.socket(zmq.PUB)
+            self.metrics_pub.connect(zmq_control_requests_endpoint)
+            self.next_metrics_dt = self.clock.now() + timedelta(seconds=self.metrics_interval_s)
+
         #check if the writer is enabled
         self.writer_process = None
         if file_writer_config:
@@ -139,6 +189,8 @@ class Sensor:
                            "output_base": wc["output_base"],
                            "output_module": wc["output_module"],
                            "file_size_check_interval_s_range": wc["file_size_check_interval_s_range"],
+                           "max_file_duration_s": wc.get("max_file_duration_s"),
+                           "max_file_samples": wc.get("max_file_samples"),
                            "additional_output_config": wc["additional_output_config"]}
             
             self.writer_process_name = "writer@" + wc["output_base"] + ".service"
@@ -153,24 +205,188 @@ class Sensor:
             send_orchestrator_command(self.control_pub, "start", self.writer_process_name)
         self.l.info(self.topic + " initialized")
 
+    def _send(self, dt, data):
+        if self.batching:
+            self._add_to_batch(dt, data)
+            return
+        self._publish(dt, data)
+
+    def _add_to_batch(self, dt, data):
+        if self.batch and abs(dt - self.batch_next_dt) > self.batch_tolerance:
+            self.l.trace(self.topic + " gap before " + str(dt) + ", sending batch early")
+            self.flush_batch()
+        if not self.batch:
+            self.batch_start_dt = dt
+        self.batch.append(data)
+        self.batch_next_dt = dt + timedelta(microseconds=self.message_delay_micros)
+        if len(self.batch) >= self.batch_samples:
+            self.flush_batch()
+        else:
+            self._flush_batch_if_due(dt)
+
+    def _flush_batch_if_due(self, now):
+        if self.batch and self.batch_ms and \
+            now - self.batch_start_dt >= timedelta(milliseconds=self.batch_ms):
+            self.flush_batch()
+
+    def flush_batch(self):
+        if not self.batch:
+            return
+        if len(self.batch) == 1:
+            data = self.batch[0]
+        else:
+            data = np.concatenate([np.reshape(d, (-1,) + np.shape(d)[1:]) for d in self.batch])
+        self.l.trace(self.topic + " sending batch of " + str(len(self.batch)) + " at " + str(self.batch_start_dt))
+        self._publish(self.batch_start_dt, data)
+        self.batch = []
+        self.batch_start_dt = None
+
+    def _send_fill(self, from_dt, from_data, n, to_dt=None, to_data=None):
+        """
+        the n messages after from_dt the sensor missed, sent as one (n, ...) message at the first one's time.
+        repeats from_data, or with grace_interp, interpolates linearly towards to_data at to_dt
+        """
+        period_ns = self.message_delay_micros * 1000
+        offsets_ns = np.arange(1, n + 1, dtype=np.int64) * period_ns
+        from_data = np.reshape(from_data, (-1,) + np.shape(from_data)[1:])[-1:]
+        if self.grace_interp and to_data is not None and np.issubdtype(from_data.dtype, np.number):
+            to_data = np.reshape(to_data, (-1,) + np.shape(to_data)[1:])[:1]
+            gap_ns = datetime_to_ns(to_dt) - datetime_to_ns(from_dt)
+            frac = (offsets_ns / gap_ns).reshape((n,) + (1,) * (from_data.ndim - 1))
+            data = from_data + frac * (to_data - from_data)
+            if from_data.dtype.kind in "iu":
+                data = np.rint(data)
+            data = data.astype(from_data.dtype)
+        else:
+            data = np.repeat(from_data, n, axis=0)
+        first_dt = from_dt + timedelta(microseconds=self.message_delay_micros)
+        self.l.trace(self.topic + " filling " + str(n) + " messages from " + str(first_dt))
+        #the fill is its own chunk, anything batched before it goes out first
+        if self.batching:
+            self.flush_batch()
+        self._publish(first_dt, data)
+
+    def _ensure_ring(self, shape, dtype):
+        if self.frame_ring is None:
+            self.frame_ring = ShmFrameRing.create(ring_name(self.topic), self.shm_ring_slots, shape, dtype)
+            self.l.info(self.topic + " writing frames to shared memory ring " + self.frame_ring.name)
+        return self.frame_ring
+
+    def frame_buffer(self, shape, dtype):
+        """with a shared memory ring, the ring slot the next frame goes out in, for a camera to capture straight into"""
+        if not self.shm_ring_slots:
+            return None
+        return self._ensure_ring(shape, dtype).reserve()
+
+    def _publish(self, dt, data):
+        if self.shm_ring_slots:
+            self._ensure_ring(data.shape, data.dtype)
+            slot, generation = self.frame_ring.write(data)
+            self.sensor_pub.send_multipart(ZmqCodec.encode(self.topic, [dt, slot, generation]))
+            return
+        # small numeric readings skip msgpack, dtype and shape ride in the encoding tag
+        if fixed_layout_ok(data):
+            self.sensor_pub.send_multipart(ZmqCodec.encode_fixed(self.topic, dt, data))
+            return
+        # large arrays (camera frames) go out as their own frames without being copied
+        if self.on_sent is not None:
+            tracker = self.sensor_pub.send_multipart(ZmqCodec.encode(self.topic, [dt, data], zero_copy=True),
+                                                     copy=False, track=True)
+            self.on_sent(data, tracker)
+            return
+        self.sensor_pub.send_multipart(ZmqCodec.encode(self.topic, [dt, data], zero_copy=True), copy=False)
+
+    def close(self):
+        self.flush_batch()
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+            self.frame_ring = None
+        if self.metrics_interval_s:
+            self.metrics_pub.close(0)
+        self.sensor_pub.close(0)
+
+    def _retrieve(self):
+        if not self.metrics_interval_s or not self.time_reads:
+            return self.retrieve_data()
+        start_ns = time.perf_counter_ns()
+        rd = self.retrieve_data()
+        self.read_hist.add((time.perf_counter_ns() - start_ns) // 1000)
+        return rd
+
+    def _retrieve_batch(self):
+        if not self.metrics_interval_s or not self.time_reads:
+            return self.retrieve_batch()
+        start_ns = time.perf_counter_ns()
+        rb = self.retrieve_batch()
+        self.read_hist.add((time.perf_counter_ns() - start_ns) // 1000)
+        return rb
+
+    def read_batch(self):
+        """send every sample the device has queued, at its own timestamp rounded to the grid"""
+        rb = self._retrieve_batch()
+        if rb is None:
+            return
+        ts_ns, data = rb
+        if len(data) == 0:
+            return
+        period_ns = self.sensor_delay_micros * 1000
+        for t, d in zip(ts_ns, data):
+            t = (int(t) + period_ns // 2) // period_ns * period_ns
+            #two reports landing on one grid slot, keep the first
+            if self.last_batch_ns is not None and t <= self.last_batch_ns:
+                self.l.trace(self.topic + " dropping report at " + str(t) + ", slot already sent")
+                continue
+            self.last_batch_ns = t
+            self._send(ns_to_datetime(t), d[np.newaxis])
+        self.curr_data = data[-1:]
+        now = self.clock.now()
+        if self.batch:
+            self._flush_batch_if_due(now)
+        if self.metrics_interval_s:
+            #how old the newest report was when it went out
+            self._update_metrics(now, (self.clock.now_ns() - self.last_batch_ns) // 1000)
+
+    def _update_metrics(self, now, late_us):
+        self.late_hist.add(late_us)
+        if now < self.next_metrics_dt:
+            return
+        self.next_metrics_dt = now + timedelta(seconds=self.metrics_interval_s)
+        self.metrics_pub.send_multipart(ZmqCodec.encode("metrics", [now, self.topic, {
+            "interval_s": self.metrics_interval_s,
+            "read_us": self.read_hist.to_dict(),
+            "late_us": self.late_hist.to_dict(),
+            "clock": self.clock.metrics(),
+        }]))
+        self.read_hist.reset()
+        self.late_hist.reset()
+
     def read_data(self):
         if not self.is_ready():
             return
+
+        if self.retrieve_batch is not None:
+            self.read_batch()
+            return
         
         #check if it's the right time to read the data
-        now = datetime.now(timezone.utc)
-        rounded_down_micros = (now.microsecond//self.sensor_delay_micros) * self.sensor_delay_micros
-        now = now.replace(microsecond=int(rounded_down_micros))
+        now_ns = self.clock.now_ns()
+        now_micros = (now_ns % 1_000_000_000) // 1000
+        rounded_down_micros = (now_micros//self.sensor_delay_micros) * self.sensor_delay_micros
+        now = ns_to_datetime(now_ns - (now_micros - rounded_down_micros) * 1000)
 
         if self.hz == "variable":
             self.l.trace("sending data at time: " + str(now))
-            rd = self.retrieve_data()
+            rd = self._retrieve()
             if rd is None:
                 return
-            self.curr_data = np.array(rd)
-            self.sensor_pub.send_multipart(ZmqCodec.encode(self.topic, [now, self.curr_data]))
+            self.curr_data = np.asarray(rd)
+            self._send(now, self.curr_data)
             return
         
+        #a time limited batch shouldn't wait on the next sample to go out
+        if self.batch:
+            self._flush_batch_if_due(now)
+
         #The highest frequency thing will be the message hz, so we can check that first
         if now < self.message_update_after:
             return
@@ -180,44 +396,60 @@ class Sensor:
             seconds_since_last_read = (now - self.last_read_dt).total_seconds()
             self.l.trace("time since last read: " + str(seconds_since_last_read) + " seconds")
 
+        messages_to_fill = 0
         if self.last_read_dt is not None and seconds_since_last_read > 1/self.sensor_hz:
             messages_to_fill = min(int(seconds_since_last_read * self.message_hz) - 1, self.messages_to_interp)
-            self.l.trace("messages to fill: " + str(messages_to_fill))
-            if messages_to_fill > 0:
-                self.l.trace("it has been " + str(now - self.last_read_dt) + " seconds since the last read")
-                self.l.trace("we have a maximum of " + str(self.messages_to_interp) + " messages to interp")
-                self.l.trace("we will be writing " + str(messages_to_fill) + " number of messages")
-                
-                for i in range(1, messages_to_fill + 1):
-                    dt = self.last_read_dt + timedelta(seconds=i/self.message_hz)
-                    self.l.trace("filling message " + str(i) + " of " + str(messages_to_fill) + " at " + str(dt))
-                    self.sensor_pub.send_multipart(ZmqCodec.encode(self.topic, [dt, self.curr_data]))
-            
-
+        fill_from_dt = self.last_read_dt
+        fill_from_data = self.curr_data
+        read_dt = None
 
         #check if it's the right time to update the data
         if now >= self.sensor_update_after:            
             self.l.trace("updating data from " + self.topic)
 
             #ts = now.timestamp()
-            rd = self.retrieve_data()
+            read_dt = now
+            rd = self._retrieve()
             if rd is None:
+                #still fill the gap, there's just nothing to interpolate towards
+                if messages_to_fill > 0:
+                    self._send_fill(fill_from_dt, fill_from_data, messages_to_fill)
                 return
-            self.curr_data = np.array(rd)
+            #arrays are sent as they are, a camera's frame buffer isn't copied again here
+            self.curr_data = np.asarray(rd)
             #self.l.trace("read time: " + str(now.timestamp() - ts) + " seconds")
             #self.max_read_micros = max(self.max_read_micros, (now.timestamp() - ts) * 1_000_000)
             #self.l.trace("max read time: " + str(self.max_read_micros) + " microseconds")
 
             self.last_read_dt = now
+            if self.read_time_ns is not None:
+                #a threaded read can finish after its tick, it's stamped with the tick it was read on
+                read_dt = ns_to_datetime(self.read_time_ns())
             
-            self.sensor_update_after = now + timedelta(microseconds=self.sensor_delay_micros)
+            self.sensor_update_after = read_dt + timedelta(microseconds=self.sensor_delay_micros)
             self.l.trace("next sensor update after" + str(self.sensor_update_after))
 
+        #the fill goes out before the new reading so the messages stay in time order
+        fill_to_dt = now if read_dt is None else min(read_dt, now)
+        if messages_to_fill > 0 and fill_to_dt < now:
+            messages_to_fill = min(messages_to_fill, int((fill_to_dt - fill_from_dt).total_seconds() * self.message_hz) - 1)
+        if messages_to_fill > 0:
+            self._send_fill(fill_from_dt, fill_from_data, messages_to_fill, fill_to_dt, self.curr_data)
+
+        send_now = True
+        if read_dt is not None and read_dt < now:
+            self._send(read_dt, self.curr_data)
+            #now is already the next read's tick, that read goes out stamped now once it's in
+            send_now = now < self.sensor_update_after
         
         #for lower hz sensors, we need to fill the messages
         #if it's not time to get new data but it is time to send the interpolate as well
-        self.sensor_pub.send_multipart(ZmqCodec.encode(self.topic, [now, self.curr_data]))
+        if send_now:
+            self._send(now, self.curr_data)
         self.message_update_after = now + timedelta(microseconds=self.message_delay_micros)
+        if self.metrics_interval_s:
+            #how far past its slot on the message grid this send happened
+            self._update_metrics(now, now_micros % self.message_delay_micros)
         #we currently aren't supporting interpolation for lower hz sensors     
 
         
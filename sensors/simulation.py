@@ -0,0 +1,318 @@
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+
+# Stand ins for the hardware the controllers read from, so a controller can run
+# on a dev box or in ci with "simulated": True in its config.
+# everything is deterministic for a given seed, or replays a recorded file
+
+
+# typical values per sensor type, so a simulated device looks like the real one
+SIGNAL_DEFAULTS = {
+    "air-temp": {"mean": 21.0, "amplitude": 2.0, "period_s": 600, "noise": .05},
+    "rel-hum": {"mean": 45.0, "amplitude": 5.0, "period_s": 900, "noise": .2},
+    "air-pressure": {"mean": 101.3, "amplitude": .2, "period_s": 1800, "noise": .005},
+    "voc": {"mean": 11.0, "amplitude": .5, "period_s": 300, "noise": .05},
+    "co2": {"mean": 600.0, "amplitude": 150.0, "period_s": 1200, "noise": 5.0},
+    "accel": {"mean": 0.0, "amplitude": .5, "period_s": 2, "noise": .02},
+    "gyro": {"mean": 0.0, "amplitude": .1, "period_s": 3, "noise": .005},
+    "magnet": {"mean": 20.0, "amplitude": 5.0, "period_s": 10, "noise": .5},
+    "game-rotation": {"mean": 0.0, "amplitude": .7, "period_s": 20, "noise": .001},
+}
+
+
+def shape_channels(shape):
+    """values per sample for a topic shape string, "1x1" -> 1, "numpy-3" -> 3, "1x4" -> 4"""
+    last = shape.replace("-", "x").split("x")[-1]
+    return int(last) if last.isdigit() else 1
+
+
+class SimSignal:
+    """
+    A deterministic signal, a sine around mean plus seeded gaussian noise, one
+    value per channel with the channels a little out of phase.
+    - replay: a .npy (N,) or (N, channels) or a csv to loop through instead, one row a read
+    """
+
+    def __init__(self, channels=1, mean=0.0, amplitude=1.0, period_s=10, noise=0.0,
+                 seed=0, replay=None):
+        self.channels = channels
+        self.mean = mean
+        self.amplitude = amplitude
+        self.period_s = period_s
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.phases = np.arange(channels) * (2 * math.pi / max(channels, 3))
+        self.replay = None
+        self.replay_i = 0
+        if replay is not None:
+            if replay.endswith(".npy"):
+                data = np.load(replay)
+            else:
+                data = np.loadtxt(replay, delimiter=",", ndmin=2)
+            self.replay = np.reshape(data, (len(data), -1))
+
+    @classmethod
+    def for_sensor(cls, sensor_config, seed=0):
+        """a signal for a sensor config, its "simulation" dict overrides the sensor type's defaults"""
+        params = dict(SIGNAL_DEFAULTS.get(sensor_config.get("sensor_type"), {}))
+        params.update(sensor_config.get("simulation", {}))
+        params.setdefault("seed", seed)
+        return cls(channels=shape_channels(sensor_config.get("shape", "1x1")), **params)
+
+    def value(self, t=None):
+        """(channels,) values at t seconds since the epoch, or the next replayed row"""
+        if self.replay is not None:
+            row = self.replay[self.replay_i % len(self.replay)]
+            self.replay_i += 1
+            return row
+        if t is None:
+            t = time.time()
+        v = self.mean + self.amplitude * np.sin(2 * math.pi * t / self.period_s + self.phases)
+        if self.noise:
+            v = v + self.rng.normal(0, self.noise, self.channels)
+        return v
+
+
+class FaultInjector:
+    """
+    Makes a simulated transaction slow or fail.
+    - latency_s, latency_jitter_s: every call sleeps latency_s plus up to latency_jitter_s
+    - error_rate: fraction of calls that raise OSError, like a nacked i2c transfer
+    """
+
+    def __init__(self, latency_s=0, latency_jitter_s=0, error_rate=0, seed=0, **kwargs):
+        self.latency_s = latency_s
+        self.latency_jitter_s = latency_jitter_s
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    def __call__(self, name="transaction"):
+        self.calls += 1
+        delay = self.latency_s
+        if self.latency_jitter_s:
+            delay += self.rng.random() * self.latency_jitter_s
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise OSError("simulated " + name + " failure")
+
+
+class SimulatedI2C:
+    """
+    A stand in for the ExtendedI2C bus, with the locking busio has.
+    simulated devices call transaction() for each read, that's where the
+    bus's latency and faults are injected.
+    """
+
+    def __init__(self, bus_number=1, faults=None):
+        self.bus_number = bus_number
+        self.faults = faults if faults is not None else FaultInjector()
+        self._lock = threading.RLock()
+        self.addresses = set()
+
+    def try_lock(self):
+        return self._lock.acquire(blocking=False)
+
+    def unlock(self):
+        self._lock.release()
+
+    def scan(self):
+        return sorted(self.addresses)
+
+    def transaction(self, address, device_faults=None):
+        with self._lock:
+            self.faults("i2c-" + str(self.bus_number) + " " + hex(address))
+            if device_faults is not None:
+                device_faults(hex(address))
+
+    def deinit(self):
+        pass
+
+
+class SimulatedInputStream:
+    """
+    A stand in for sounddevice.InputStream, calls callback from its own thread
+    with a tone plus seeded noise, blocksize frames at a time.
+    - speed: 1 paces the blocks in real time, 0 runs them as fast as the callback goes
+    - overflow_rate: fraction of blocks flagged as an input overflow
+    """
+
+    def __init__(self, device=None, channels=1, samplerate=48000, blocksize=1024, dtype="int16",
+                 callback=None, tone_hz=440, level=.1, noise=.01, speed=1, overflow_rate=0,
+                 seed=0, **kwargs):
+        self.channels = channels
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.dtype = np.dtype(dtype)
+        self.callback = callback
+        self.tone_hz = tone_hz
+        self.level = level
+        self.noise = noise
+        self.speed = speed
+        self.overflow_rate = overflow_rate
+        self.rng = np.random.default_rng(seed)
+        self.frames_sent = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._t0 = None
+
+    def _block(self):
+        t = (self.frames_sent + np.arange(self.blocksize)) / self.samplerate
+        x = self.level * np.sin(2 * math.pi * self.tone_hz * t)
+        x = np.repeat(x[:, np.newaxis], self.channels, axis=1)
+        if self.noise:
+            x = x + self.rng.normal(0, self.noise, x.shape)
+        if self.dtype.kind == "i":
+            return np.clip(x * np.iinfo(self.dtype).max, np.iinfo(self.dtype).min,
+                           np.iinfo(self.dtype).max).astype(self.dtype)
+        return x.astype(self.dtype)
+
+    def _run(self):
+        self._t0 = time.monotonic()
+        while not self._stop.is_set():
+            block_start_s = self.frames_sent / self.samplerate
+            if self.speed:
+                wait = self._t0 + (block_start_s + self.blocksize / self.samplerate) / self.speed - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            now = time.monotonic() - self._t0
+            time_info = SimpleNamespace(currentTime=now, inputBufferAdcTime=block_start_s / (self.speed or 1))
+            status = ""
+            if self.overflow_rate and self.rng.random() < self.overflow_rate:
+                status = "input overflow"
+            self.callback(self._block(), self.blocksize, time_info, status)
+            self.frames_sent += self.blocksize
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="simulated_audio", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+
+
+def nmea_checksum(body):
+    c = 0
+    for ch in body.encode():
+        c ^= ch
+    return f"{c:02X}"
+
+
+def nmea_sentence(body):
+    return "$" + body + "*" + nmea_checksum(body) + "\r\n"
+
+
+class NmeaFeeder:
+    """
+    A stand in for the gps's serial port, it's what adafruit_gps.GPS reads from.
+    Replays an nmea log, or makes up GGA and VTG fixes on a slow circle when
+    there's no log, at hz fixes a second.
+    - speed: 1 paces the fixes in real time, 0 hands them over as fast as they're read
+    - corrupt_rate: fraction of sentences with a bad checksum, to exercise the parse error path
+    """
+
+    def __init__(self, path=None, hz=4, lat=37.8, lon=-122.4, alt_m=20.0, speed=1,
+                 corrupt_rate=0, seed=0, loop=True, **kwargs):
+        self.hz = hz
+        self.lat = lat
+        self.lon = lon
+        self.alt_m = alt_m
+        self.speed = speed
+        self.corrupt_rate = corrupt_rate
+        self.rng = random.Random(seed)
+        self.loop = loop
+        self.lines = None
+        if path is not None:
+            with open(path) as f:
+                self.lines = [ln.strip() + "\r\n" for ln in f if ln.startswith("$")]
+        self.line_i = 0
+        self.fix_i = 0
+        self.buffer = b""
+        self.next_fix_at = time.monotonic()
+        self.written = []
+
+    def _fix(self):
+        """one GGA and VTG pair for the next point on the circle"""
+        now = datetime.now(timezone.utc)
+        hhmmss = now.strftime("%H%M%S.") + f"{now.microsecond // 10000:02d}"
+        ang = 2 * math.pi * self.fix_i / (60 * self.hz)
+        lat = self.lat + .0005 * math.sin(ang)
+        lon = self.lon + .0005 * math.cos(ang)
+        self.fix_i += 1
+
+        def dm(v, deg_digits):
+            a = abs(v)
+            d = int(a)
+            return f"{d:0{deg_digits}d}{(a - d) * 60:07.4f}"
+        gga = ",".join(["GPGGA", hhmmss, dm(lat, 2), "N" if lat >= 0 else "S",
+                        dm(lon, 3), "E" if lon >= 0 else "W", "1", "08", "0.9",
+                        f"{self.alt_m:.1f}", "M", "-25.0", "M", "", ""])
+        vtg = ",".join(["GPVTG", f"{(math.degrees(ang) + 90) % 360:.2f}", "T", "", "M",
+                        "1.50", "N", "2.78", "K", "A"])
+        return [nmea_sentence(gga), nmea_sentence(vtg)]
+
+    def _next_lines(self):
+        if self.lines is None:
+            return self._fix()
+        if self.line_i >= len(self.lines):
+            if not self.loop:
+                return []
+            self.line_i = 0
+        line = self.lines[self.line_i]
+        self.line_i += 1
+        return [line]
+
+    def _fill(self):
+        if self.speed and time.monotonic() < self.next_fix_at:
+            return
+        if self.speed:
+            self.next_fix_at = max(self.next_fix_at + 1 / (self.hz * self.speed), time.monotonic() - 1)
+        for line in self._next_lines():
+            if self.corrupt_rate and self.rng.random() < self.corrupt_rate:
+                line = line[:-4] + "00\r\n"
+            self.buffer += line.encode()
+
+    @property
+    def in_waiting(self):
+        self._fill()
+        return len(self.buffer)
+
+    def readline(self):
+        self._fill()
+        i = self.buffer.find(b"\n")
+        if i < 0:
+            return None
+        line, self.buffer = self.buffer[:i + 1], self.buffer[i + 1:]
+        return line
+
+    def read(self, n=1):
+        self._fill()
+        out, self.buffer = self.buffer[:n], self.buffer[n:]
+        return out
+
+    def write(self, data):
+        # commands to the gps are kept so tests can look at them, they change nothing
+        self.written.append(bytes(data))
+        return len(data)
+
+    def reset_input_buffer(self):
+        self.buffer = b""
+
+    def close(self):
+        pass
@@ -0,0 +1,88 @@
+import numpy as np
+
+from sensors.audioDeviceClasses.sampleRing import SampleRing
+from sensors.audioDeviceClasses.decimator import PolyphaseDecimator, lowpass_taps
+
+
+def test_ring_wraps_and_counts_what_it_drops():
+    ring = SampleRing(10, max_blocks=4)
+    assert ring.write(np.arange(4, dtype=np.int16)[:, None], 100)
+    assert ring.write(np.arange(4, 8, dtype=np.int16)[:, None], 200)
+    # 8 of 10 used, a block of 4 doesn't fit
+    assert not ring.write(np.zeros((4, 1), dtype=np.int16), 300)
+    assert (ring.dropped_blocks, ring.dropped_samples) == (1, 4)
+
+    ns, block = ring.peek()
+    assert ns == 100 and block[:, 0].tolist() == [0, 1, 2, 3]
+    ring.release()
+    # wraps round the end of the ring
+    assert ring.write(np.arange(8, 13, dtype=np.int16)[:, None], 400)
+    ring.release()
+    ns, block = ring.peek()
+    assert ns == 400 and block[:, 0].tolist() == [8, 9, 10, 11, 12]
+    ring.release()
+    assert ring.peek() is None and len(ring) == 0
+
+
+def test_decimator_matches_filtering_the_whole_signal():
+    rng = np.random.default_rng(0)
+    x = rng.normal(0, 1000, 5003).astype(np.float32)
+    d = PolyphaseDecimator(3)
+    out, i = [], 0
+    # odd block sizes carry the phase and history across blocks
+    while i < len(x):
+        n = int(rng.integers(1, 700))
+        out.append(d.process(x[i:i + n]))
+        i += n
+    expected = np.convolve(x, lowpass_taps(3))[:len(x)][::3]
+    assert np.allclose(np.concatenate(out)[:, 0], expected, atol=1e-2)
+
+
+def test_decimator_takes_a_block_with_no_output():
+    x = np.arange(1, 31, dtype=np.int16) * 100
+    d = PolyphaseDecimator(3)
+    first = d.process(x[:4])
+    # the phase is 2 now, 2 samples don't reach the next output
+    empty = d.process(x[4:6])
+    assert empty.shape == (0, 1) and empty.dtype == np.int16
+    rest = d.process(x[6:])
+    whole = PolyphaseDecimator(3).process(x)
+    assert np.array_equal(np.concatenate([first, empty, rest]), whole)
+
+
+def test_decimator_removes_what_would_alias():
+    t = np.arange(48000) / 48000
+    for hz, kept in ((1000, True), (12000, False)):
+        x = (np.sin(2 * np.pi * hz * t) * 10000).astype(np.int16)
+        y = PolyphaseDecimator(3).process(x)[200:]
+        assert y.dtype == np.int16
+        assert (np.abs(y).max() > 9000) == kept
+
+
+def test_capture_wakes_the_poller_when_a_chunk_lands():
+    import zmq
+    from platformUtils.zmq_codec import ZmqCodec
+    from sensors.audioDeviceClasses.audioCapture import AudioCapture
+
+    endpoint = "inproc://test-audio-wakeup"
+    cap = AudioCapture({"short_name": "audio-test", "debug_lvl": 30, "sample_rate": 48000,
+                        "subsample_ratio": 3, "channels": 1, "hz": 20, "dtype": "int16",
+                        "pub_topic": "audio-test", "pub_endpoint": endpoint, "simulated": True})
+    sub = cap.ctx.socket(zmq.SUB)
+    sub.connect(endpoint)
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    poller = zmq.Poller()
+    poller.register(cap.wakeup.fileno(), zmq.POLLIN)
+    # nothing lands before the stream starts
+    assert not poller.poll(50)
+    cap.enable()
+    cap.start()
+    try:
+        assert dict(poller.poll(2000)).get(cap.wakeup.fileno()) == zmq.POLLIN
+        cap.retrieve_data()
+        _, (dt, chunk) = ZmqCodec.decode(sub.recv_multipart())
+        assert chunk.shape == (800, 1)
+        assert cap.metrics()["chunk_to_publish_us"]["count"] >= 1
+    finally:
+        cap.close()
+        sub.close(0)
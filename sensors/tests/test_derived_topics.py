@@ -0,0 +1,67 @@
+import os
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import zmq
+
+pytest.importorskip("cv2")
+from platformUtils.zmq_codec import ZmqCodec
+from sensors.derived_topics import DerivedTopic
+
+
+def _camera():
+    return SimpleNamespace(bus_location="csi-" + str(os.getpid()), device_name="test-cam",
+                           sensor_type="image", units="level",
+                           topic="csi_test-cam_image_level_uint8_numpy-96x54x3_8hz")
+
+
+def _frame():
+    frame = np.zeros((1, 54, 96, 3), dtype=np.uint8)
+    frame[0, :, :48] = 200
+    return frame
+
+
+def _wait_for(fn, timeout_s=2):
+    end = time.monotonic() + timeout_s
+    while time.monotonic() < end:
+        if fn():
+            return True
+        time.sleep(.02)
+    return False
+
+
+def test_only_computed_while_subscribed():
+    d = DerivedTopic(_camera(), "gray", 32, 18)
+    assert d.topic.endswith("_image-gray_level_uint8_numpy-32x18x1_8hz")
+    dt = datetime.now(timezone.utc)
+    try:
+        assert not d.publish(dt, _frame())
+        sub = zmq.Context.instance().socket(zmq.SUB)
+        sub.connect(d.endpoint)
+        sub.setsockopt(zmq.SUBSCRIBE, d.topic.encode())
+        assert _wait_for(lambda: d.publish(dt, _frame()))
+        assert sub.poll(1000)
+        topic, msg = ZmqCodec.decode(sub.recv_multipart())
+        assert topic == d.topic
+        assert msg[1].shape == (1, 18, 32, 1)
+        # left half was bright, right half dark
+        assert msg[1][0, :, :8].min() > 100 and msg[1][0, :, -8:].max() == 0
+        sub.close(0)
+        assert _wait_for(lambda: not d.publish(dt, _frame()))
+    finally:
+        d.close()
+
+
+def test_letterbox_keeps_the_aspect_ratio():
+    d = DerivedTopic(_camera(), "letterbox", 64, 64, sensor_type="image-yolo")
+    try:
+        out = d.pool.acquire()
+        d._letterbox(_frame()[0], out)
+        # 96x54 scales to 64x36, padded with 14 rows above and below
+        assert (out[0, :14] == 114).all() and (out[0, 50:] == 114).all()
+        assert (out[0, 14:50, :30] == 200).all()
+    finally:
+        d.close()
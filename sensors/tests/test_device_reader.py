@@ -0,0 +1,146 @@
+import time
+
+import numpy as np
+import zmq
+
+from platformUtils.clock import get_clock
+from platformUtils.zmq_codec import ZmqCodec
+from sensors.device_reader import DeviceReader
+from sensors.scheduler import DeadlineScheduler
+from sensors.sensor import Sensor
+
+
+class _FakeSensor:
+    def __init__(self, topic, hz, read):
+        self.topic = topic
+        self.sensor_hz = hz
+        self.metrics_interval_s = 0
+        self.retrieve_data = read
+        self.is_ready = lambda: True
+
+
+def test_slow_reads_happen_off_the_calling_thread():
+    calls = []
+
+    def slow_read():
+        calls.append(time.monotonic())
+        time.sleep(0.05)
+        return len(calls)
+
+    sensor = _FakeSensor("slow", 10, slow_read)
+    reader = DeviceReader("test", [sensor]).start()
+    try:
+        assert sensor.retrieve_data() is None
+        time.sleep(0.3)
+        start = time.monotonic()
+        value = sensor.retrieve_data()
+        assert time.monotonic() - start < 0.01
+        assert value is not None and value >= 1
+        assert sensor.is_ready()
+    finally:
+        reader.stop()
+
+
+def test_stale_values_are_not_returned():
+    sensor = _FakeSensor("once", 20, lambda: 1)
+    reader = DeviceReader("test", [sensor], max_age_periods=1.5).start()
+    time.sleep(0.15)
+    reader.stop()
+    assert sensor.retrieve_data() == 1
+    time.sleep(0.1)
+    assert sensor.retrieve_data() is None
+
+
+def test_read_errors_are_counted_not_raised():
+    def broken():
+        raise OSError("bus error")
+
+    sensor = _FakeSensor("broken", 50, broken)
+    reader = DeviceReader("test", [sensor]).start()
+    time.sleep(0.1)
+    reader.stop()
+    assert reader.errors > 0
+    assert sensor.retrieve_data() is None
+
+
+def test_threaded_reads_are_published_at_the_time_they_were_read():
+    clock = get_clock()
+
+    def slow_read():
+        # each value is the 2hz grid time its read started on
+        ns = clock.now_ns()
+        time.sleep(0.1)
+        return np.array([[ns - ns % 500_000_000]], dtype=np.int64)
+
+    sensor = Sensor(bus_location="reader-test", device_name="slow", sensor_type="grid", units="ns",
+                    data_type="int", shape="1x1", hz=2, retrieve_data=slow_read)
+    sub = zmq.Context.instance().socket(zmq.SUB)
+    sub.connect(sensor.endpoint)
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    reader = DeviceReader("test", [sensor]).start()
+    # the controller wakes just after each tick, before the read started on it is done
+    controller = DeadlineScheduler(wake_offset_us=200)
+    controller.add(sensor.topic, 2, sensor.read_data)
+    end = time.monotonic() + 2.6
+    try:
+        while time.monotonic() < end:
+            controller.wait()
+            controller.run_due()
+    finally:
+        reader.stop()
+
+    stamps = []
+    while sub.poll(100):
+        topic, msg = ZmqCodec.decode(sub.recv_multipart(), raw_timestamps=True)
+        stamps.append(int(msg[0]))
+        assert int(msg[0]) == int(np.asarray(msg[1]).ravel()[0])
+    assert len(stamps) >= 3
+    assert stamps == sorted(set(stamps))
+    sub.close(0)
+    sensor.close()
+
+
+def test_batched_sensors_are_drained_in_the_thread():
+    clock = get_clock()
+    property_reads = []
+
+    def slow_drain():
+        # the device queued the last 100ms at 10hz, a drain takes a while
+        time.sleep(0.05)
+        ns = clock.now_ns() // 100_000_000 * 100_000_000
+        ts = np.array([ns - 100_000_000, ns], dtype=np.int64)
+        return ts, (ts // 100_000_000)[:, None].astype(np.int64)
+
+    sensor = Sensor(bus_location="reader-test", device_name="batched", sensor_type="grid", units="ns",
+                    data_type="int", shape="1x1", hz=10, schedule_hz=5,
+                    retrieve_data=lambda: property_reads.append(1), retrieve_batch=slow_drain)
+    property_reads.clear()
+    sub = zmq.Context.instance().socket(zmq.SUB)
+    sub.connect(sensor.endpoint)
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    reader = DeviceReader("test", [sensor]).start()
+    controller = DeadlineScheduler(wake_offset_us=200)
+    controller.add(sensor.topic, sensor.schedule_hz, sensor.read_data)
+    slowest = 0
+    end = time.monotonic() + 1.5
+    try:
+        while time.monotonic() < end:
+            controller.wait()
+            start = time.monotonic()
+            controller.run_due()
+            slowest = max(slowest, time.monotonic() - start)
+    finally:
+        reader.stop()
+
+    # the drain's sleep never lands on the controller thread
+    assert slowest < 0.02
+    assert property_reads == []
+    stamps = []
+    while sub.poll(100):
+        topic, msg = ZmqCodec.decode(sub.recv_multipart(), raw_timestamps=True)
+        stamps.append(int(msg[0]))
+        assert int(msg[0]) // 100_000_000 == int(np.asarray(msg[1]).ravel()[0])
+    assert len(stamps) >= 5
+    assert stamps == sorted(set(stamps))
+    sub.close(0)
+    sensor.close()
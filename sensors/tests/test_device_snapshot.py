@@ -0,0 +1,35 @@
+import time
+
+from sensors.device_snapshot import DeviceSnapshot
+
+
+def test_siblings_share_one_read_per_tick():
+    reads = []
+
+    def read():
+        reads.append(1)
+        return {"a": len(reads), "b": 2.0}
+
+    snapshot = DeviceSnapshot.for_sensors(read, [{"hz": 10}, {"hz": 1}])
+    a = snapshot.field("a")
+    b = snapshot.field("b", scale=10)
+    assert a()[0] == 1
+    assert b()[0] == 20
+    assert len(reads) == 1
+
+    time.sleep(0.06)
+    assert a()[0] == 2
+    assert len(reads) == 2
+
+
+def test_nothing_new_is_shared_too():
+    reads = []
+
+    def read():
+        reads.append(1)
+        return None
+
+    snapshot = DeviceSnapshot(read, 1)
+    assert not snapshot.is_ready()
+    assert snapshot.field("co2")() is None
+    assert len(reads) == 1
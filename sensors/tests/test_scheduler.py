@@ -0,0 +1,43 @@
+import time
+
+from sensors.scheduler import DeadlineScheduler
+
+
+def _run(scheduler, seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if not scheduler.wait():
+            scheduler.run_due()
+
+
+def test_tasks_run_at_their_own_rates_on_the_wall_grid():
+    scheduler = DeadlineScheduler(wake_offset_us=200)
+    fired = {100: [], 3: [], 0.5: []}
+    for hz in fired:
+        scheduler.add(str(hz), hz, lambda hz=hz: fired[hz].append(time.time_ns()))
+    _run(scheduler, 1.0)
+
+    assert 95 <= len(fired[100]) <= 101
+    assert 2 <= len(fired[3]) <= 4
+    assert len(fired[0.5]) <= 1
+    # fires just after the grid point (every 10ms for 100hz), allowing for a busy machine
+    offsets = sorted(t % 10_000_000 for t in fired[100])
+    assert offsets[len(offsets) // 2] < 2_000_000
+
+
+def test_slow_task_skips_missed_ticks_and_reports_them():
+    scheduler = DeadlineScheduler(wake_offset_us=0)
+    scheduler.add("slow", 200, lambda: time.sleep(0.012))
+    _run(scheduler, 0.3)
+    st = scheduler.stats()["slow"]
+    assert st["runs"] > 5
+    assert st["missed"] >= st["runs"]
+    assert st["late_mean_us"] >= 0
+
+
+def test_stats_reset():
+    scheduler = DeadlineScheduler()
+    scheduler.add("a", 50, lambda: None)
+    _run(scheduler, 0.1)
+    assert scheduler.stats(reset=True)["a"]["runs"] > 0
+    assert scheduler.stats()["a"]["runs"] == 0
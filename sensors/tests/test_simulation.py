@@ -0,0 +1,59 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from sensors.simulation import SimSignal, FaultInjector, SimulatedInputStream, NmeaFeeder, nmea_checksum
+
+
+def test_signals_are_deterministic_per_seed():
+    a = SimSignal.for_sensor({"sensor_type": "accel", "shape": "numpy-3"}, seed=1)
+    b = SimSignal.for_sensor({"sensor_type": "accel", "shape": "numpy-3"}, seed=1)
+    va = a.value(100.0)
+    assert va.shape == (3,)
+    assert np.array_equal(va, b.value(100.0))
+
+
+def test_replay_loops_through_the_file(tmp_path):
+    path = str(tmp_path / "replay.npy")
+    np.save(path, np.array([[1, 2], [3, 4]]))
+    signal = SimSignal(channels=2, replay=path)
+    assert [signal.value().tolist() for _ in range(3)] == [[1, 2], [3, 4], [1, 2]]
+
+
+def test_faults_raise_at_their_rate():
+    faults = FaultInjector(error_rate=.5, seed=3)
+    for _ in range(200):
+        try:
+            faults()
+        except OSError:
+            pass
+    assert 60 < faults.errors < 140
+
+
+def test_audio_stream_calls_back_with_blocks():
+    blocks = []
+    done = threading.Event()
+
+    def callback(indata, frames, time_info, status):
+        blocks.append((indata.shape, indata.dtype, time_info.inputBufferAdcTime))
+        if len(blocks) == 5:
+            done.set()
+
+    stream = SimulatedInputStream(channels=2, samplerate=16000, blocksize=160, dtype="int16",
+                                  callback=callback, speed=0)
+    stream.start()
+    assert done.wait(2)
+    stream.close()
+    assert blocks[0][:2] == ((160, 2), np.dtype("int16"))
+    assert blocks[1][2] - blocks[0][2] == pytest.approx(.01)
+
+
+def test_nmea_feeder_sentences_have_valid_checksums():
+    feeder = NmeaFeeder(hz=4, speed=0)
+    lines = [feeder.readline().decode().strip() for _ in range(4)]
+    assert [ln[1:6] for ln in lines] == ["GPGGA", "GPVTG", "GPGGA", "GPVTG"]
+    for ln in lines:
+        body, checksum = ln[1:].split("*")
+        assert nmea_checksum(body) == checksum
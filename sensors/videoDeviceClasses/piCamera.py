@@ -3,15 +3,19 @@ import numpy as np
 import sys
 import os
 import picamera2
+from picamera2 import MappedArray
+import libcamera
 import cv2
 from datetime import datetime, timezone
-import tzlocal
 
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from platformUtils.zmq_codec import ZmqCodec
 import logging
 from sensors.sensor import Sensor
+from platformUtils.frame_pool import FramePool
+from platformUtils.timestamp_overlay import TimestampOverlay
+from platformUtils.clock import get_clock
 
 
 class PiCamera:
@@ -34,6 +38,9 @@ class PiCamera:
                     format = "RGB888",
                     flip_vertical = True,
                     timestamp_images = True,
+                    shm_ring_slots = 0,
+                    capture_stream = "main",
+                    frame_pool_slots = 4,
                     ):
         self.device_name = f"{platform_uuid}_{bus_location}_{device_name}"
 
@@ -44,14 +51,41 @@ class PiCamera:
         self.flip_vertical = flip_vertical
         self.subsample_ratio = subsample_ratio
         self.timestamp_images = timestamp_images
+        #burns the time into every published frame, leave it off to have only the stored video
+        #carry it (the video output's timestamp_overlay) and give analyzers clean frames
+        self.overlay = TimestampOverlay() if timestamp_images else None
+        self.clock = get_clock()
+
+        #the isp scales and flips, so a full size frame is never touched here
+        #"main" makes the main stream the output size, "lores" keeps main at full size
+        #and captures the scaled lores stream (rgb lores needs a pi 5)
+        out_size = (camera_width // max(1, subsample_ratio), camera_height // max(1, subsample_ratio))
+        self.stream = capture_stream
+        if self.stream == "lores" and out_size == (camera_width, camera_height):
+            self.l.warning(" lores needs a subsample_ratio above 1, capturing main")
+            self.stream = "main"
+        transform = libcamera.Transform(vflip=1 if flip_vertical else 0)
 
         self.camera = picamera2.Picamera2(camera_index)
-        self.video_config = self.camera.create_video_configuration(main={
-            "size": (camera_width, camera_height), 
-            "format": format})
+        if self.stream == "lores":
+            self.video_config = self.camera.create_video_configuration(
+                main={"size": (camera_width, camera_height), "format": format},
+                lores={"size": out_size, "format": format},
+                transform=transform)
+        else:
+            self.video_config = self.camera.create_video_configuration(
+                main={"size": out_size, "format": format},
+                transform=transform)
         self.camera.configure(self.video_config)
         self.camera.start()
 
+        #picamera2 can align the size, the buffers match what it actually gives
+        w, h = self.camera.camera_configuration()[self.stream]["size"]
+        channels = 4 if format in ("XBGR8888", "XRGB8888") else 3
+        self.frame_shape = (1, h, w, channels)
+        self.pool = FramePool(frame_pool_slots, self.frame_shape)
+        self.sensor = None
+
         fwc = file_writer_config
         
         sensor_config = {
@@ -67,31 +101,35 @@ class PiCamera:
             "debug_lvl": debug_lvl,
             "retrieve_data": self.capture,
             "is_ready": lambda: True,
+            "shm_ring_slots": shm_ring_slots,
+            "on_sent": self.pool.track,
         }
         self.sensor = Sensor(**sensor_config)
 
 
     def capture(self):
-        frame = self.camera.capture_array().astype(np.uint8)
-        if self.subsample_ratio > 1:
-            frame = frame[::self.subsample_ratio, ::self.subsample_ratio]
-            frame = np.ascontiguousarray(frame)
-        if self.flip_vertical:
-            frame = cv2.flip(frame, 0)
+        #the frame is copied once, out of the camera's buffer into the sensor's ring slot
+        #or a pool buffer, and goes out from there
+        frame = None
+        if self.sensor is not None:
+            frame = self.sensor.frame_buffer(self.frame_shape, np.uint8)
+        if frame is None:
+            frame = self.pool.acquire()
+        request = self.camera.capture_request()
+        try:
+            with MappedArray(request, self.stream, write=False) as m:
+                np.copyto(frame[0], m.array)
+        finally:
+            request.release()
         if self.timestamp_images:
-            frame = self._add_timestamp(frame)
+            self._add_timestamp(frame[0])
 
-        #add a time dimension to the frame
-        frame = np.expand_dims(frame, axis=0)
+        #the frame already has its time dimension
         return frame
     
 
     def _add_timestamp(self, frame):
-        frameTS = datetime.now(tzlocal.get_localzone()).strftime("%Y-%m-%d %H:%M:%S %z")
-        cv2.putText(frame, frameTS, (10, 50),
-                cv2.FONT_HERSHEY_SIMPLEX, 1, 
-                (0, 255, 0), 2, cv2.LINE_AA)
-        return frame
+        return self.overlay.draw(frame, self.clock.now_ns())
 
 
 
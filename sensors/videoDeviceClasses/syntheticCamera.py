@@ -0,0 +1,121 @@
+import numpy as np
+import sys
+from datetime import datetime, timezone
+import time
+
+repoPath = "/home/pi/Documents/"
+sys.path.append(repoPath + "unifiedSensorClient/")
+import logging
+from sensors.sensor import Sensor
+from sensors.simulation import FaultInjector
+from platformUtils.frame_pool import FramePool
+
+
+class SyntheticCamera:
+    """
+    Stands in for PiCamera without picamera2, same arguments and the same frames
+    out: a fixed gradient with a square that crosses it every few seconds, so
+    motion and change detection have something to find.
+    - simulation: latency_s/latency_jitter_s/error_rate for each capture, and
+      box_period_s for how long the square takes to cross
+    """
+
+    def __init__(self,
+                    platform_uuid = None,
+                    bus_location = None,
+                    device_name = None,
+                    sensor_type = "image",
+                    units = "BGR",
+                    data_type = "uint8",
+                    shape = "1x960x540x3",
+                    hz = 8,
+                    file_writer_config = {},
+                    debug_lvl = 30,
+
+                    camera_index = 0,
+                    camera_width = 1920,
+                    camera_height = 1080,
+                    subsample_ratio = 2,
+                    format = "RGB888",
+                    flip_vertical = True,
+                    timestamp_images = True,
+                    shm_ring_slots = 0,
+                    capture_stream = "main",
+                    frame_pool_slots = 4,
+                    simulation = {},
+                    ):
+        self.device_name = f"{platform_uuid}_{bus_location}_{device_name}"
+
+        self.l = logging.getLogger(self.device_name)
+        self.l.setLevel(debug_lvl)
+        self.l.info(" starting (synthetic)")
+
+        self.flip_vertical = flip_vertical
+        self.timestamp_images = timestamp_images
+        self.faults = FaultInjector(**simulation)
+        self.box_period_s = simulation.get("box_period_s", 4)
+
+        #frames are made at the subsampled size, there's nothing to gain from making them bigger
+        h = camera_height // max(1, subsample_ratio)
+        w = camera_width // max(1, subsample_ratio)
+        ys = np.linspace(0, 255, h, dtype=np.float32)[:, np.newaxis]
+        xs = np.linspace(0, 255, w, dtype=np.float32)[np.newaxis, :]
+        self.background = np.empty((h, w, 3), dtype=np.uint8)
+        self.background[..., 0] = xs.astype(np.uint8)
+        self.background[..., 1] = ys.astype(np.uint8)
+        self.background[..., 2] = ((xs + ys) / 2).astype(np.uint8)
+        if flip_vertical:
+            self.background = np.ascontiguousarray(self.background[::-1])
+        self.box = max(8, h // 8)
+        #frames are made in the sensor's ring slot or a pool buffer, like PiCamera
+        self.frame_shape = (1, h, w, 3)
+        self.pool = FramePool(frame_pool_slots, self.frame_shape)
+        self.sensor = None
+
+        #the timestamp text needs cv2, without it frames go out unstamped
+        self.overlay = None
+        if timestamp_images:
+            try:
+                from platformUtils.timestamp_overlay import TimestampOverlay
+                self.overlay = TimestampOverlay()
+            except ImportError:
+                self.l.warning(" cv2 not installed, synthetic frames won't be timestamped")
+
+        sensor_config = {
+            "platform_uuid": platform_uuid,
+            "bus_location": bus_location,
+            "device_name": device_name,
+            "sensor_type": sensor_type,
+            "units": units,
+            "data_type": data_type,
+            "shape": shape,
+            "hz": hz,
+            "file_writer_config": file_writer_config,
+            "debug_lvl": debug_lvl,
+            "retrieve_data": self.capture,
+            "is_ready": lambda: True,
+            "shm_ring_slots": shm_ring_slots,
+            "on_sent": self.pool.track,
+        }
+        self.sensor = Sensor(**sensor_config)
+
+    def capture(self):
+        self.faults("capture")
+        out = None
+        if self.sensor is not None:
+            out = self.sensor.frame_buffer(self.frame_shape, np.uint8)
+        if out is None:
+            out = self.pool.acquire()
+        frame = out[0]
+        np.copyto(frame, self.background)
+        h, w = frame.shape[:2]
+        phase = (time.time() % self.box_period_s) / self.box_period_s
+        x = int(phase * (w - self.box))
+        #centred, so it's in the same place flipped or not
+        y = (h - self.box) // 2
+        frame[y:y + self.box, x:x + self.box] = 255
+        if self.overlay is not None:
+            self.overlay.draw(frame, time.time_ns())
+
+        #the frame already has its time dimension
+        return out
@@ -44,6 +44,12 @@ class audio_output:
         self.temp_output_location = temp_write_location + output_base + "/"
         os.makedirs(self.temp_output_location, exist_ok=True)
 
+        #pcm bytes given to ffmpeg for the open file, and the size ffmpeg reports having written
+        self.bytes_written = 0
+        self.encoded_bytes = None
+        #the bitrate over the pcm rate, until ffmpeg reports or a file has been finalized
+        self.compression_ratio = int(bitrate.rstrip("k")) * 1000 / 8 / (self.output_hz * 2 * channels)
+
 
     
     def persist(self, dt, data):
@@ -70,6 +76,7 @@ class audio_output:
             "ffmpeg",
             "-hide_banner",
             "-loglevel", self.debug_lvl,
+            "-nostats", "-progress", "pipe:1",
             "-f", self.sample_fmt,
             "-ac", str(self.channels),
             "-ar", str(self.output_hz),
@@ -86,7 +93,7 @@ class audio_output:
             env = os.environ.copy()
             env["TZ"] = "UTC"
             proc = subprocess.Popen(
-                cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                 bufsize=0, env=env
             )
             self.l.debug(self.log_name + " started ffmpeg: " + " ".join(cmd))
@@ -95,7 +102,10 @@ class audio_output:
             t = threading.Thread(target=self._stderr_reader, args=(proc,), daemon=True)
             t.start()
             proc._stderr_thread = t  # attach for lifecycle awareness
+            self.bytes_written = 0
+            self.encoded_bytes = None
             self.ff = proc
+            threading.Thread(target=self._progress_reader, args=(proc,), daemon=True).start()
             self.is_open = True
             return self.file_name
         except FileNotFoundError:
@@ -117,33 +127,57 @@ class audio_output:
         finally:
             self.l.debug(self.log_name + " ffmpeg stderr: [closed]")
     
-    def close(self, dt: datetime):
-        #close the stdin
-        if self.ff.stdin is not None:
-            self.ff.stdin.close()
-        
-        try:
-            self.ff.terminate()
-            self.ff.wait(timeout=3)
-        except Exception as e:
-            self.l.error(self.log_name + " failed to terminate ffmpeg: " + str(e))
+    def _progress_reader(self, p):
+        #ffmpeg's -progress blocks are key=value lines, total_size is the bytes of output so far
         try:
-            self.ff.kill()
-            self.ff.wait(timeout=2)
+            for raw in iter(p.stdout.readline, b""):
+                key, _, value = raw.decode(errors="replace").strip().partition("=")
+                if key == "total_size" and value.isdigit() and self.ff is p:
+                    self.encoded_bytes = int(value)
         except Exception as e:
-            self.l.error(self.log_name + " failed to kill ffmpeg: " + str(e))
-        self.ff = None
+            self.l.error(self.log_name + " ffmpeg progress reader error: " + str(e))
 
-        #rename the file to seal it
-        new_fn = self.file_name.replace(self.extension, 
-                                        "_" + dt_to_fnString(dt, 6) + self.extension)
-        os.rename(self.temp_output_location + self.file_name, 
-                  self.temp_output_location + new_fn)
+    def begin_close(self, dt: datetime):
+        """let go of the open file, the returned function stops ffmpeg and seals it"""
+        ff, file_name = self.ff, self.file_name
+        self.ff = None
         self.file_name = None
-        return new_fn
+        self.encoded_bytes = None
+        new_fn = file_name.replace(self.extension, 
+                                   "_" + dt_to_fnString(dt, 6) + self.extension)
+
+        def finish():
+            #close the stdin
+            if ff.stdin is not None:
+                ff.stdin.close()
+            
+            try:
+                ff.terminate()
+                ff.wait(timeout=3)
+            except Exception as e:
+                self.l.error(self.log_name + " failed to terminate ffmpeg: " + str(e))
+            try:
+                ff.kill()
+                ff.wait(timeout=2)
+            except Exception as e:
+                self.l.error(self.log_name + " failed to kill ffmpeg: " + str(e))
+
+            #rename the file to seal it
+            os.rename(self.temp_output_location + file_name, 
+                      self.temp_output_location + new_fn)
+            return new_fn
+        return finish
+
+    def close(self, dt: datetime):
+        return self.begin_close(dt)()
+
+    def seal_persist(self):
+        #persist has no cache file to write to yet, so there is nothing to seal
+        return []
 
     def write(self, data):
         #the array is numsamples x 1 for 1 channel, so we need to flatten it
         data = data.flatten()
         self.ff.stdin.write(data)
+        self.bytes_written += data.nbytes
         
@@ -0,0 +1,115 @@
+import os
+import time
+import zlib
+
+import numpy as np
+
+
+MAGIC = b"UJN1"
+# magic, payload dtype string, values per record
+HEADER = np.dtype([("magic", "S4"), ("dtype", "S8"), ("width", "<i4")])
+
+
+class Journal:
+    """
+    An append-only file of fixed size records [int64 ns, payload, crc32] kept
+    open for the life of the file, so caching a sample is one write, not an open,
+    a pickle and a close.
+    - append(ns, rows) writes a record per row in one write
+    - writes are fsynced together at most every commit_interval_s (group commit),
+      a crash loses at most that much
+    - read(path) maps a file's records back with one np.fromfile, a torn last record
+      and any whose crc doesn't match are dropped
+    - seal(path) commits and moves the file to path, appends go on in a new file
+    the header holds the payload dtype and width, so a file is read back the way it was written
+    """
+
+    def __init__(self, path, payload_dtype, width, commit_interval_s=1.0):
+        self.path = path
+        self.payload_dtype = np.dtype(payload_dtype).newbyteorder("<")
+        self.width = int(width)
+        self.record = record_dtype(self.payload_dtype, self.width)
+        self.commit_interval_s = commit_interval_s
+        self.records = 0
+        self.fd = None
+        self._open()
+
+    def _open(self):
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        size = os.fstat(self.fd).st_size
+        if size < HEADER.itemsize:
+            #new, or torn before its header was written
+            os.ftruncate(self.fd, 0)
+            header = np.zeros(1, HEADER)
+            header["magic"] = MAGIC
+            header["dtype"] = self.payload_dtype.str.encode()
+            header["width"] = self.width
+            os.write(self.fd, header.tobytes())
+            os.fsync(self.fd)
+            size = HEADER.itemsize
+        # appends have to start on a record boundary, a torn record from a crash is cut off
+        self.records = (size - HEADER.itemsize) // self.record.itemsize
+        end = HEADER.itemsize + self.records * self.record.itemsize
+        if end != size:
+            os.ftruncate(self.fd, end)
+        self.dirty = False
+        self.last_commit = time.monotonic()
+
+    def append(self, ns, rows):
+        """ns an int or an array of them, one per row of rows (n, width)"""
+        rows = np.reshape(rows, (-1, self.width))
+        recs = np.empty(len(rows), self.record)
+        recs["ns"] = ns
+        recs["payload"] = rows
+        crc_at = self.record.itemsize - 4
+        recs["crc"] = [zlib.crc32(r[:crc_at]) for r in recs.view(np.uint8).reshape(len(rows), crc_at + 4)]
+        os.write(self.fd, recs.tobytes())
+        self.records += len(rows)
+        self.dirty = True
+        if time.monotonic() - self.last_commit >= self.commit_interval_s:
+            self.commit()
+
+    def commit(self):
+        if self.dirty:
+            os.fsync(self.fd)
+            self.dirty = False
+        self.last_commit = time.monotonic()
+
+    def seal(self, path):
+        """commit and move the file to path, returns path or None when it held no records"""
+        if self.records == 0:
+            return None
+        self.commit()
+        os.close(self.fd)
+        os.rename(self.path, path)
+        self._open()
+        return path
+
+    def close(self):
+        if self.fd is not None:
+            self.commit()
+            os.close(self.fd)
+            self.fd = None
+
+
+def record_dtype(payload_dtype, width):
+    return np.dtype([("ns", "<i8"), ("payload", payload_dtype, (width,)), ("crc", "<u4")])
+
+
+def read(path):
+    """
+    (ns, payload, dropped) for the whole records in path whose crc matches,
+    ns int64 (n,) and payload (n, width) in the dtype the file was written with
+    """
+    header = np.fromfile(path, HEADER, count=1)
+    if len(header) == 0 or header["magic"][0] != MAGIC:
+        raise ValueError(path + " is not a journal")
+    record = record_dtype(np.dtype(header["dtype"][0].decode()), int(header["width"][0]))
+    n = (os.path.getsize(path) - HEADER.itemsize) // record.itemsize
+    recs = np.fromfile(path, record, count=n, offset=HEADER.itemsize)
+
+    crc_at = record.itemsize - 4
+    buf = recs.view(np.uint8).reshape(n, crc_at + 4)
+    ok = np.fromiter((zlib.crc32(r[:crc_at]) for r in buf), np.uint32, count=n) == recs["crc"]
+    recs = recs[ok]
+    return recs["ns"], recs["payload"], int(n - len(recs))
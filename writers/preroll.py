@@ -0,0 +1,147 @@
+import os
+import math
+import logging
+
+import numpy as np
+import qoi
+
+from config import dt_to_fnString, fnString_to_dt
+from platformUtils.zmq_codec import datetime_to_ns, ns_to_datetime
+
+
+class PrerollRing:
+    """
+    The last seconds of a fixed hz camera's frames kept in memory, so a detection
+    can go back and write what came before it without reading anything off disk.
+    A frame's slot is its position on the hz grid modulo the capacity, so
+    - put(dt, frame) copies the frame into its slot, evicting the one a capacity ago
+    - get(dt) is one lookup
+    - between(start_dt, end_dt) walks only the k slots in the range, in time order
+    - drop_before(dt) forgets frames older than dt
+    with spill_location set every frame is also written there as a .qoi named by its
+    time and deleted when it leaves the ring, so a crash loses nothing. The directory
+    is only listed by recover(), at startup.
+    with max_mb set the ring holds at most that many MB of frames, fewer frames
+    than seconds * hz if they're big.
+    """
+
+    def __init__(self, seconds, hz, spill_location=None, max_mb=None, debug_lvl=30):
+        self.hz = hz
+        self.wanted_capacity = math.ceil(seconds * hz) + 1
+        self.capacity = self.wanted_capacity
+        self.max_mb = max_mb
+        self.step_ns = 1_000_000_000 / hz
+        self.spill_location = spill_location
+        if spill_location is not None:
+            os.makedirs(spill_location, exist_ok=True)
+        self.l = logging.getLogger("preroll-ring")
+        self.l.setLevel(debug_lvl)
+
+        #made on the first frame, once its shape is known
+        self.frames = None
+        # per slot: the grid index of the frame in it (-1 for none) and its exact time
+        self.index = np.full(self.capacity, -1, dtype=np.int64)
+        self.ns = np.zeros(self.capacity, dtype=np.int64)
+        self.newest = None
+
+    def _idx(self, dt):
+        return round(datetime_to_ns(dt) / self.step_ns)
+
+    def _spill_fn(self, ns):
+        return self.spill_location + dt_to_fnString(ns_to_datetime(int(ns))) + ".qoi"
+
+    def _evict(self, slot):
+        if self.spill_location is not None and self.index[slot] >= 0:
+            try:
+                os.remove(self._spill_fn(self.ns[slot]))
+            except FileNotFoundError:
+                pass
+        self.index[slot] = -1
+
+    def put(self, dt, frame):
+        idx = self._idx(dt)
+        if self.newest is not None and idx <= self.newest - self.capacity:
+            return
+        if self.frames is None or self.frames.shape[1:] != frame.shape:
+            for slot in range(self.capacity):
+                self._evict(slot)
+            self._size_for(frame)
+            self.frames = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+            self.newest = None
+        slot = idx % self.capacity
+        if self.index[slot] != idx:
+            self._evict(slot)
+        np.copyto(self.frames[slot], frame)
+        self.index[slot] = idx
+        self.ns[slot] = datetime_to_ns(dt)
+        if self.newest is None or idx > self.newest:
+            self.newest = idx
+        if self.spill_location is not None:
+            qoi.write(self._spill_fn(self.ns[slot]), frame)
+
+    def _size_for(self, frame):
+        capacity = self.wanted_capacity
+        if self.max_mb is not None and capacity * frame.nbytes > self.max_mb * 2**20:
+            capacity = max(1, int(self.max_mb * 2**20 // frame.nbytes))
+            self.l.warning("preroll ring capped at " + str(self.max_mb) + "MB, keeping " + str(capacity) +
+                           " of " + str(self.wanted_capacity) + " frames")
+        self.capacity = capacity
+        self.index = np.full(capacity, -1, dtype=np.int64)
+        self.ns = np.zeros(capacity, dtype=np.int64)
+        self.l.info("preroll ring of " + str(capacity) + " " + str(frame.shape) + " frames, " +
+                    str(capacity * frame.nbytes // 2**20) + "MB")
+
+    def get(self, dt):
+        """the frame at dt or None, a view into the ring"""
+        idx = self._idx(dt)
+        slot = idx % self.capacity
+        if self.frames is None or self.index[slot] != idx:
+            return None
+        return self.frames[slot]
+
+    def _slots(self, start_ns, end_ns):
+        #slots of the frames still in the ring from start_ns up to end_ns, a slot spare each side so frames off the grid aren't missed
+        start = self.newest - self.capacity + 1
+        if start_ns is not None:
+            start = max(start, math.floor(start_ns / self.step_ns) - 1)
+        end = self.newest + 1
+        if end_ns is not None:
+            end = min(end, math.floor(end_ns / self.step_ns) + 2)
+        for idx in range(start, end):
+            slot = idx % self.capacity
+            if self.index[slot] == idx:
+                yield idx, slot
+
+    def between(self, start_dt, end_dt=None):
+        """(dt, frame) for the frames from start_dt up to before end_dt, or the newest, oldest first"""
+        if self.newest is None:
+            return
+        start_ns = datetime_to_ns(start_dt)
+        end_ns = datetime_to_ns(end_dt) if end_dt is not None else None
+        for idx, slot in self._slots(start_ns, end_ns):
+            ns = int(self.ns[slot])
+            if ns >= start_ns and (end_ns is None or ns < end_ns):
+                yield ns_to_datetime(ns), self.frames[slot]
+
+    def drop_before(self, dt):
+        if self.newest is None:
+            return
+        cutoff_ns = datetime_to_ns(dt)
+        dropped = 0
+        for idx, slot in self._slots(None, cutoff_ns):
+            if self.ns[slot] < cutoff_ns:
+                self._evict(slot)
+                dropped += 1
+        self.l.debug("preroll ring dropped " + str(dropped) + " frames before " + str(dt))
+
+    def recover(self):
+        """(dt, frame) of every frame spilled by a previous run, oldest first, deleted as they're read"""
+        if self.spill_location is None or not os.path.exists(self.spill_location):
+            return
+        files = sorted(os.listdir(self.spill_location))
+        if files:
+            self.l.info("preroll ring recovering " + str(len(files)) + " spilled frames")
+        for fn in files:
+            frame = qoi.read(self.spill_location + fn)
+            yield fnString_to_dt(fn), frame
+            os.remove(self.spill_location + fn)
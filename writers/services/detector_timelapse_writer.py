@@ -1,5 +1,4 @@
 import sys
-import os
 from datetime import datetime, timezone, timedelta
 import numpy as np
 import zmq
@@ -7,23 +6,25 @@ import zmq
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from platformUtils.zmq_codec import ZmqCodec
-from config import dt_to_fnString, fnString_to_dt, file_writer_process_info
+from platformUtils.shm_ring import FrameSource
+from config import file_writer_process_info
 from writers.writer import Writer
 from writers.videoOutput import video_output
-import qoi
-from platformUtils.utils import configure_process, handle_args, should_exit
+from writers.preroll import PrerollRing
+from platformUtils.utils import configure_process, handle_args, should_exit, connect_sub
 
 def detector_timelapse_writer(config):
     l, sub, signal_handler = configure_process(config)
 
     for endpoint in config["detector_endpoints"]:
-        sub.connect(endpoint)
+        connect_sub(sub, endpoint)
     for name in config["detector_topics"]:
         sub.setsockopt(zmq.SUBSCRIBE, name.encode())
     l.info(" writer subscribed to " + str(config['detector_topics']) + " at " + str(config['detector_endpoints']))
 
-    sub.connect(config["camera_endpoint"])
+    connect_sub(sub, config["camera_endpoint"])
     sub.setsockopt(zmq.SUBSCRIBE, config["camera_topic"].encode())
+    frames = FrameSource(config["camera_topic"])
     l.info(" writer subscribed to " + config['camera_topic'] + " at " + config['camera_endpoint'])
 
 
@@ -47,16 +48,28 @@ def detector_timelapse_writer(config):
     timelapse_frame_offset = timedelta(seconds=time_before_seconds + 1/timelapse_hz)
 
 
-    persist_location = config["temp_file_location"] + config["short_name"] + "-persist/"
-    os.makedirs(persist_location, exist_ok=True)
+    #the last time before seconds of frames are kept in memory for going back when something's detected,
+    #spilled to disk only if asked
+    spill_location = None
+    if config.get("preroll_spill", False):
+        spill_location = config["temp_file_location"] + config["short_name"] + "-persist/"
+    preroll = PrerollRing(time_before_seconds, full_speed_output_config["hz"], spill_location=spill_location,
+                          max_mb=config.get("preroll_max_mb"), debug_lvl=config["debug_lvl"])
+    #timelapse frames are looked up from further back on whole seconds, only those are kept that long
+    timelapse_frames = PrerollRing(timelapse_frame_offset.total_seconds(), 1, debug_lvl=config["debug_lvl"])
+    frame_mb = full_speed_output_config["camera_width"] * full_speed_output_config["camera_height"] * 3 / 2**20
+    l.info(" dbtl keeping " + str(preroll.capacity) + " pre-roll and " + str(timelapse_frames.capacity) +
+           " timelapse frames in memory, about " + str(int((preroll.capacity + timelapse_frames.capacity) * frame_mb)) +
+           "MB" + ("" if preroll.max_mb is None else ", pre-roll capped at " + str(preroll.max_mb) + "MB"))
     def persist(dt, data):
         for i in range(data.shape[0]):
             frame_dt = dt + timedelta(seconds=i/full_speed_output_config["hz"])
-            fn = persist_location + dt_to_fnString(frame_dt) + ".qoi"
             l.trace(" dbtl persisting frame: " + str(frame_dt))
-            qoi.write(fn, data[i])
+            preroll.put(frame_dt, data[i])
+            if frame_dt.microsecond == 0:
+                timelapse_frames.put(frame_dt, data[i])
     
-    #full speed writes all the files in prsist 
+    #full speed writes all the frames in the ring
     #that are after or on the time before seconds from the given dt_utc
     #but also before the time after seconds from the given dt_utc
     def load(dt_utc, till_end = False):#for when we switch to full speed
@@ -68,56 +81,32 @@ def detector_timelapse_writer(config):
         time_after_dt = dt_utc + timedelta(seconds=time_after_seconds)
         l.debug("time after datetime: " + str(time_after_dt))
         
-        files = [file for file in sorted(os.listdir(persist_location)) 
-                    if fnString_to_dt(file) >= time_before_dt and 
-                    (fnString_to_dt(file) < time_after_dt or till_end)]
-        
-        l.trace(" dbtl loading " + str(len(files)) + " files")
-        if len(files) > 0:
-            f_dts = [fnString_to_dt(file) for file in files]
-            l.debug(" dbtl loading files from: " + str(min(f_dts)) + " to " + str(max(f_dts)))
-        
-        for file in files:
-            data = qoi.read(persist_location + file)
-            data = np.expand_dims(data, axis=0)
-            full_speed_writer.write(fnString_to_dt(file), data)
+        n = 0
+        for frame_dt, frame in preroll.between(time_before_dt, None if till_end else time_after_dt):
+            full_speed_writer.write(frame_dt, np.expand_dims(frame, axis=0))
+            n += 1
+        l.debug(" dbtl loaded " + str(n) + " frames")
 
-    #will delete all of the files in the persist
+    #will forget all of the frames in the ring
     #that are before seconds_till_irrelvance from the given dt_utc
     def delete_old_files(dt_utc):
-        files = sorted(os.listdir(persist_location))
-        
-        l.debug("dt_utc: " + str(dt_utc))
-        l.debug("seconds till irrelvance: " + str(seconds_till_irrelvance))
         l.debug("irrelvance datetime: " + str(dt_utc - seconds_till_irrelvance))
-        
-        dts = []
-        for file in files:
-            dt = fnString_to_dt(file)
-            if dt < dt_utc -\
-                seconds_till_irrelvance:
-                l.trace(" dbtl deleting old file: " + str(file))
-                dts.append(dt)
-                os.remove(persist_location + file)
-        
-        l.debug(" dbtl deleted " + str(len(dts)) + " old files")
-        if len(dts) == 0:
-            return
-        l.debug(" dbtl deleted files from: " + str(min(dts)) + " to " + str(max(dts)))
+        preroll.drop_before(dt_utc - seconds_till_irrelvance)
+        timelapse_frames.drop_before(dt_utc - seconds_till_irrelvance)
     
     def get_file(dt):
-        fn = dt_to_fnString(dt) + ".qoi"
-        if fn in os.listdir(persist_location):
-            data = qoi.read(persist_location + fn)
-            data = np.expand_dims(data, axis=0)
-            return data
-        return None
+        frame = preroll.get(dt)
+        if frame is None and dt.microsecond == 0:
+            frame = timelapse_frames.get(dt)
+        if frame is None:
+            return None
+        #a view into the ring, it's written before the slot comes round again
+        return np.expand_dims(frame, axis=0)
     
 
-    min_dt = datetime.min.replace(tzinfo=timezone.utc) + seconds_till_irrelvance
-    #if there are left over files from the last run, write them to the full speed video
-    load(min_dt, True)
-    delete_old_files(min_dt)
+    #if there are frames spilled by the last run, write them to the full speed video
+    for frame_dt, frame in preroll.recover():
+        full_speed_writer.write(frame_dt, np.expand_dims(frame, axis=0))
 
     
     #if there are
@@ -130,7 +119,7 @@ def detector_timelapse_writer(config):
     timelapse_write_dt = datetime.min.replace(tzinfo=timezone.utc)
     next_timelapse_frame_update = datetime.min.replace(tzinfo=timezone.utc)
     while not signal_handler.stop:
-        parts = sub.recv_multipart()
+        parts = sub.recv_multipart(copy=False)
         topic, msg = ZmqCodec.decode(parts)
         if should_exit(topic, msg, config["name"]):
             break
@@ -187,7 +176,7 @@ def detector_timelapse_writer(config):
         if switch_to_fs:
             l.info(" dbtl switching to full speed")
             #close the timelapse writer if it's open
-            timelapse_writer.close()
+            timelapse_writer.close(wait=False)
 
             #catch up on time before seconds amount of frames
             load(last_positive_detection_dt)
@@ -198,7 +187,11 @@ def detector_timelapse_writer(config):
             is_full_speed = True
         
 
-        dt_utc, frame = msg[0], msg[1]
+        dt_utc = msg[0]
+        frame = frames.frame(msg)
+        if frame is None:
+            l.warning(" dbtl frame at " + str(dt_utc) + " was overwritten in the ring before it was written, skipping it")
+            continue
         
         if dt_utc < fs_expires_dt:
             l.trace(" dbtl writing full speed frame: " + str(dt_utc))
@@ -213,7 +206,7 @@ def detector_timelapse_writer(config):
             continue
         elif full_speed_writer.output.file_name is not None:
             # we are now officially writing timelapse frames
-            full_speed_writer.close()
+            full_speed_writer.close(wait=False)
         
         if dt_utc.microsecond != 0:
             continue
@@ -244,6 +237,7 @@ def detector_timelapse_writer(config):
     l.info(" dbtl closing")
     timelapse_writer.close()
     full_speed_writer.close()
+    frames.close()
 
 
 if __name__ == "__main__":
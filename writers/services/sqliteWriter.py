@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 import zmq
 import sqlite3
@@ -8,9 +9,10 @@ import numpy as np
 
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
-from platformUtils.zmq_codec import ZmqCodec
+from platformUtils.zmq_codec import ZmqCodec, EpochNs, datetime_to_ns
 import logging
 from platformUtils.logUtils import worker_configurer, check_apply_level, set_process_title
+from platformUtils.utils import connect_sub
 
 from config import sqlite_writer_process_config, zmq_control_endpoint
 config = sqlite_writer_process_config
@@ -25,7 +27,7 @@ def sqlite_writer():
     sub = ctx.socket(zmq.SUB)
     sub.connect(zmq_control_endpoint)
     for endpoint in config['subscription_endpoints']:
-        sub.connect(endpoint)
+        connect_sub(sub, endpoint)
     sub.setsockopt(zmq.SUBSCRIBE, b"control")
     l.info(config["short_name"] + " writer connected to control and subscription topics")
 
@@ -47,7 +49,7 @@ def sqlite_writer():
 
     def _to_sql_type(value) -> str:
         # Map Python/numpy types to SQLite column types
-        if isinstance(value, datetime):
+        if isinstance(value, (datetime, EpochNs)):
             return "INTEGER"  # store epoch ns
         if isinstance(value, (bool, np.bool_)):
             return "INTEGER"
@@ -73,12 +75,10 @@ def sqlite_writer():
 
     def _normalize_value(value):
         # Convert values into SQLite-storable Python types
+        if isinstance(value, EpochNs):
+            return int(value)
         if isinstance(value, datetime):
-            # ensure tz-aware, then epoch ns
-            dt = value
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            return int(dt.timestamp() * 1_000_000_000)
+            return datetime_to_ns(value)
         if isinstance(value, np.ndarray):
             if value.ndim == 0:
                 value = value.item()
@@ -92,6 +92,28 @@ def sqlite_writer():
         return value
 
     prepared_statements = {}  # topic -> (insert_sql, num_cols)
+    sample_periods_ns = {}  # topic -> ns between samples, from the hz at the end of the topic
+
+    def _sample_period_ns(topic: str):
+        if topic not in sample_periods_ns:
+            m = re.search(r"_(\d+(?:P\d+)?)hz$", topic)
+            sample_periods_ns[topic] = round(1_000_000_000 / float(m.group(1).replace("P", "."))) if m else None
+        return sample_periods_ns[topic]
+
+    def _sample_rows(topic: str, ts, arr):
+        # [ts, (N, ...) array] from a sensor is N samples at the topic's hz starting at ts,
+        # (a batch or a grace period fill) one row each: [ts_i, values...]
+        if arr.ndim > 2 or arr.dtype.kind not in ("i", "u", "f", "b"):
+            return None
+        n = arr.shape[0]
+        ts = _normalize_value(ts)
+        if n == 1:
+            return [[ts] + arr.reshape(-1).tolist()]
+        period_ns = _sample_period_ns(topic)
+        if period_ns is None:
+            return None
+        ts_list = (ts + np.arange(n, dtype=np.int64) * period_ns).tolist()
+        return [[t] + vals for t, vals in zip(ts_list, arr.reshape(n, -1).tolist())]
 
     def _table_exists(topic: str) -> bool:
         cur = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (topic,))
@@ -111,7 +133,7 @@ def sqlite_writer():
             col_types.append(_to_sql_type(v))
         col_defs = []
         for i, t in enumerate(col_types):
-            if i == 0 and isinstance(msg_list[0], datetime):
+            if i == 0 and isinstance(msg_list[0], (datetime, EpochNs)):
                 # Use timestamp column as the primary key so reads can be naturally ordered by time
                 col_defs.append("c0 INTEGER PRIMARY KEY")
             else:
@@ -123,7 +145,8 @@ def sqlite_writer():
     
     last_commit = time.time()
     while True:
-        topic, msg = ZmqCodec.decode(sub.recv_multipart())
+        # timestamps are stored as epoch ns, so don't build datetimes just to convert them back
+        topic, msg = ZmqCodec.decode(sub.recv_multipart(), raw_timestamps=True)
         if topic == "control":
             if msg[0] == "exit_all" or (msg[0] == "exit" and msg[-1] == "sqlite"):
                 l.info(config["short_name"] + " writer got control exit")
@@ -136,33 +159,22 @@ def sqlite_writer():
         # Expect messages to be a list/tuple; wrap scalars as single-element list
         payload = msg if isinstance(msg, (list, tuple)) else [msg]
 
-        # Skip messages containing non-scalar ndarrays
-        non_scalar_array = any(isinstance(v, np.ndarray) and getattr(v, 'ndim', 1) > 0 for v in payload)
-        if non_scalar_array:
-            l.error(config["short_name"] + " writer skipping non-scalar array payload for " + topic)
+        if topic not in config['subscription_topics']:
+            l.error(config["short_name"] + " writer got unknown topic " + topic)
             continue
 
-        if topic in config['subscription_topics']:
-            # Ensure table exists and matches payload length
-            try:
-                ncols = _ensure_table_for_message(topic, payload)
-            except Exception as e:
-                l.error(config["short_name"] + " writer failed ensuring table for " + topic + ": " + str(e))
+        if len(payload) == 2 and isinstance(payload[0], (datetime, EpochNs)) and \
+                isinstance(payload[1], np.ndarray) and payload[1].ndim > 0:
+            rows = _sample_rows(topic, payload[0], payload[1])
+            if rows is None:
+                l.error(config["short_name"] + " writer skipping unsupported array payload for " + topic)
                 continue
-
-            if len(payload) != ncols:
-                l.error(config["short_name"] + " writer payload length mismatch for " + topic + ": got " + str(len(payload)) + ", expected " + str(ncols))
+        else:
+            # Skip messages containing non-scalar ndarrays
+            non_scalar_array = any(isinstance(v, np.ndarray) and getattr(v, 'ndim', 1) > 0 for v in payload)
+            if non_scalar_array:
+                l.error(config["short_name"] + " writer skipping non-scalar array payload for " + topic)
                 continue
-
-            # Prepare insert statement if needed
-            if topic not in prepared_statements:
-                placeholders = ",".join(["?"] * ncols)
-                colnames = ",".join([f"c{i}" for i in range(ncols)])
-                # Use OR IGNORE so duplicate timestamp primary keys don't raise errors
-                insert_sql = f"INSERT OR IGNORE INTO {_qident(topic)}(" + colnames + ") VALUES (" + placeholders + ")"
-                prepared_statements[topic] = (insert_sql, ncols)
-
-            insert_sql, _ = prepared_statements[topic]
             values = []
             for v in payload:
                 nv = _normalize_value(v)
@@ -173,18 +185,40 @@ def sqlite_writer():
                 values.append(nv)
             if values is None:
                 continue
+            rows = [values]
 
-            try:
-                ins.execute(insert_sql, tuple(values))
-            except Exception as e:
-                l.error(config["short_name"] + " writer insert failed for " + topic + ": " + str(e))
-                continue
+        # Ensure table exists and matches payload length
+        try:
+            ncols = _ensure_table_for_message(topic, [payload[0]] + rows[0][1:])
+        except Exception as e:
+            l.error(config["short_name"] + " writer failed ensuring table for " + topic + ": " + str(e))
+            continue
 
-            # Commit every second
-            current_time = time.time()
-            if current_time - last_commit >= 1.0:
-                conn.commit()
-                last_commit = current_time
-        else:
-            l.error(config["short_name"] + " writer got unknown topic " + topic)
+        if len(rows[0]) != ncols:
+            l.error(config["short_name"] + " writer payload length mismatch for " + topic + ": got " + str(len(rows[0])) + ", expected " + str(ncols))
+            continue
+
+        # Prepare insert statement if needed
+        if topic not in prepared_statements:
+            placeholders = ",".join(["?"] * ncols)
+            colnames = ",".join([f"c{i}" for i in range(ncols)])
+            # Use OR IGNORE so duplicate timestamp primary keys don't raise errors
+            insert_sql = f"INSERT OR IGNORE INTO {_qident(topic)}(" + colnames + ") VALUES (" + placeholders + ")"
+            prepared_statements[topic] = (insert_sql, ncols)
+
+        insert_sql, _ = prepared_statements[topic]
+        try:
+            ins.executemany(insert_sql, rows)
+        except Exception as e:
+            l.error(config["short_name"] + " writer insert failed for " + topic + ": " + str(e))
+            continue
+
+        # Commit every second
+        current_time = time.time()
+        if current_time - last_commit >= 1.0:
+            conn.commit()
+            last_commit = current_time
+    # rows since the last commit would otherwise be lost
+    conn.commit()
+    conn.close()
     l.info(config["short_name"] + " writer exiting")
\ No newline at end of file
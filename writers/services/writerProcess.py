@@ -9,6 +9,7 @@ from config import zmq_control_endpoint, file_writer_process_info, file_output_i
 import zmq
 import logging
 from platformUtils.logUtils import worker_configurer, set_process_title
+from platformUtils.utils import connect_sub
 from writers.writer import Writer
 import importlib
 
@@ -18,6 +19,8 @@ def writer_process(topic = None,
                     output_base = None,
                     output_module = None,
                     file_size_check_interval_s_range = (30, 60),
+                    max_file_duration_s = None,
+                    max_file_samples = None,
                     additional_output_config = {},
                     debug_lvl = 30,
                     **kwargs
@@ -35,7 +38,7 @@ def writer_process(topic = None,
     l.debug(" subscribed to control on endpoint: " + zmq_control_endpoint)
     
     sensor_endpoint = f"ipc:///tmp/{topic}.sock"
-    sub.connect(sensor_endpoint)
+    connect_sub(sub, sensor_endpoint)
     sub.setsockopt(zmq.SUBSCRIBE, topic.encode())
     l.info(" subscribed to " + topic)
 
@@ -70,7 +73,8 @@ def writer_process(topic = None,
                     temp_write_location=wc["temp_write_location"],
                     output_write_location=wc["output_write_location"],
                     target_file_size=wc["target_file_size"],
-                    file_size_check_interval_s_range=file_size_check_interval_s_range,
+                    max_file_duration_s=max_file_duration_s,
+                    max_file_samples=max_file_samples,
                     platform_uuid=wc["platform_uuid"],
                     debug_lvl=debug_lvl)
     if debug_lvl <= 5:
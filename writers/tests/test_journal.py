@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+
+from writers import journal
+from writers.journal import Journal
+
+
+def test_records_round_trip_and_torn_or_corrupt_ones_are_dropped(tmp_path):
+    fn = str(tmp_path / "persist.wvj")
+    j = Journal(fn, "int16", 2)
+    j.append(np.arange(3, dtype=np.int64) * 10, np.arange(6, dtype=np.int16).reshape(3, 2))
+    j.append(30, np.array([[6, 7]], dtype=np.int16))
+    j.close()
+
+    ns, payload, dropped = journal.read(fn)
+    assert ns.tolist() == [0, 10, 20, 30] and dropped == 0
+    assert payload.dtype == np.int16 and payload.tolist() == [[0, 1], [2, 3], [4, 5], [6, 7]]
+
+    # a flipped byte in the second record and half a record from a crash
+    with open(fn, "r+b") as f:
+        f.seek(journal.HEADER.itemsize + j.record.itemsize + 3)
+        f.write(b"\xff")
+        f.seek(0, 2)
+        f.write(b"\x01" * (j.record.itemsize // 2))
+    ns, payload, dropped = journal.read(fn)
+    assert ns.tolist() == [0, 20, 30] and dropped == 1
+
+    # reopening cuts the torn record off so appends land on a record boundary
+    j = Journal(fn, "int16", 2)
+    assert j.records == 4
+    j.append(40, np.array([[8, 9]], dtype=np.int16))
+    assert journal.read(fn)[0].tolist() == [0, 20, 30, 40]
+
+
+def test_seal_moves_the_records_and_starts_a_new_file(tmp_path):
+    fn = str(tmp_path / "persist.wvj")
+    j = Journal(fn, "float32", 1)
+    assert j.seal(str(tmp_path / "empty.wvj")) is None
+    j.append(5, np.array([[1.5]], dtype=np.float32))
+    sealed = j.seal(str(tmp_path / "sealed.wvj"))
+    j.append(6, np.array([[2.5]], dtype=np.float32))
+    j.close()
+    assert journal.read(sealed)[1].tolist() == [[1.5]]
+    assert journal.read(fn)[1].tolist() == [[2.5]]
+    assert sorted(os.listdir(tmp_path)) == ["persist.wvj", "sealed.wvj"]
@@ -0,0 +1,57 @@
+import os
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+from writers.preroll import PrerollRing
+
+
+def frame(i):
+    return np.full((4, 6, 3), i, dtype=np.uint8)
+
+
+def test_ring_looks_frames_up_by_time_and_forgets_the_oldest():
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    ring = PrerollRing(2, 8)
+    assert ring.capacity == 17
+    for i in range(40):
+        ring.put(t0 + timedelta(seconds=i / 8), frame(i))
+
+    assert ring.get(t0 + timedelta(seconds=39 / 8))[0, 0, 0] == 39
+    assert ring.get(t0 + timedelta(seconds=23 / 8))[0, 0, 0] == 23
+    # overwritten a capacity ago
+    assert ring.get(t0 + timedelta(seconds=22 / 8)) is None
+
+    got = [int(f[0, 0, 0]) for _, f in ring.between(t0 + timedelta(seconds=3), t0 + timedelta(seconds=4))]
+    assert got == list(range(24, 32))
+    assert [dt for dt, _ in ring.between(t0 + timedelta(seconds=4.5))] == \
+        [t0 + timedelta(seconds=i / 8) for i in range(36, 40)]
+
+    ring.drop_before(t0 + timedelta(seconds=4))
+    assert [int(f[0, 0, 0]) for _, f in ring.between(t0)] == list(range(32, 40))
+
+
+def test_spilled_frames_are_recovered_after_a_restart(tmp_path):
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    spill = str(tmp_path) + "/spill/"
+    ring = PrerollRing(1, 4, spill_location=spill)
+    for i in range(8):
+        ring.put(t0 + timedelta(seconds=i / 4), frame(i))
+    # only what's still in the ring is on disk
+    assert len(os.listdir(spill)) == ring.capacity == 5
+
+    recovered = list(PrerollRing(1, 4, spill_location=spill).recover())
+    assert [dt for dt, _ in recovered] == [t0 + timedelta(seconds=i / 4) for i in range(3, 8)]
+    assert [int(f[0, 0, 0]) for _, f in recovered] == list(range(3, 8))
+    assert os.listdir(spill) == []
+
+
+def test_ring_is_cut_to_fit_max_mb():
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    # room for 5 of the 72 byte frames, not the 17 that 2 seconds at 8hz needs
+    ring = PrerollRing(2, 8, max_mb=5 * 72 / 2**20)
+    for i in range(20):
+        ring.put(t0 + timedelta(seconds=i / 8), frame(i))
+    assert ring.capacity == 5
+    assert [int(f[0, 0, 0]) for _, f in ring.between(t0)] == list(range(15, 20))
+    assert ring.get(t0 + timedelta(seconds=14 / 8)) is None
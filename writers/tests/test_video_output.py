@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+from platformUtils.shm_ring import ShmFrameRing
+from platformUtils.timestamp_overlay import TimestampOverlay
+from writers.videoOutput import video_output
+
+
+class _Encoder:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame.copy())
+
+
+def test_overlay_only_touches_the_text_region_of_the_source(tmp_path):
+    output = video_output("test", str(tmp_path) + "/", 8, 64, 48, timestamp_overlay=True)
+    output.overlay = TimestampOverlay(font_scale=.5, thickness=1, origin=(2, 14), tz=timezone.utc)
+    output.output = _Encoder()
+    dt = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    data = np.full((2, 48, 64, 3), 40, dtype=np.uint8)
+    output.write(dt, data)
+    # the encoder got the text, the frames written from are as they were
+    assert all((f != 40).any() for f in output.output.frames)
+    assert (data == 40).all()
+    assert output.overlay_frame is None
+
+    # a slot of a shared ring analyzers read is drawn on a copy
+    ring = ShmFrameRing.create("test_video_output_" + str(id(output)), 2, (1, 48, 64, 3), np.uint8)
+    try:
+        slot, generation = ring.write(np.full((1, 48, 64, 3), 40, dtype=np.uint8))
+        output.write(dt, ring.read(slot, generation))
+        assert (output.output.frames[-1] != 40).any()
+        assert (ring.read(slot, generation) == 40).all()
+        assert output.overlay_frame is not None
+    finally:
+        ring.close()
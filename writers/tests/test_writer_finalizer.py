@@ -0,0 +1,111 @@
+import os
+import threading
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+import zmq
+
+from platformUtils.zmq_codec import ZmqCodec
+from writers.writer import Writer
+
+
+class slow_output:
+    """writes text files, finishing a closed one waits on release"""
+
+    def __init__(self, temp_write_location, output_base="slow"):
+        self.output_base = output_base
+        self.output_hz = 1
+        self.variable_hz = False
+        self.file_name = None
+        self.temp_output_location = temp_write_location + output_base + "/"
+        self.persist_location = temp_write_location + output_base + "_persist/"
+        os.makedirs(self.persist_location, exist_ok=True)
+        self.persisted = []
+        self.release = threading.Event()
+        self.bytes_written = 0
+
+    def persist(self, dt, data):
+        fn = self.persist_location + str(int(dt.timestamp()))
+        open(fn, "w").close()
+        self.persisted.append(fn)
+
+    def seal_persist(self):
+        sealed, self.persisted = self.persisted, []
+        return sealed
+
+    def load(self):
+        return []
+
+    def open(self, dt):
+        self.file_name = self.output_base + "_" + str(int(dt.timestamp()))
+        self.f = open(self.temp_output_location + self.file_name, "w")
+        self.bytes_written = 0
+        return self.file_name
+
+    def write(self, dt, data):
+        self.f.write("".join(str(x) + "\n" for x in data[:, 0]))
+        self.bytes_written += data.nbytes
+
+    def begin_close(self, dt):
+        f, file_name = self.f, self.file_name
+        self.file_name = None
+
+        def finish():
+            self.release.wait(5)
+            f.close()
+            return file_name
+        return finish
+
+
+def test_rotation_opens_the_next_file_while_the_last_one_finishes(tmp_path):
+    temp, done = str(tmp_path / "temp") + "/", str(tmp_path / "done") + "/"
+    output = slow_output(temp)
+    writer = Writer(output, temp, done, target_file_size=1 << 20,
+                    file_size_check_interval_s_range=(60, 60), platform_uuid="test")
+    sub = zmq.Context.instance().socket(zmq.SUB)
+    sub.connect(f"ipc:///tmp/{writer.object_name}.sock")
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    writer.write(t0, np.array([[1]]))
+    # a gap rotates, the second file opens with the first one still finishing
+    writer.write(t0 + timedelta(seconds=5), np.array([[2]]))
+    assert output.file_name == "slow_" + str(int((t0 + timedelta(seconds=5)).timestamp()))
+    assert sorted(os.listdir(output.persist_location)) == sorted(
+        str(int(t.timestamp())) for t in (t0, t0 + timedelta(seconds=5)))
+    assert not sub.poll(100)
+
+    output.release.set()
+    writer.close()
+    outfiles = [ZmqCodec.decode(sub.recv_multipart())[1][1] for _ in range(2)]
+    assert [os.path.basename(f) for f in outfiles] == sorted(os.listdir(done + "slow"))
+    assert open(outfiles[0]).read() == "1\n"
+    # every cached sample was dropped once its file was on disk
+    assert os.listdir(output.persist_location) == []
+    sub.close(0)
+
+
+def test_rotation_on_exact_sample_counts_and_bytes_written(tmp_path):
+    temp, done = str(tmp_path / "temp") + "/", str(tmp_path / "done") + "/"
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    output = slow_output(temp, "counted")
+    output.release.set()
+    writer = Writer(output, temp, done, target_file_size=1 << 20, platform_uuid="test", max_file_samples=4)
+    # one chunk is split so every file but the last holds exactly 4
+    writer.write(t0, np.arange(10)[:, None])
+    writer.close()
+    files = sorted(os.listdir(done + "counted"))
+    assert [len(open(done + "counted/" + f).readlines()) for f in files] == [4, 4, 2]
+
+    output = slow_output(temp, "sized")
+    output.release.set()
+    writer = Writer(output, temp, done, target_file_size=24, platform_uuid="test")
+    # 8 bytes a sample in, closed once 3 are in
+    for i in range(7):
+        writer.write(t0 + timedelta(seconds=i), np.array([[i]]))
+    writer.close()
+    lines = [len(open(done + "sized/" + f).readlines()) for f in sorted(os.listdir(done + "sized"))]
+    assert lines[0] == 3 and sum(lines) == 7
+    # the text file is 2 bytes a sample, later files' sizes are estimated with that
+    assert writer.compression_ratio == .25
@@ -8,6 +8,18 @@ repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 import logging
 from config import dt_to_fnString, fnString_to_dt
+from platformUtils.zmq_codec import datetime_to_ns
+from platformUtils.timestamp_overlay import TimestampOverlay
+
+def _drawable(frame):
+    #writeable all the way down and not a view of a buffer other processes map (the camera's shared ring)
+    base = frame
+    while isinstance(base, np.ndarray):
+        if not base.flags.writeable:
+            return False
+        base = base.base
+    return base is None
+
 
 class video_output:
     def __init__(self,
@@ -17,6 +29,7 @@ class video_output:
                     camera_width,
                     camera_height,
                     fourcc = "avc1",
+                    timestamp_overlay = False,
                     debug_lvl = 30,
                     **kwargs):
         
@@ -39,20 +52,32 @@ class video_output:
         self.file_name = None
         self.output = None
         self.file_base = output_base
+        #raw frame bytes given to the encoder for the open file, the writer rotates on them
+        self.bytes_written = 0
+        #h264 of a mostly still scene, the writer learns the real ratio from finished files
+        self.compression_ratio = .01
         self.persist_location = temp_write_location + output_base + "_persist/"
         os.makedirs(self.persist_location, exist_ok=True)
+        #frames cached for the open file, handed to the writer to delete when it's closed
+        self.persisted = []
 
         self.camera_width = camera_width
         self.camera_height = camera_height
         self.fourcc = cv2.VideoWriter_fourcc(*'avc1')
         self.temp_output_location = temp_write_location + output_base + "/"
         os.makedirs(self.temp_output_location, exist_ok=True)
+
+        #burn each frame's own time into the stored video, the camera's frames stay clean for analyzers
+        self.overlay = TimestampOverlay() if timestamp_overlay else None
+        self.overlay_frame = None
+        self.overlay_scratch = None
     
     def persist(self, dt, data):
         for i in range(data.shape[0]):
             frame_dt = dt + timedelta(seconds=i/self.hz)
             fn = self.persist_location + dt_to_fnString(frame_dt) + ".qoi"
             qoi.write(fn, data[i])
+            self.persisted.append(fn)
     
     def load(self):
         files = sorted(os.listdir(self.persist_location))
@@ -75,21 +100,58 @@ class video_output:
             self.l.error("Failed to open video writer")
             return None
         self.l.info("opened video writer: " + self.file_name)
+        self.bytes_written = 0
 
         return self.file_name
     
-    def close(self, dt):
-        if self.output is not None:
-            self.output.release()
+    def begin_close(self, dt):
+        """let go of the open file, the returned function releases the encoder and seals it"""
+        output, file_name = self.output, self.file_name
         self.output = None
-        
-        new_fn = self.file_name.replace(".mp4", "_" + dt_to_fnString(dt) + ".mp4")
-        os.rename(self.temp_output_location + self.file_name, 
-                  self.temp_output_location + new_fn)
-        self.l.info("closed video writer: " + new_fn)
         self.file_name = None
-        return new_fn
+        new_fn = file_name.replace(".mp4", "_" + dt_to_fnString(dt) + ".mp4")
+
+        def finish():
+            if output is not None:
+                output.release()
+            os.rename(self.temp_output_location + file_name, 
+                      self.temp_output_location + new_fn)
+            self.l.info("closed video writer: " + new_fn)
+            return new_fn
+        return finish
+
+    def close(self, dt):
+        return self.begin_close(dt)()
+
+    def seal_persist(self):
+        sealed, self.persisted = self.persisted, []
+        return sealed
 
     def write(self,dt, data):
-        for frame in data:
-            self.output.write(frame)
+        self.bytes_written += data.nbytes
+        if self.overlay is None:
+            for frame in data:
+                self.output.write(frame)
+            return
+        start_ns = datetime_to_ns(dt)
+        for i, frame in enumerate(data):
+            frame_ns = start_ns + int(i * 1_000_000_000 / self.hz)
+            if not _drawable(frame):
+                #read only (decoded off the socket) or a slot of the camera's shared ring that analyzers
+                #read too, drawing on it isn't possible or would show them the text, so this needs a full copy
+                if self.overlay_frame is None or self.overlay_frame.shape != frame.shape:
+                    self.overlay_frame = np.empty_like(frame)
+                np.copyto(self.overlay_frame, frame)
+                self.overlay.draw(self.overlay_frame, frame_ns)
+                self.output.write(self.overlay_frame)
+                continue
+            #only the text's region is kept aside and put back once the encoder has the frame
+            region = self.overlay.region_for(frame_ns, frame.shape)
+            if self.overlay_scratch is None or self.overlay_scratch.shape != frame[region].shape:
+                self.overlay_scratch = np.empty_like(frame[region])
+            np.copyto(self.overlay_scratch, frame[region])
+            self.overlay.draw(frame, frame_ns)
+            try:
+                self.output.write(frame)
+            finally:
+                np.copyto(frame[region], self.overlay_scratch)
@@ -3,11 +3,14 @@ import pickle
 import os
 import subprocess
 import threading
+import time
 from datetime import datetime
 from tkinter import Y
 repoPath = "/home/pi/Documents/"
 sys.path.append(repoPath + "unifiedSensorClient/")
 from config import dt_to_fnString, fnString_to_dt
+from platformUtils.zmq_codec import datetime_to_ns, ns_to_datetime
+from writers import journal
 import logging
 import numpy as np
 import pandas as pd
@@ -31,6 +34,7 @@ class wavpak_output:
                     bits = 32,
                     sign = "f",
                     endian = "le",
+                    persist_commit_interval_s = 1,
                     **kwargs):
         self.log_name = output_base + "_wavpak-output"
         self.l = logging.getLogger(self.log_name)
@@ -105,18 +109,20 @@ class wavpak_output:
         self.l.debug(self.log_name + " persist location: " + self.persist_location)
 
         os.makedirs(self.persist_location, exist_ok=True)
-        self.persist_fn = self.persist_location + "persist.pkl"
-        self.persist_recovery_fn = self.persist_location + "persistRecovery.pkl"
-        #create the pickle file if it doesn't exist
-        if not os.path.exists(self.persist_fn):
-            with open(self.persist_fn, "ab") as f:
-                pickle.dump([], f)
-        
-        if os.path.exists(self.persist_recovery_fn):
-            with open(self.persist_recovery_fn, "ab") as f:
-                pickle.dump([], f)
+        #samples are cached as they come in a journal of [ns, casted sample, crc] records, one per sample,
+        #until the file they went into is finalized
+        self.persist_fn = self.persist_location + "persist.wvj"
+        #a journal left open by a crash is set aside with the sealed ones for load() to recover
+        if os.path.exists(self.persist_fn):
+            os.rename(self.persist_fn, self._sealed_fn())
+        self.journal = journal.Journal(self.persist_fn, self.wv_dtype_str, channels, persist_commit_interval_s)
+        self.step_ns = 1_000_000_000 / self.output_hz
 
         self.extension = ".wv"
+        #raw bytes given to wavpack for the open file, the writer rotates on them
+        self.bytes_written = 0
+        #wavpack -hh roughly halves sensor data, the writer learns the real ratio from finished files
+        self.compression_ratio = .5
         self.raw_spec = f"--raw-pcm={self.output_hz},{self.bits}{self.sign},{self.channels},{self.endian}"
 
         # self.st = self.additional_output_config.get("int16_storage_type", None)
@@ -325,37 +331,26 @@ class wavpak_output:
 
     
     def persist(self, dt, data):
-        if self._casting_function is not None:
-            data = self._casting_function(data)
-        obj = [dt, data]
-        with open(self.persist_fn, "ab") as f:
-            pickle.dump(obj, f)
-    
-    def load(self): #I would like this to be an iterator that returns the next line
-        if not os.path.exists(self.persist_fn) or os.path.getsize(self.persist_fn) == 0:
-            self.l.info(self.log_name + " no cache found")
-            return
-        
-        # check the number of bytes in the persist file
-        num_bytes = os.path.getsize(self.persist_fn)
-        self.l.debug(self.log_name + " persist file size: " + str(num_bytes))
-        if num_bytes == 0:
-            self.l.info(self.log_name + " no cache found")
-            return
-        
-        #if there is a persist file there, append it to persistRecovery.pkl
-        self.l.info(self.log_name + " appending cache to recovery file")
-        with open(self.persist_recovery_fn, "ab") as f:
-            with open(self.persist_fn, "rb") as f2:
-                f.write(f2.read())
+        data = self._casting_function(data)
+        ns = datetime_to_ns(dt)
+        if len(data) > 1:
+            ns = ns + np.rint(np.arange(len(data)) * self.step_ns).astype(np.int64)
+        self.journal.append(ns, data)
 
-        #and delete the original file
-        self.l.info(self.log_name + " deleting original cache file")
-        os.remove(self.persist_fn)
+    def _sealed_fn(self):
+        return self.persist_location + "persist_sealed_" + str(time.time_ns()) + ".wvj"
 
-        self.l.info(self.log_name + " recovering from cache")
-        #then load and write the contents of persistRecovery.pkl
-        with open(self.persist_recovery_fn, "rb") as f:
+    def _runs(self, ns):
+        """(start, end) of each stretch of samples one step apart, one sample at a time for variable hz"""
+        if self.variable_hz:
+            return [(i, i + 1) for i in range(len(ns))]
+        gaps = np.flatnonzero(np.abs(np.diff(ns) - self.step_ns) > self.step_ns / 2) + 1
+        bounds = [0] + gaps.tolist() + [len(ns)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _load_pickles(self, fn):
+        #caches written before the journal, a pickled [dt, casted data] per message
+        with open(fn, "rb") as f:
             while True:
                 try:
                     obj = pickle.load(f)
@@ -365,12 +360,38 @@ class wavpak_output:
                     self.l.warning(self.log_name + " skipping corrupt cache entry: " + str(e))
                     break
                 if isinstance(obj, (list, tuple)) and len(obj) == 2:
-                    yield obj[0], obj[1]
+                    yield obj[0], self._uncasting_function(obj[1])
 
-        
-        #then delete persistRecovery.pkl
-        self.l.info(self.log_name + " deleting recovery file")
-        os.remove(self.persist_recovery_fn)
+    def load(self): #I would like this to be an iterator that returns the next line
+        #journals of files that were closed but not finalized, oldest first, the one that was open is last
+        cache_fns = [self.persist_location + fn for fn in sorted(os.listdir(self.persist_location))
+                     if fn.startswith("persist_sealed_")]
+        legacy_fns = [self.persist_location + fn for fn in ("persistRecovery.pkl", "persist.pkl")
+                      if os.path.exists(self.persist_location + fn)]
+        if not cache_fns and not legacy_fns:
+            self.l.info(self.log_name + " no cache found")
+            return
+
+        self.l.info(self.log_name + " recovering from cache")
+        for fn in legacy_fns:
+            yield from self._load_pickles(fn)
+
+        for fn in cache_fns:
+            start_time = time.perf_counter()
+            ns, payload, dropped = journal.read(fn)
+            if dropped:
+                self.l.warning(self.log_name + " dropped " + str(dropped) + " torn or corrupt records from " + fn)
+            self.l.debug(self.log_name + " read " + str(len(ns)) + " records from " + fn + " in " +
+                         str(time.perf_counter() - start_time) + "s")
+            #the journal holds samples already casted for wavpack, they're uncast so writing them casts once
+            data = self._uncasting_function(payload)
+            for start, end in self._runs(ns):
+                yield ns_to_datetime(int(ns[start])), data[start:end]
+
+        #then delete what was recovered, it's been written again
+        self.l.info(self.log_name + " deleting recovered cache files")
+        for fn in legacy_fns + cache_fns:
+            os.remove(fn)
     
 
     def _stderr_reader(self, p):
@@ -396,6 +417,7 @@ class wavpak_output:
         t.start()
         self.proc._stderr_thread = t  # attach for lifecycle awareness
         self.file_name = self.file_name + self.extension
+        self.bytes_written = 0
         self.l.info(self.log_name + " opened wavpack writer: " + self.file_name)
         return self.file_name
     
@@ -426,6 +448,7 @@ class wavpak_output:
             buf = np.ascontiguousarray(payload_le).tobytes()
             self.l.trace(self.log_name + " writing variable hz data: 0x" + str(buf.hex()))
             self.proc.stdin.write(buf)
+            self.bytes_written += len(buf)
             return
 
         self.l.trace("input data: " + str(data))
@@ -436,16 +459,30 @@ class wavpak_output:
         #order="C" is for row major order, bytes come out row by row
         self.l.trace(self.log_name + " writing 0x" + str(data.tobytes(order="C").hex()))
         self.proc.stdin.write(data.tobytes(order="C"))
+        self.bytes_written += data.nbytes
 
-    def close(self, dt):
-        self.proc.stdin.flush()
-        self.proc.stdin.close()
-        self.proc.wait()
-        if self.proc.returncode != 0:
-            raise RuntimeError(self.proc.stderr.read().decode("utf-8"))
-        os.sync()
-        new_fn = self.file_name.replace(".wv", "_" + dt_to_fnString(dt) + ".wv")
-        os.rename(self.temp_output_location + self.file_name, 
-                  self.temp_output_location + new_fn)
+    def begin_close(self, dt):
+        """let go of the open file, the returned function waits for wavpack and seals it"""
+        proc, file_name = self.proc, self.file_name
+        self.proc = None
         self.file_name = None
-        return new_fn
\ No newline at end of file
+        new_fn = file_name.replace(".wv", "_" + dt_to_fnString(dt) + ".wv")
+
+        def finish():
+            proc.stdin.flush()
+            proc.stdin.close()
+            proc.wait()
+            if proc.returncode != 0:
+                raise RuntimeError(proc.stderr.read().decode("utf-8"))
+            os.rename(self.temp_output_location + file_name,
+                      self.temp_output_location + new_fn)
+            return new_fn
+        return finish
+
+    def close(self, dt):
+        return self.begin_close(dt)()
+
+    def seal_persist(self):
+        """set the open file's cache aside for the writer to delete once the file is on disk"""
+        sealed_fn = self.journal.seal(self._sealed_fn())
+        return [sealed_fn] if sealed_fn else []
\ No newline at end of file
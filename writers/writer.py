@@ -7,20 +7,34 @@ sys.path.append(repoPath + "unifiedSensorClient/")
 import logging
 import shutil
 from datetime import datetime, timezone, timedelta
-import random
 import zmq
 import math
+import queue
+import threading
 
 from platformUtils.zmq_codec import ZmqCodec
+from platformUtils.utils import bind_pub
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 class Writer:
     def __init__(self,
                     output,
                     temp_write_location,
                     output_write_location,
                     target_file_size,
-                    file_size_check_interval_s_range,
                     platform_uuid,
                     debug_lvl = 30,
+                    max_file_duration_s = None,
+                    max_file_samples = None,
+                    file_size_check_interval_s_range = None,
                     **kwargs
                     ):
         self.output_base = output.output_base
@@ -34,8 +48,11 @@ class Writer:
         self.temp_write_location = temp_write_location
         self.output_write_location = output_write_location
         self.platform_uuid = platform_uuid
+        #a file is closed at whichever of these it reaches first, each checked with a compare per write
+        #file_size_check_interval_s_range is still accepted from older configs, the size isn't sampled anymore
         self.target_file_size = target_file_size
-        self.file_size_check_interval_s_range = file_size_check_interval_s_range
+        self.max_file_duration = timedelta(seconds=max_file_duration_s) if max_file_duration_s else None
+        self.max_file_samples = max_file_samples
         if output.variable_hz:
             self.hz = "variable"
         else:
@@ -47,7 +64,7 @@ class Writer:
 
         output_endpoint = f"ipc:///tmp/{self.object_name}.sock"
         self.pub = zmq.Context().socket(zmq.PUB)
-        self.pub.bind(output_endpoint)
+        bind_pub(self.pub, output_endpoint)
         self.l.debug(self.object_name + " publishing to " + output_endpoint)
 
         self.persist_location = temp_write_location + self.output_base + "_persist" + "/"
@@ -65,8 +82,14 @@ class Writer:
         
         #deciding to close
         self.last_dt = None
-        self.next_size_check_dt = datetime.now(timezone.utc) + \
-            timedelta(seconds=random.randint(*self.file_size_check_interval_s_range))
+        self.file_samples = 0
+        #compressed bytes per byte given to the output, from the output's guess until a file has been finalized
+        self.compression_ratio = getattr(output, "compression_ratio", 1.0)
+
+        #closed files are drained, synced, moved and announced here so the next file opens right away
+        self.finalize_queue = queue.Queue()
+        self.finalizer = threading.Thread(target=self._finalize_loop, name=self.object_name + "_finalizer", daemon=True)
+        self.finalizer.start()
 
         #if the last move or anything else failed, delete all the temp files
         for file in sorted(os.listdir(self.temp_output_location)):
@@ -84,32 +107,78 @@ class Writer:
 
     def _open_file(self, dt): 
         self.output_start_dt = dt
+        self.file_samples = 0
         self.output_file = self.output.open(dt)
         self.log(20, lambda: self.object_name + " opened file: " + self.output_file)
 
     def _close_file(self, dt):
-        self.output_file = self.output.close(dt)
-        infile = self.temp_write_location + self.output_base + "/" + self.output_file
-        self.log(20, lambda: self.object_name + " closing file: " + self.output_file)
-        #move the file to the correct location in data
-        self.output_file = self.platform_uuid + "_" + self.output_file
-        outfile = self.output_write_location + self.output_base + "/" + self.output_file
+        #the output lets go of the file and its cached samples, what's written next goes to a new file
+        bytes_written = self.output.bytes_written
+        finish = self.output.begin_close(dt)
+        sealed = self.output.seal_persist()
+        self.log(20, lambda: self.object_name + " closing file: " + str(self.output_file) +
+                 " after " + str(self.file_samples) + " samples, " + str(bytes_written) + " bytes in")
+        self.finalize_queue.put((dt, finish, sealed, bytes_written))
+        self.output_file = None
+        self.last_dt = None
+
+    def _finalize(self, dt, finish, sealed, bytes_written):
+        start_time = datetime.now().timestamp()
+        output_file = finish()
+        infile = self.temp_output_location + output_file
+        #what the encoder made of what it was given, for estimating the next file's size
+        if bytes_written:
+            self.compression_ratio = os.path.getsize(infile) / bytes_written
+        #move the file to the correct location in data, on disk before anyone hears about it
+        outfile = self.completed_output_location + self.platform_uuid + "_" + output_file
+        _fsync(infile)
         shutil.move(infile, outfile)
+        _fsync(self.completed_output_location)
         self.log(10, lambda: self.object_name + " moved file to: " + outfile)
         self.pub.send_multipart(ZmqCodec.encode(self.object_name, [dt, outfile]))
-        self.output_file = None
-        self.last_dt = None
-        
-        #delete all the cached files , they should all be older than the last dt
-        for file in sorted(os.listdir(self.persist_location)):
-            os.remove(self.persist_location + file)
-        self.log(10, lambda: self.object_name + " deleted all cached files")
+
+        #the file is durable, its cached samples aren't needed to recover it
+        for fn in sealed:
+            os.remove(fn)
+        self.log(10, lambda: self.object_name + " finalized " + outfile + " in " +
+                 str(datetime.now().timestamp() - start_time) + "s")
+
+    def _finalize_loop(self):
+        while True:
+            job = self.finalize_queue.get()
+            dt = job[0]
+            try:
+                self._finalize(*job)
+            except Exception as e:
+                #its cached samples are kept, the file is rebuilt from them on the next start
+                self.log(40, lambda: self.object_name + " failed to finalize file closed at " + str(dt) + ": " + str(e))
+            finally:
+                self.finalize_queue.task_done()
+
+    def file_size(self):
+        """the open file's size, as the encoder reports it or estimated from the bytes it's been given"""
+        encoded = getattr(self.output, "encoded_bytes", None)
+        if encoded is not None:
+            return encoded
+        return int(self.output.bytes_written * self.compression_ratio)
 
     def _should_close(self, dt):
         if self.output.file_name is None:
             self.log(10, self.object_name + " file is not open")
             return False
 
+        if self.file_size() >= self.target_file_size:
+            self.log(20, lambda: self.object_name + " output size is too large: " + str(self.file_size()))
+            return True
+
+        if self.max_file_duration is not None and dt - self.output_start_dt >= self.max_file_duration:
+            self.log(20, self.object_name + " file is long enough")
+            return True
+
+        if self.max_file_samples is not None and self.file_samples >= self.max_file_samples:
+            self.log(20, self.object_name + " file has enough samples")
+            return True
+
         if self.hz == "variable":
             return False
         
@@ -124,20 +193,6 @@ class Writer:
             self.log(20, self.object_name + " too long since last write")
             self.log(20, lambda:self.object_name + " too long since last write: " + str(dt - self.last_dt) + " seconds")
             return True
-
-        # Get the current size on disk of the output file
-        if dt < self.next_size_check_dt:
-            return False
-        
-        rand_s = random.randint(*self.file_size_check_interval_s_range)
-        self.next_size_check_dt = dt + timedelta(seconds=rand_s)
-        
-        self.output_file = self.output.file_name
-        out_file_and_path = self.temp_write_location + self.output_base + "/" + self.output_file
-        output_size = os.path.getsize(out_file_and_path)
-        if output_size > self.target_file_size:
-            self.log(20, self.object_name + " output size is too large")
-            return True
         
         return False
 
@@ -163,28 +218,32 @@ class Writer:
         self.log(5, lambda:self.object_name + "##################### got data for time: " + str(dt))
         self.log(5, lambda: self.object_name + " data: " + str(data))
         
-        # handle if we get a chunk of data that spans 2 days
-        if data.shape[0] > 1:
+        # a chunk of samples at hz (a batched message or recovered cache), the first sample is at dt
+        if data.shape[0] > 1 and self.hz != "variable":
             end_dt = dt + timedelta(seconds=(data.shape[0]-1)/self.hz)
+            # split a chunk that spans 2 days so each day gets its own file
             if end_dt.date() != dt.date():
-                #calc the data index for the end of the day
-                start_of_next_day = end_dt.replace(hour=0, minute=0, second=0, microsecond=0)\
-                     + timedelta(days=1)
-                samples_till_eod = (start_of_next_day.timestamp() - dt.timestamp()) * self.hz
-                self.output.persist(dt, data[:samples_till_eod])
-                self.output.write(dt, data[:samples_till_eod])
-                self.output.close(start_of_next_day-timedelta(seconds=1/self.hz))
-                self.output.persist(start_of_next_day, data[samples_till_eod:])
-                self.output.open(start_of_next_day)
-                self.output_file = self.output.file_name
-                self.output.write(data[samples_till_eod:])
-                self.last_dt = end_dt
+                start_of_next_day = dt.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+                samples_till_eod = math.ceil((start_of_next_day - dt).total_seconds() * self.hz)
+                self.write(dt, data[:samples_till_eod])
+                self.write(dt + timedelta(seconds=samples_till_eod/self.hz), data[samples_till_eod:])
                 return
+            # split a chunk that would take the open file past max_file_samples, so files hold exactly that many
+            if self.max_file_samples is not None:
+                room = self.max_file_samples - (self.file_samples if self.output.file_name is not None else 0)
+                if room <= 0:
+                    #the open file is full and closes before this is written
+                    room = self.max_file_samples
+                if room < data.shape[0]:
+                    self.write(dt, data[:room])
+                    self.write(dt + timedelta(seconds=room/self.hz), data[room:])
+                    return
         else:
             end_dt = dt
 
         if self.debug_lvl <= 5: start_time = datetime.now().timestamp()
-        if self._should_close(end_dt):
+        # the gap to the last write is measured to the start of the chunk
+        if self._should_close(dt):
             self.log(5, lambda:self.object_name + " should close time: " + str(datetime.now().timestamp() - start_time))
             self.log(20, lambda:self.object_name + " should close at " + str(end_dt))
             if self.debug_lvl <= 5: start_time = datetime.now().timestamp()
@@ -209,14 +268,16 @@ class Writer:
         self.output.write(dt, data)
         self.log(5, lambda:self.object_name + " write time: " + str(datetime.now().timestamp() - start_time))
 
+        self.file_samples += data.shape[0]
         self.last_dt = end_dt
     
-    def close(self):
+    def close(self, wait=True):
+        """close the open file, with wait block until every closed file is finalized"""
         if self.output.file_name is not None:
             if self.debug_lvl <= 5: start_time = datetime.now().timestamp()
             self.log(20, lambda:self.object_name + " closing file: " + self.output_file + " at: " + str(self.last_dt))
             self.log(20, lambda: "duration: " + str(self.last_dt - self.output_start_dt))
-            self.log(20, lambda: "size: " + str(os.path.getsize(self.temp_write_location + self.output_base + "/" + self.output_file)))
+            self.log(20, lambda: "size: " + str(self.file_size()) + " from " + str(self.output.bytes_written) + " bytes in")
             if self.hz == "variable":
                 #self.log(20, lambda: "calculated number of frames: " + str(len(self.output.timestamps)))
                 pass
@@ -225,6 +286,8 @@ class Writer:
             
             self._close_file(self.last_dt)
             self.log(5, lambda:self.object_name + " time to close file: " + str(datetime.now().timestamp() - start_time))
-            
+
+        if wait:
+            self.finalize_queue.join()
 
         self.log(20, lambda:self.object_name + " closing")